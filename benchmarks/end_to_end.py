@@ -0,0 +1,295 @@
+"""
+End to end benchmark: renders synthetic comics packed as a folder, CBZ (stored and deflated), CB7
+and CBR through the headless command line interface, and reports throughput and peak memory use.
+
+Usage:
+    python benchmarks/end_to_end.py [--pages 20,100] [--sizes 1200x1800,2400x3600]
+        [--formats jpg,png] [--containers folder,cbz,cbz-deflated,cb7,cbr] [--repeat 1]
+        [--corpus DIR] [--json FILE] [--compare FILE]
+
+Corpora are generated deterministically, so results of different commits are comparable. Pass
+`--corpus` to keep them in a directory and reuse them on the next run. Every combination of page
+count, image size and image format is packed into every container. CB7 needs a version of py7zr
+that can write archives, or `7z` on the PATH, and CBR needs `rar` on the PATH. Containers that
+cannot be created are skipped.
+
+Each input is rendered in its own `python -m mangareader render` process, including opening or
+extracting it, sizing pages, rendering the document and rendering all thumbnails. Peak RSS is that
+of the process, and is only measured on platforms with `os.wait4`. Run `npm run compile` first, as
+the headless renderer copies the compiled scripts and styles.
+
+Pass `--json` to save the results, and `--compare` with the results of an earlier run to print
+the change in throughput of each input.
+"""
+
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import py7zr
+from PIL import Image, ImageDraw
+
+from mangareader import templates
+
+CONTAINERS = ['folder', 'cbz', 'cbz-deflated', 'cb7', 'cbr']
+CONTAINER_SUFFIXES = {'cbz': 'cbz', 'cbz-deflated': 'cbz', 'cb7': 'cb7', 'cbr': 'cbr'}
+# Overrides of the user's config.ini, so that results do not depend on it
+BENCH_OPTIONS = {
+    'disableNavBar': 'no',
+    'dynamicImageLoading': 'no',
+    'thumbnailCacheSize': '0',
+    'thumbnailExecutor': 'thread',
+    'thumbnailSprites': 'no',
+    'displayMaxWidth': '0',
+}
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description='End to end rendering benchmark')
+    parser.add_argument('--pages', default='20,100', help='Comma separated page counts')
+    parser.add_argument(
+        '--sizes', default='1200x1800,2400x3600', help='Comma separated page sizes, WIDTHxHEIGHT'
+    )
+    parser.add_argument('--formats', default='jpg,png', help='Comma separated image formats')
+    parser.add_argument(
+        '--containers', default=','.join(CONTAINERS), help='Comma separated containers'
+    )
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per input, the best is kept')
+    parser.add_argument('--corpus', help='Directory to keep generated corpora in')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--compare', help='Results of an earlier run to compare against')
+    return parser.parse_args()
+
+
+def generate_pages(outpath: Path, count: int, size: Tuple[int, int], fmt: str) -> None:
+    """Write count synthetic pages to outpath. Pages are line art over a light background with a
+    little noise, so they compress roughly like scans, and each page is different."""
+    if outpath.is_dir():
+        return
+    temp_path = outpath.with_name(f'{outpath.name}.tmp')
+    shutil.rmtree(temp_path, ignore_errors=True)
+    temp_path.mkdir(parents=True)
+    width, height = size
+    rng = random.Random(f'{count}-{width}x{height}-{fmt}')
+    noise = Image.effect_noise((width, height), 12).point(lambda v: 235 + v // 16)
+    for i in range(count):
+        img = Image.merge('RGB', (noise, noise, noise))
+        draw = ImageDraw.Draw(img)
+        for _ in range(60):
+            points = [(rng.randrange(width), rng.randrange(height)) for _ in range(2)]
+            draw.line(points, fill=(20, 20, 20), width=rng.randrange(2, 9))
+        for _ in range(8):
+            x, y = rng.randrange(width), rng.randrange(height)
+            r = rng.randrange(20, width // 6)
+            draw.ellipse((x - r, y - r, x + r, y + r), outline=(30, 30, 30), width=4)
+        img.save(temp_path / f'page{i:04}.{fmt}', quality=90)
+    temp_path.rename(outpath)
+
+
+def pack(pages: Path, outfile: Path, container: str) -> Optional[str]:
+    """Pack a folder of pages into a container, unless it exists already.
+
+    Returns: reason the container could not be created, or None.
+    """
+    if outfile.exists():
+        return None
+    files = sorted(pages.iterdir())
+    temp_file = outfile.with_name(f'{outfile.stem}.tmp{outfile.suffix}')
+    temp_file.unlink(missing_ok=True)
+    if container in ('cbz', 'cbz-deflated'):
+        compression = zipfile.ZIP_DEFLATED if container == 'cbz-deflated' else zipfile.ZIP_STORED
+        with zipfile.ZipFile(temp_file, 'w', compression) as archive:
+            for f in files:
+                archive.write(f, f'{pages.name}/{f.name}')
+    elif container == 'cb7':
+        try:
+            archive = py7zr.SevenZipFile(temp_file, 'w')
+            try:
+                for f in files:
+                    archive.write(f, f'{pages.name}/{f.name}')
+            finally:
+                archive.close()
+        except NotImplementedError:
+            temp_file.unlink(missing_ok=True)
+            sevenzip = shutil.which('7z') or shutil.which('7za')
+            if not sevenzip:
+                return 'installed py7zr cannot write archives, and 7z is not on the PATH'
+            subprocess.run(
+                [sevenzip, 'a', '-t7z', '-bd', '-y', str(temp_file), pages.name],
+                cwd=pages.parent,
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+    elif container == 'cbr':
+        rar = shutil.which('rar')
+        if not rar:
+            return 'rar is not on the PATH'
+        subprocess.run(
+            [rar, 'a', '-idq', '-y', str(temp_file), pages.name], cwd=pages.parent, check=True
+        )
+    else:
+        raise ValueError(f'Unknown container: {container}')
+    temp_file.rename(outfile)
+    return None
+
+
+def input_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(f.stat().st_size for f in path.iterdir())
+    return path.stat().st_size
+
+
+def render(path: Path, outpath: Path) -> Dict[str, Any]:
+    """Render an input in a new headless process.
+
+    Returns: headless report of the input, with the peak RSS of the process in bytes.
+    """
+    shutil.rmtree(outpath, ignore_errors=True)
+    options = [
+        arg for key, value in BENCH_OPTIONS.items() for arg in ('--option', f'{key}={value}')
+    ]
+    command = [sys.executable, '-m', 'mangareader', 'render', str(path), '--out', str(outpath)]
+    with tempfile.TemporaryFile() as stdout:
+        process = subprocess.Popen([*command, *options], cwd=ROOT, stdout=stdout)
+        peak_rss = None
+        if hasattr(os, 'wait4'):
+            _, status, usage = os.wait4(process.pid, 0)
+            returncode = os.waitstatus_to_exitcode(status)
+            # Reported in kilobytes on Linux, and in bytes on macOS
+            peak_rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+        else:
+            returncode = process.wait()
+        stdout.seek(0)
+        lines = stdout.read().decode('utf-8').splitlines()
+    if returncode != 0 or not lines:
+        raise RuntimeError(f'Rendering {path} failed with exit code {returncode}')
+    report = json.loads(lines[-1])
+    report['peak_rss'] = peak_rss
+    return report
+
+
+def run(args: Namespace, corpus: Path) -> List[Dict[str, Any]]:
+    results = []
+    page_counts = [int(count) for count in args.pages.split(',')]
+    sizes = [tuple(int(n) for n in size.split('x')) for size in args.sizes.split(',')]
+    formats = args.formats.split(',')
+    containers = args.containers.split(',')
+    for count in page_counts:
+        for size in sizes:
+            for fmt in formats:
+                name = f'{count}p-{size[0]}x{size[1]}-{fmt}'
+                pages = corpus / 'pages' / name
+                print(f'Generating {name}...', file=sys.stderr)
+                generate_pages(pages, count, size, fmt)
+                for container in containers:
+                    path = (
+                        pages
+                        if container == 'folder'
+                        else corpus / f'{name}-{container}.{CONTAINER_SUFFIXES[container]}'
+                    )
+                    result: Dict[str, Any] = {
+                        'name': f'{name}-{container}',
+                        'container': container,
+                        'pages': count,
+                        'width': size[0],
+                        'height': size[1],
+                        'format': fmt,
+                    }
+                    skipped = pack(pages, path, container) if container != 'folder' else None
+                    if skipped:
+                        result['skipped'] = skipped
+                        results.append(result)
+                        print(f'{result["name"]:>36}  skipped: {skipped}', file=sys.stderr)
+                        continue
+                    reports = [render(path, corpus / 'out') for _ in range(max(1, args.repeat))]
+                    best = min(reports, key=lambda report: report['seconds'])
+                    size_bytes = input_size(path)
+                    result.update(
+                        bytes=size_bytes,
+                        seconds=best['seconds'],
+                        pages_per_second=round(count / best['seconds'], 2),
+                        mb_per_second=round(size_bytes / 1024 / 1024 / best['seconds'], 2),
+                        peak_rss=max(
+                            (report['peak_rss'] for report in reports if report['peak_rss']),
+                            default=None,
+                        ),
+                        stages=best['stages'],
+                        io=best['io'],
+                    )
+                    results.append(result)
+                    print_result(result)
+    return results
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    rss = f'{result["peak_rss"] / 1024 / 1024:7.1f} MB' if result['peak_rss'] else '      n/a'
+    print(
+        f'{result["name"]:>36}  {result["seconds"]:8.2f} s  {result["pages_per_second"]:8.1f} '
+        f'pages/s  {result["mb_per_second"]:7.1f} MB/s  peak RSS {rss}',
+        file=sys.stderr,
+    )
+
+
+def compare(results: List[Dict[str, Any]], baseline_file: str) -> None:
+    """Print the change in throughput of each input from an earlier run."""
+    baseline = json.loads(Path(baseline_file).read_text(encoding='utf-8'))
+    previous = {r['name']: r for r in baseline['results'] if 'skipped' not in r}
+    print(f'Compared to {baseline.get("commit") or baseline_file}:', file=sys.stderr)
+    for result in results:
+        before = previous.get(result['name'])
+        if 'skipped' in result or not before:
+            continue
+        change = result['pages_per_second'] / before['pages_per_second'] - 1
+        print(f'{result["name"]:>36}  {change:+8.1%} pages/s', file=sys.stderr)
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    args = parse_args()
+    missing = [asset for asset in templates.ASSETS if not (ROOT / 'mangareader' / asset).exists()]
+    if missing:
+        print(f'Missing {", ".join(missing)}, run `npm run compile` first', file=sys.stderr)
+        sys.exit(2)
+    if args.corpus:
+        corpus = Path(args.corpus).resolve()
+        corpus.mkdir(parents=True, exist_ok=True)
+        results = run(args, corpus)
+    else:
+        with tempfile.TemporaryDirectory(prefix='mangareader-e2e-') as tmp:
+            results = run(args, Path(tmp))
+    output = {
+        'commit': get_commit(),
+        'platform': sys.platform,
+        'python': sys.version.split()[0],
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        Path(args.json).write_text(json.dumps(output, indent=2), encoding='utf-8')
+    else:
+        print(json.dumps(output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark for reading image dimensions: compares the header probe used by `render_from_template`
+against opening every file serially with Pillow.
+
+Usage:
+    python benchmarks/image_size.py [--count 1000] [--width 1200] [--height 1800] [--dir PATH]
+
+A synthetic folder of images in mixed formats is generated in a temporary directory, unless
+`--dir` points to an existing folder of images.
+"""
+
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+from mangareader.mangarender import get_image_sizes, scan_directory
+from mangareader.templates import DEFAULT_IMAGETYPES
+
+FORMATS = ('jpg', 'png', 'webp', 'gif')
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description='Image dimension probe benchmark')
+    parser.add_argument('--count', type=int, default=1000, help='Number of images to generate')
+    parser.add_argument('--width', type=int, default=1200, help='Width of generated images')
+    parser.add_argument('--height', type=int, default=1800, help='Height of generated images')
+    parser.add_argument('--dir', help='Benchmark an existing image folder instead')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per method')
+    return parser.parse_args()
+
+
+def generate_images(outpath: Path, count: int, width: int, height: int) -> None:
+    """Write `count` solid color images to outpath, cycling through `FORMATS`."""
+    for i in range(count):
+        ext = FORMATS[i % len(FORMATS)]
+        img = Image.new('RGB', (width + i % 7, height - i % 5), (i % 256, 80, 160))
+        img.save(outpath / f'page{i:05}.{ext}')
+
+
+def pillow_sizes(paths: List[Path]) -> list:
+    """Previous implementation: open each file in turn with Pillow."""
+    sizes = []
+    for path in paths:
+        try:
+            with Image.open(path) as img:
+                sizes.append(img.size)
+        except:
+            sizes.append(None)
+    return sizes
+
+
+def best_time(func: Callable[[], list], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(image_dir: Path, repeat: int) -> None:
+    paths = scan_directory(image_dir, DEFAULT_IMAGETYPES)
+    expected = pillow_sizes(paths)
+    actual = get_image_sizes(paths)
+    mismatches = sum(1 for a, b in zip(expected, actual) if tuple(a or ()) != tuple(b or ()))
+    pillow_time = best_time(lambda: pillow_sizes(paths), repeat)
+    probe_time = best_time(lambda: get_image_sizes(paths), repeat)
+    print(f'images:            {len(paths)}')
+    print(f'pillow (serial):   {pillow_time * 1000:9.1f} ms')
+    print(f'header probe:      {probe_time * 1000:9.1f} ms')
+    print(f'speedup:           {pillow_time / probe_time:9.1f}x')
+    print(f'size mismatches:   {mismatches}')
+
+
+def main() -> None:
+    args = parse_args()
+    if args.dir:
+        run(Path(args.dir), args.repeat)
+        return
+    with tempfile.TemporaryDirectory(prefix='mangareader-bench-') as tmp:
+        print(f'Generating {args.count} images...')
+        generate_images(Path(tmp), args.count, args.width, args.height)
+        run(Path(tmp), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Cold start benchmark: measures the time to import the app's entry points with `python -X importtime`,
+and checks that heavy dependencies are not imported at startup.
+
+Usage:
+    python benchmarks/import_time.py [--modules reader,mangareader.__main__] [--repeat 5]
+        [--max-ms MILLISECONDS] [--json FILE] [--compare FILE] [--tolerance 0.25]
+
+Each module is imported in a fresh interpreter, and the best of `--repeat` runs is kept. Archive
+libraries, Pillow and the page server must only be imported once they are used, so the benchmark
+fails if any of `DEFERRED_MODULES` is imported at startup. Exits with status 1 on failure, or if
+the best import time of a module exceeds `--max-ms`, or if it is more than `--tolerance` slower
+than in the results of an earlier run passed with `--compare`. Save results with `--json`.
+"""
+
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+# Modules that take a while to import, and are only needed once a file of a certain kind is opened
+DEFERRED_MODULES = ['PIL', 'rarfile', 'py7zr', 'http.server']
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description='Import time benchmark')
+    parser.add_argument(
+        '--modules', default='reader,mangareader.__main__', help='Comma separated modules to import'
+    )
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per module, the best is kept')
+    parser.add_argument('--max-ms', type=float, help='Fail if any module is slower to import')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--compare', help='Results of an earlier run to compare against')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.25, help='Allowed slowdown relative to --compare'
+    )
+    return parser.parse_args()
+
+
+def import_time(module: str) -> Tuple[float, List[str]]:
+    """Import a module in a new interpreter.
+
+    Returns: tuple of the cumulative import time of the module in milliseconds, and the names of
+    all modules imported with it.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Importing {module} failed:\n{result.stderr}')
+    total = None
+    imported = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        # import time: self [us] | cumulative | imported package
+        _, cumulative, name = line[len('import time:') :].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        imported.append(name.strip())
+        if name.strip() == module:
+            total = int(cumulative) / 1000
+    if total is None:
+        raise RuntimeError(f'No import time reported for {module}')
+    return total, imported
+
+
+def measure(module: str, repeat: int) -> Dict[str, Any]:
+    runs = [import_time(module) for _ in range(max(1, repeat))]
+    best, imported = min(runs)
+    deferred = [
+        name
+        for name in DEFERRED_MODULES
+        if any(m == name or m.startswith(f'{name}.') for m in imported)
+    ]
+    return {'module': module, 'ms': round(best, 2), 'modules': len(imported), 'deferred': deferred}
+
+
+def main() -> None:
+    args = parse_args()
+    results = [measure(module, args.repeat) for module in args.modules.split(',')]
+    baseline = {}
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        baseline = {r['module']: r for r in previous['results']}
+    failures = []
+    for result in results:
+        module, ms = result['module'], result['ms']
+        line = f'{module:>24}  {ms:8.1f} ms  {result["modules"]:4} modules'
+        before = baseline.get(module)
+        if before:
+            change = ms / before['ms'] - 1
+            line += f'  {change:+7.1%}'
+            if change > args.tolerance:
+                failures.append(f'{module} is {change:.0%} slower to import than before')
+        print(line)
+        if result['deferred']:
+            failures.append(f'{module} imports {", ".join(result["deferred"])} at startup')
+        if args.max_ms is not None and ms > args.max_ms:
+            failures.append(f'{module} takes longer than {args.max_ms} ms to import')
+    if args.json:
+        output = {'python': sys.version.split()[0], 'results': results}
+        Path(args.json).write_text(json.dumps(output, indent=2), encoding='utf-8')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Library mode smoke test: opens a synthetic series of archives with `render_library`, passing the
+same keyword arguments that the app builds in `reader.open_file`, and checks that the index, the
+opened volume and the prefetched next volume are rendered.
+
+Usage:
+    python benchmarks/library_smoke.py [--volumes 3] [--pages 4] [--timeout 60]
+
+The thumbnail cache is kept in a temporary directory and shared between volumes, as in resident
+mode. Run `npm run compile` first, as the renderer copies the compiled scripts and styles. Exits
+with status 1 on failure.
+"""
+
+import sys
+import tempfile
+import time
+import zipfile
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from PIL import Image
+
+import reader
+from mangareader.config import CONFIG_KEY, get_or_create_config
+from mangareader.library import render_library
+from mangareader.reporter import CancellationToken, ProgressCounter
+from mangareader.thumbcache import ThumbnailCache
+
+# Overrides of the user's config.ini, so that the result does not depend on it
+SMOKE_OPTIONS = {
+    'disableNavBar': 'no',
+    'thumbnailExecutor': 'thread',
+    'progressiveRendering': 'no',
+    'streamArchives': 'no',
+    'displayMaxWidth': '0',
+}
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description='Library mode smoke test')
+    parser.add_argument('--volumes', type=int, default=3, help='Number of volumes in the series')
+    parser.add_argument('--pages', type=int, default=4, help='Number of pages in each volume')
+    parser.add_argument(
+        '--timeout', type=float, default=60, help='Seconds to wait for the next volume'
+    )
+    return parser.parse_args()
+
+
+def generate_series(outpath: Path, volumes: int, pages: int) -> None:
+    """Write a series folder of CBZ volumes with small solid color pages."""
+    outpath.mkdir(parents=True)
+    for volume in range(1, volumes + 1):
+        with zipfile.ZipFile(outpath / f'Volume {volume}.cbz', 'w') as archive:
+            for page in range(pages):
+                image_path = outpath / 'page.png'
+                Image.new('RGB', (200, 300), (volume * 40 % 256, page * 30 % 256, 0)).save(
+                    image_path
+                )
+                archive.write(image_path, f'{page:03}.png')
+                image_path.unlink()
+
+
+def main() -> None:
+    args = parse_args()
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory() as temp:
+        series = Path(temp) / 'Series'
+        generate_series(series, args.volumes, args.pages)
+        config = get_or_create_config()
+        for key, value in SMOKE_OPTIONS.items():
+            config[CONFIG_KEY][key] = value
+        lib_dir = str(ROOT / 'mangareader')
+        version = (ROOT / 'version').read_text(encoding='utf-8').strip()
+        outpath = Path(temp) / 'out'
+        cancel = CancellationToken()
+        render_args = reader.get_render_args(
+            str(series),
+            config,
+            version,
+            lib_dir,
+            ProgressCounter(),
+            outpath,
+            thumbnail_cache=ThumbnailCache(Path(temp) / 'thumbnails', 64 * 1024 * 1024),
+            cancel=cancel,
+        )
+        try:
+            index = render_library(**render_args, **reader.get_library_args(lib_dir))
+            if not index.is_file():
+                failures.append('library index was not rendered')
+            if not (outpath / 'volume-0' / 'index.html').is_file():
+                failures.append('opened volume was not rendered')
+            if args.volumes > 1:
+                deadline = time.monotonic() + args.timeout
+                next_volume = outpath / 'volume-1' / 'index.html'
+                while not next_volume.is_file() and time.monotonic() < deadline:
+                    time.sleep(0.1)
+                if not next_volume.is_file():
+                    failures.append('next volume was not rendered in the background')
+        except Exception as e:
+            failures.append(f'render_library raised {type(e).__name__}: {e}')
+        finally:
+            # Stops the server receiving the opened volumes, so that the process can exit
+            cancel.cancel()
+            # Volumes rendering in the background stop at the next stage
+            time.sleep(1)
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
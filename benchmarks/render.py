@@ -0,0 +1,74 @@
+"""
+Benchmark for HTML rendering: measures `render_from_template` on a large synthetic comic, so that
+regressions in the per-page render loop show up.
+
+Usage:
+    python benchmarks/render.py [--count 10000] [--repeat 5] [--max-seconds SECONDS]
+
+Image dimensions are supplied up front, so no image files are read and only the rendering itself is
+timed. Exits with status 1 if `--max-seconds` is given and the best run exceeds it.
+"""
+
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+from configparser import ConfigParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mangareader import templates
+from mangareader.config import CONFIG_KEY
+from mangareader.mangarender import render_from_template
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description='HTML rendering benchmark')
+    parser.add_argument('--count', type=int, default=10000, help='Number of pages to render')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs')
+    parser.add_argument('--max-seconds', type=float, help='Fail if the best run is slower')
+    parser.add_argument('--dynamic', action='store_true', help='Enable dynamicImageLoading')
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    static_path = Path(templates.__file__).parent / 'static-assets'
+    doc_template = (static_path / 'doc.template.html').read_text(encoding='utf-8')
+    page_template = (static_path / 'img.template.html').read_text(encoding='utf-8')
+    with tempfile.TemporaryDirectory(prefix='mangareader-bench-') as tmp:
+        config = ConfigParser()
+        config[CONFIG_KEY] = {'dynamicImageLoading': 'yes' if args.dynamic else 'no'}
+        paths = [Path(tmp) / 'pages' / f'page{i:05}.jpg' for i in range(args.count)]
+        thumbnails = [Path(tmp) / 'thumbs' / f'page{i:05}.png' for i in range(args.count)]
+        dimensions = [(1200 + i % 7, 1800 - i % 5) for i in range(args.count)]
+        outfile = str(Path(tmp) / 'render.html')
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            render_from_template(
+                paths,
+                thumbnails,
+                'bench',
+                'Benchmark',
+                doc_template,
+                page_template,
+                config,
+                outfile,
+                dimensions=dimensions,
+            )
+            timings.append(time.perf_counter() - start)
+        size = Path(outfile).stat().st_size
+    best = min(timings)
+    print(f'pages:        {args.count}')
+    print(f'best time:    {best * 1000:9.1f} ms')
+    print(f'pages/s:      {args.count / best:9.0f}')
+    print(f'output size:  {size / 1024 / 1024:9.1f} MB')
+    if args.max_seconds is not None and best > args.max_seconds:
+        print(f'FAIL: slower than {args.max_seconds} s')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark for thumbnail rendering: measures how `create_thumbnails` scales with the number of
+workers in thread and process pools.
+
+Usage:
+    python benchmarks/thumbnails.py [--count 300] [--width 2480] [--height 3508] [--dir PATH]
+
+A synthetic folder of JPEG scans is generated in a temporary directory, unless `--dir` points to an
+existing folder of images.
+"""
+
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import cpu_count
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageDraw
+
+from mangareader.mangarender import create_thumbnails, scan_directory
+from mangareader.reporter import ProgressCounter
+from mangareader.templates import DEFAULT_IMAGETYPES
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description='Thumbnail rendering benchmark')
+    parser.add_argument('--count', type=int, default=300, help='Number of images to generate')
+    parser.add_argument('--width', type=int, default=2480, help='Width of generated images')
+    parser.add_argument('--height', type=int, default=3508, help='Height of generated images')
+    parser.add_argument('--dir', help='Benchmark an existing image folder instead')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        nargs='+',
+        default=sorted({1, max(1, cpu_count() // 2), cpu_count()}),
+        help='Worker counts to measure',
+    )
+    return parser.parse_args()
+
+
+def generate_images(outpath: Path, count: int, width: int, height: int) -> None:
+    """Write `count` JPEG images with some detail to outpath."""
+    for i in range(count):
+        img = Image.new('RGB', (width, height), (240, 240, 235))
+        draw = ImageDraw.Draw(img)
+        for j in range(0, height, 97):
+            draw.line((0, j, width, (j * 7 + i * 13) % height), fill=(j % 255, 40, 90), width=9)
+        img.save(outpath / f'page{i:04}.jpg', quality=90)
+
+
+def time_executor(paths: List[Path], outpath: Path, make_executor: Callable[[], Executor]) -> float:
+    executor = make_executor()
+    # Start up the workers before timing, as a long running app would have them ready
+    list(executor.map(abs, range(64)))
+    progress = ProgressCounter()
+    progress.set_total(len(paths))
+    start = time.perf_counter()
+    create_thumbnails(paths, outpath, progress, executor=executor)
+    progress.wait()
+    elapsed = time.perf_counter() - start
+    executor.shutdown(wait=True)
+    return elapsed
+
+
+def run(image_dir: Path, worker_counts: List[int]) -> None:
+    paths = scan_directory(image_dir, DEFAULT_IMAGETYPES)
+    print(f'images: {len(paths)}, cpus: {cpu_count()}')
+    print(f'{"executor":>10} {"workers":>8} {"time (s)":>10} {"pages/s":>9} {"speedup":>8}')
+    with tempfile.TemporaryDirectory(prefix='mangareader-thumbs-') as tmp:
+        for name, pool in (('thread', ThreadPoolExecutor), ('process', ProcessPoolExecutor)):
+            baseline = None
+            for workers in worker_counts:
+                elapsed = time_executor(paths, Path(tmp), lambda: pool(max_workers=workers))
+                baseline = baseline or elapsed
+                print(
+                    f'{name:>10} {workers:>8} {elapsed:>10.2f} {len(paths) / elapsed:>9.1f} '
+                    f'{baseline / elapsed:>7.2f}x'
+                )
+
+
+def main() -> None:
+    args = parse_args()
+    if args.dir:
+        run(Path(args.dir), args.workers)
+        return
+    with tempfile.TemporaryDirectory(prefix='mangareader-bench-') as tmp:
+        print(f'Generating {args.count} images...')
+        generate_images(Path(tmp), args.count, args.width, args.height)
+        run(Path(tmp), args.workers)
+
+
+if __name__ == '__main__':
+    main()
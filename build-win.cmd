@@ -8,6 +8,9 @@ pyi-makespec --add-data="mangareader\build\styles.css;mangareader\build" ^
   --add-data="mangareader\static-assets\boot.template.html;mangareader\static-assets" ^
   --add-data="mangareader\static-assets\doc.template.html;mangareader\static-assets" ^
   --add-data="mangareader\static-assets\img.template.html;mangareader\static-assets" ^
+  --add-data="mangareader\static-assets\library.template.html;mangareader\static-assets" ^
+  --add-data="mangareader\static-assets\volume.template.html;mangareader\static-assets" ^
+  --add-data="mangareader\static-assets\status.template.html;mangareader\static-assets" ^
   --add-data="mangareader\static-assets\roboto-regular.woff2;mangareader\static-assets" ^
   --add-data="mangareader\static-assets\roboto-bold.woff2;mangareader\static-assets" ^
   --add-data="mangareader\static-assets\zenscroll.js;mangareader\static-assets" ^
@@ -8,7 +8,7 @@ a = Analysis(
     ['reader.py'],
     pathex=[],
     binaries=[],
-    datas=[('mangareader/build/styles.css', 'mangareader/build'), ('mangareader/build/scripts.js', 'mangareader/build'), ('mangareader/static-assets/menu.svg', 'mangareader/static-assets'), ('mangareader/static-assets/menu-light.svg', 'mangareader/static-assets'), ('mangareader/static-assets/scroll.svg', 'mangareader/static-assets'), ('mangareader/static-assets/scroll-light.svg', 'mangareader/static-assets'), ('mangareader/static-assets/boot.template.html', 'mangareader/static-assets'), ('mangareader/static-assets/doc.template.html', 'mangareader/static-assets'), ('mangareader/static-assets/img.template.html', 'mangareader/static-assets'), ('mangareader/static-assets/roboto-regular.woff2', 'mangareader/static-assets'), ('mangareader/static-assets/roboto-bold.woff2', 'mangareader/static-assets'), ('mangareader/static-assets/zenscroll.js', 'mangareader/static-assets'), ('version', '.')],
+    datas=[('mangareader/build/styles.css', 'mangareader/build'), ('mangareader/build/scripts.js', 'mangareader/build'), ('mangareader/static-assets/menu.svg', 'mangareader/static-assets'), ('mangareader/static-assets/menu-light.svg', 'mangareader/static-assets'), ('mangareader/static-assets/scroll.svg', 'mangareader/static-assets'), ('mangareader/static-assets/scroll-light.svg', 'mangareader/static-assets'), ('mangareader/static-assets/boot.template.html', 'mangareader/static-assets'), ('mangareader/static-assets/doc.template.html', 'mangareader/static-assets'), ('mangareader/static-assets/img.template.html', 'mangareader/static-assets'), ('mangareader/static-assets/library.template.html', 'mangareader/static-assets'), ('mangareader/static-assets/volume.template.html', 'mangareader/static-assets'), ('mangareader/static-assets/status.template.html', 'mangareader/static-assets'), ('mangareader/static-assets/roboto-regular.woff2', 'mangareader/static-assets'), ('mangareader/static-assets/roboto-bold.woff2', 'mangareader/static-assets'), ('mangareader/static-assets/zenscroll.js', 'mangareader/static-assets'), ('version', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,214 @@
+"""
+Headless command line interface, for rendering reading packages without the Tk UI.
+
+Usage:
+    python -m mangareader render INPUT [INPUT ...] --out DIR [--jobs N] [--option KEY=VALUE ...]
+
+Each input is rendered to its own subdirectory of the output directory. A JSON object is printed
+on its own line for each input once it is complete, with the time spent in each stage.
+"""
+
+import json
+import re
+import sys
+import time
+import traceback
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import Executor, ThreadPoolExecutor
+from configparser import ConfigParser
+from multiprocessing import cpu_count
+from pathlib import Path
+from threading import Event, Lock
+from typing import Any, Dict, List, Optional
+from urllib.parse import unquote, urlsplit
+from urllib.request import url2pathname
+
+from mangareader import templates
+from mangareader.config import CONFIG_KEY, get_or_create_config
+from mangareader.mangarender import extract_render
+from mangareader.reporter import CancellationToken, ProgressCounter, StageTimer
+from mangareader.thumbcache import ThumbnailCache, get_thumbnail_cache
+from mangareader.thumbnails import create_thumbnail_executor
+
+# Absolute file URIs in rendered documents, which are quoted in HTML attributes and JSON strings
+FILE_URI_PATTERN = re.compile(r'file:///[^"\'\s<>\\]+')
+
+
+def parse_args(argv: Optional[List[str]] = None) -> Namespace:
+    parser = ArgumentParser(prog='python -m mangareader', description='Headless Mangareader')
+    commands = parser.add_subparsers(dest='command', required=True)
+    render = commands.add_parser('render', help='Render images, folders or archives to HTML')
+    render.add_argument('inputs', nargs='+', help='Paths to images, folders or archives')
+    render.add_argument('--out', required=True, help='Directory to write rendered documents to')
+    render.add_argument(
+        '--jobs',
+        type=int,
+        default=max(1, cpu_count() // 2),
+        help='Number of inputs to process concurrently',
+    )
+    render.add_argument(
+        '--option',
+        action='append',
+        default=[],
+        metavar='KEY=VALUE',
+        help='Override a config.ini option, e.g. disableNavBar=yes',
+    )
+    render.add_argument(
+        '--timeout',
+        type=float,
+        help='Seconds to wait for the thumbnails and display variants of each input before giving up',
+    )
+    return parser.parse_args(argv)
+
+
+def get_headless_config(options: List[str]) -> ConfigParser:
+    """Get the user's config with command line overrides applied. Options that need the app to keep
+    running after rendering, or load assets or thumbnails from the app's cache, are turned off,
+    since rendered documents must be self-contained."""
+    config = get_or_create_config()
+    for option in options:
+        key, _, value = option.partition('=')
+        config[CONFIG_KEY][key.strip()] = value.strip()
+    config[CONFIG_KEY]['streamArchives'] = 'no'
+    config[CONFIG_KEY]['progressiveRendering'] = 'no'
+    config[CONFIG_KEY]['sharedAssets'] = 'no'
+    # Cached thumbnails are evicted, and are not moved along with the output
+    config[CONFIG_KEY]['thumbnailCacheSize'] = '0'
+    return config
+
+
+def find_external_uris(outpath: Path, allowed: List[Path]) -> List[str]:
+    """Find the file:// URIs in the documents rendered to outpath that point outside of it, and of
+    the allowed directories. The files they point to are not moved or archived along with the
+    output.
+
+    Parameters:
+    * `allowed`: directories that documents may load files from, such as an input folder whose
+      images are displayed in place.
+
+    Returns: the URIs pointing elsewhere.
+    """
+    roots = [outpath.resolve(), *(root.resolve() for root in allowed)]
+    external = []
+    for document in outpath.iterdir():
+        if document.suffix not in ('.html', '.js'):
+            continue
+        for uri in FILE_URI_PATTERN.findall(document.read_text(encoding='utf-8')):
+            target = Path(url2pathname(unquote(urlsplit(uri).path))).resolve()
+            if not any(root == target or root in target.parents for root in roots):
+                external.append(uri)
+    return external
+
+
+def output_paths(inputs: List[str], out: Path) -> List[Path]:
+    """Get a distinct output directory for each input, named after the input."""
+    seen = set()
+    paths = []
+    for i, input_path in enumerate(inputs):
+        name = Path(input_path).resolve().name
+        if name in seen:
+            name = f'{name}-{i}'
+        seen.add(name)
+        paths.append(out / name)
+    return paths
+
+
+def render_one(
+    input_path: str,
+    outpath: Path,
+    version: str,
+    config: ConfigParser,
+    executor: Executor,
+    thumbnail_cache: Optional[ThumbnailCache],
+    timeout: Optional[float],
+) -> Dict[str, Any]:
+    """Render a single input and wait for its thumbnails and display variants. If they are not
+    complete within timeout seconds, the jobs not started yet are cancelled.
+
+    Returns: machine readable report of the result and the time spent in each stage.
+    """
+    lib_dir = Path(__file__).parent
+    timer = StageTimer()
+    progress = ProgressCounter()
+    background_complete = Event()
+    cancel = CancellationToken()
+    start = time.perf_counter()
+    report: Dict[str, Any] = {'input': input_path}
+    try:
+        bootfile = extract_render(
+            path=input_path,
+            version=version,
+            doc_template_path=str(lib_dir / templates.HTML_TEMPLATES['doc']),
+            page_template_path=str(lib_dir / templates.HTML_TEMPLATES['page']),
+            boot_template_path=str(lib_dir / templates.HTML_TEMPLATES['boot']),
+            asset_paths=(lib_dir / asset for asset in templates.ASSETS),
+            img_types=templates.DEFAULT_IMAGETYPES,
+            config=config,
+            progress_bar=progress,
+            outpath=outpath,
+            executor=executor,
+            thumbnail_cache=thumbnail_cache,
+            timer=timer,
+            serve_focus=False,
+            on_complete=background_complete.set,
+            cancel=cancel,
+        )
+        with timer.stage('thumbnails_wait'):
+            complete = background_complete.wait(timeout)
+        if not complete:
+            cancel.cancel()
+            raise TimeoutError(
+                f'Thumbnails and display variants were not complete after {timeout} seconds'
+            )
+        # Images of folders and single images are displayed from where they are
+        input_root = Path(input_path).resolve()
+        if input_root.suffix[1:].lower() in templates.DEFAULT_IMAGETYPES:
+            input_root = input_root.parent
+        external = find_external_uris(outpath, [input_root] if input_root.is_dir() else [])
+        if external:
+            raise RuntimeError(f'Rendered document loads files outside of {outpath}: {external[0]}')
+        report.update(status='ok', output=str(bootfile))
+    except Exception as e:
+        report.update(status='error', error=f'{type(e).__name__}: {e}')
+        traceback.print_exc(file=sys.stderr)
+    report.update(timer.to_dict())
+    report['thumbnails'] = {'processed': progress.count, 'cached': progress.cached}
+    report['seconds'] = round(time.perf_counter() - start, 6)
+    return report
+
+
+def render_command(args: Namespace) -> int:
+    working_dir = getattr(sys, '_MEIPASS', Path(__file__).resolve().parent.parent)
+    version = (Path(working_dir) / 'version').read_text(encoding='utf-8').strip()
+    config = get_headless_config(args.option)
+    out = Path(args.out).resolve()
+    executor = create_thumbnail_executor(config)
+    thumbnail_cache = get_thumbnail_cache(config)
+    print_lock = Lock()
+    failed = 0
+
+    def run(input_path: str, outpath: Path) -> None:
+        nonlocal failed
+        report = render_one(
+            input_path, outpath, version, config, executor, thumbnail_cache, args.timeout
+        )
+        with print_lock:
+            failed += report['status'] != 'ok'
+            print(json.dumps(report), flush=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as jobs:
+        for input_path, outpath in zip(args.inputs, output_paths(args.inputs, out)):
+            jobs.submit(run, input_path, outpath)
+    executor.shutdown(wait=True)
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.command == 'render':
+        return render_command(args)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
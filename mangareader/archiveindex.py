@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import threading
+from configparser import ConfigParser
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import appdirs
+
+from mangareader.config import CONFIG_KEY
+from mangareader.dirscan import natural_sort_key
+from mangareader.thumbcache import CACHE_VERSION as THUMBNAIL_CACHE_VERSION
+from mangareader.thumbcache import member_thumbnail_key, thumbnail_key
+
+# Bump when the index format or the way pages are listed changes, so that stale indexes are rebuilt
+INDEX_VERSION = '2'
+
+
+class IndexedPage(NamedTuple):
+    """Image member of an archive, with everything needed to display it without reading it."""
+
+    name: str
+    file_size: int
+    crc: Optional[int]
+    # Offset of the local file header of zip members
+    offset: Optional[int]
+    dimensions: Optional[Tuple[int, int]]
+    thumbnail_key: str
+
+
+class ArchiveIndex(NamedTuple):
+    """Image members of an archive in reading order, as of the given size and modification time of
+    the archive file."""
+
+    path: str
+    size: int
+    mtime: int
+    img_types: List[str]
+    pages: List[IndexedPage]
+
+    def is_current(self, stat: os.stat_result, img_types: Iterable[str]) -> bool:
+        """Whether the index still describes the archive, given its current `os.stat()`."""
+        return (
+            self.size == stat.st_size
+            and self.mtime == stat.st_mtime_ns
+            and self.img_types == sorted(set(img_types))
+        )
+
+    @property
+    def names(self) -> List[str]:
+        return [page.name for page in self.pages]
+
+    @property
+    def dimensions(self) -> List[Optional[Tuple[int, int]]]:
+        return [page.dimensions for page in self.pages]
+
+    @property
+    def thumbnail_keys(self) -> List[str]:
+        return [page.thumbnail_key for page in self.pages]
+
+    def with_dimensions(self, dimensions: Sequence[Optional[Tuple[int, int]]]) -> 'ArchiveIndex':
+        """Get a copy of the index with the dimensions of the first `len(dimensions)` pages
+        replaced."""
+        pages = [
+            page._replace(dimensions=size) if size else page
+            for page, size in zip(self.pages, dimensions)
+        ]
+        return self._replace(pages=pages + self.pages[len(pages) :])
+
+
+def index_archive(
+    archive: Any,
+    path: Path,
+    stat: os.stat_result,
+    img_types: Iterable[str],
+    previous: Optional[ArchiveIndex] = None,
+) -> ArchiveIndex:
+    """List the image members of an open archive in natural sort order.
+
+    Parameters:
+    * `archive`: open archive, or `ArchiveReader`, with zipfile-like `namelist()` and `getinfo()`.
+    * `path`: resolved path of the archive.
+    * `stat`: `os.stat()` of the archive.
+    * `img_types`: list of recognized image file extensions.
+    * `previous`: outdated index of the same archive. The dimensions of members with the same name,
+      size and CRC are kept, the rest are left unknown.
+
+    Returns: index of the archive. Of several members with the same name, only one is listed.
+    """
+    img_types = sorted(set(img_types))
+    extensions = set(img_types)
+    known: Dict[Tuple[str, int, int], Tuple[int, int]] = {
+        (page.name, page.file_size, page.crc): page.dimensions
+        for page in (previous.pages if previous else [])
+        if page.crc is not None and page.dimensions
+    }
+    names = sorted(
+        dict.fromkeys(
+            name for name in archive.namelist() if name.split('.')[-1].lower() in extensions
+        ),
+        key=natural_sort_key,
+    )
+    pages = []
+    for name in names:
+        info = archive.getinfo(name)
+        crc = getattr(info, 'CRC', None)
+        pages.append(
+            IndexedPage(
+                name=name,
+                file_size=info.file_size,
+                crc=crc,
+                offset=getattr(info, 'header_offset', None),
+                dimensions=known.get((name, info.file_size, crc)) if crc is not None else None,
+                thumbnail_key=(
+                    member_thumbnail_key(name, info.file_size, crc)
+                    if crc is not None
+                    else thumbnail_key(f'{path}|{name}', stat.st_size, stat.st_mtime_ns)
+                ),
+            )
+        )
+    return ArchiveIndex(str(path), stat.st_size, stat.st_mtime_ns, img_types, pages)
+
+
+class ArchiveIndexStore:
+    """Persistent store of archive indexes, so that reopening an unchanged archive does not list,
+    sort or size its pages again.
+
+    Each index is a small JSON file named after the path of its archive. Checking whether an index
+    is current costs a single stat call of the archive. Only the `max_entries` most recently used
+    indexes are kept.
+    """
+
+    path: Path
+    max_entries: int
+    _lock: threading.Lock
+
+    def __init__(self, path: Union[Path, str], max_entries: int = 512):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, archive: Union[Path, str]) -> Path:
+        """Get the location of the index of an archive. The file may not exist yet."""
+        key = hashlib.sha1(str(archive).encode('utf-8')).hexdigest()
+        return self.path / f'{key}.json'
+
+    def load(self, archive: Union[Path, str]) -> Optional[ArchiveIndex]:
+        """Load the stored index of an archive, which may be outdated. Returns None if there is
+        none, or it was written by another version of the app."""
+        index_file = self.path_for(archive)
+        try:
+            data = json.loads(index_file.read_text(encoding='utf-8'))
+            if (
+                data['version'] != INDEX_VERSION
+                or data['thumbnailVersion'] != THUMBNAIL_CACHE_VERSION
+                or data['path'] != str(archive)
+            ):
+                return None
+            os.utime(index_file)
+            return ArchiveIndex(
+                data['path'],
+                data['size'],
+                data['mtime'],
+                data['imgTypes'],
+                [
+                    IndexedPage(name, size, crc, offset, tuple(dims) if dims else None, key)
+                    for name, size, crc, offset, dims, key in data['pages']
+                ],
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, index: ArchiveIndex) -> None:
+        """Store the index of an archive, replacing any previous one."""
+        data = {
+            'version': INDEX_VERSION,
+            'thumbnailVersion': THUMBNAIL_CACHE_VERSION,
+            'path': index.path,
+            'size': index.size,
+            'mtime': index.mtime,
+            'imgTypes': index.img_types,
+            'pages': [
+                [
+                    page.name,
+                    page.file_size,
+                    page.crc,
+                    page.offset,
+                    page.dimensions,
+                    page.thumbnail_key,
+                ]
+                for page in index.pages
+            ],
+        }
+        index_file = self.path_for(index.path)
+        temp_file = index_file.with_name(f'{index_file.stem}-{threading.get_ident()}.tmp')
+        try:
+            temp_file.write_text(json.dumps(data, separators=(',', ':')), encoding='utf-8')
+            os.replace(temp_file, index_file)
+        except OSError:
+            try:
+                temp_file.unlink()
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete the least recently used indexes beyond `max_entries`."""
+        with self._lock:
+            entries = []
+            for entry in self.path.glob('*.json'):
+                try:
+                    entries.append((entry.stat().st_mtime, entry))
+                except OSError:
+                    continue
+            for _, entry in sorted(entries)[: max(0, len(entries) - self.max_entries)]:
+                try:
+                    entry.unlink()
+                except OSError:
+                    continue
+
+
+def get_archive_index_store(config: ConfigParser) -> Optional[ArchiveIndexStore]:
+    r"""Get the archive index store in the user's cache directory. Returns None if disabled by the
+    `archiveIndex` config option.
+
+    Examples:
+        Windows 10: `C:\Users\username\AppData\Local\html-mangareader\Cache\indexes`
+        MacOS: `/Users/username/Library/Caches/html-mangareader/indexes`
+    """
+    if not config[CONFIG_KEY].getboolean('archiveIndex', fallback=True):
+        return None
+    cache_path = Path(appdirs.user_cache_dir('html-mangareader', appauthor=False)) / 'indexes'
+    try:
+        return ArchiveIndexStore(cache_path)
+    except OSError:
+        return None
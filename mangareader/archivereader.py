@@ -0,0 +1,350 @@
+import io
+import mmap
+import os
+import struct
+import zipfile
+import zlib
+from contextlib import contextmanager
+from importlib import import_module
+from io import BytesIO
+from pathlib import Path
+from threading import Lock
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+
+from mangareader.excepts import ImagesNotFound
+from mangareader.templates import _7Z_TYPES, RAR_TYPES, ZIP_TYPES
+
+if TYPE_CHECKING:
+    import rarfile
+
+    from mangareader.sevenzipadapter import SevenZipAdapter
+
+Archive = Union[zipfile.ZipFile, 'rarfile.RarFile', 'SevenZipAdapter']
+
+
+class ArchivePage(NamedTuple):
+    """Reference to an image inside an archive, which is read on demand instead of extracted."""
+
+    archive: Path
+    name: str
+
+
+class ArchiveFormat(NamedTuple):
+    """Archive file format, and where its reader is implemented. Readers are referred to by name
+    as `module:attribute`, and only imported once an archive of their format is opened, so that
+    starting the app does not load every archive library."""
+
+    name: str
+    extensions: Set[str]
+    # zipfile-like class, called as reader(path, mode='r')
+    reader: str
+    # Exception raised by the reader if a file is not a valid archive
+    error: str
+
+    def open(self, path: Union[Path, str]) -> Archive:
+        return _load(self.reader)(path, mode='r')
+
+    def error_type(self) -> Type[Exception]:
+        return _load(self.error)
+
+
+ARCHIVE_FORMATS: List[ArchiveFormat] = [
+    ArchiveFormat('zip/cbz', ZIP_TYPES, 'zipfile:ZipFile', 'zipfile:BadZipFile'),
+    ArchiveFormat('rar/cbr', RAR_TYPES, 'rarfile:RarFile', 'rarfile:BadRarFile'),
+    ArchiveFormat(
+        '7z/cb7', _7Z_TYPES, 'mangareader.sevenzipadapter:SevenZipAdapter', 'py7zr:Bad7zFile'
+    ),
+]
+
+
+def _load(name: str) -> Any:
+    module, _, attribute = name.partition(':')
+    return getattr(import_module(module), attribute)
+
+
+def get_archive_format(path: Union[Path, str]) -> Optional[ArchiveFormat]:
+    """Get the archive format matching the file extension of path, or None if it is not an
+    archive."""
+    file_ext = Path(path).suffix.lower()[1:]
+    return next((f for f in ARCHIVE_FORMATS if file_ext in f.extensions), None)
+
+
+def open_archive(path: Union[Path, str]) -> Archive:
+    """Open an archive file with the reader matching its file extension.
+
+    Throws: `ImagesNotFound` if the file extension is not a recognized archive format.
+    """
+    archive_format = get_archive_format(path)
+    if not archive_format:
+        raise ImagesNotFound(f'Unknown archive format: {path}')
+    return archive_format.open(path)
+
+
+class ArchiveReader:
+    """Open archive handle that can be shared between threads to read individual members.
+
+    Zip archives are also memory mapped, so that members stored without compression, as most
+    image members are, can be read in place as a view of the mapping, without copying them or
+    taking the lock. The mapping stays open until the reader is closed and every view of it has
+    been released.
+    """
+
+    path: Path
+    _archive: Archive
+    _lock: Lock
+    _file: Optional[BinaryIO]
+    _mmap: Optional[mmap.mmap]
+    # Start and end offset in the mapping of each stored member looked up so far, whose CRC has
+    # been checked
+    _spans: Dict[str, Optional[Tuple[int, int]]]
+    # Number of views of the mapping not yet released
+    _views: int
+    _closed: bool
+
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+        self._archive = open_archive(path)
+        self._lock = Lock()
+        self._file = None
+        self._mmap = None
+        self._spans = {}
+        self._views = 0
+        self._closed = False
+        if isinstance(self._archive, zipfile.ZipFile):
+            archive_file = open(path, 'rb')
+            try:
+                self._mmap = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+                # Kept open to tell whether the mapped file has been truncated since
+                self._file = archive_file
+            except (OSError, ValueError):
+                # Empty files cannot be mapped, and some file systems do not support it
+                archive_file.close()
+
+    def namelist(self) -> List[str]:
+        return self._archive.namelist()
+
+    def getinfo(self, name: str):
+        """Get the metadata of an archive member, see `zipfile.ZipFile.getinfo()`."""
+        return self._archive.getinfo(name)
+
+    def read(self, name: str) -> bytes:
+        """Read the entire contents of an archive member into memory."""
+        with self._lock:
+            return self._archive.read(name)
+
+    @contextmanager
+    def view(self, name: str) -> Iterator[Optional[memoryview]]:
+        """Get the contents of an archive member as a read-only view of the memory mapped archive,
+        without copying it. The view is released at the end of the `with` block, and must not be
+        used after it. The CRC of each member is checked when it is first viewed.
+
+        Returns: view of the member, or None if the member is compressed or encrypted, the archive
+        is not a memory mapped zip archive, or the archive has been truncated since it was mapped.
+
+        Throws: `KeyError` if the member does not exist, `zipfile.BadZipFile` if its CRC does not
+        match.
+        """
+        view = self._acquire(name)
+        try:
+            yield view
+        finally:
+            if view is not None:
+                view.release()
+                self._release()
+
+    def open(self, name: str) -> BinaryIO:
+        """Open an archive member as a binary file object. Stored members of zip archives are read
+        in place from the memory mapped archive until the file object is closed."""
+        view = self._acquire(name)
+        if view is not None:
+            return MemoryFile(view, on_close=self._release)
+        return BytesIO(self.read(name))
+
+    def close(self) -> None:
+        """Close the archive. The memory mapping is unmapped once the views of its members still
+        in use, if any, have been released."""
+        with self._lock:
+            self._archive.close()
+            self._closed = True
+            if not self._views:
+                self._close_mapping()
+
+    def _acquire(self, name: str) -> Optional[memoryview]:
+        if name not in self._spans:
+            with self._lock:
+                span = self._find_stored_member(name)
+            if span is not None:
+                self._check_crc(name, span)
+            self._spans[name] = span
+        span = self._spans[name]
+        return self._acquire_span(span) if span else None
+
+    def _acquire_span(self, span: Tuple[int, int]) -> Optional[memoryview]:
+        with self._lock:
+            mapping = self._mmap
+            if self._closed or mapping is None or self._file is None:
+                return None
+            # Reading a mapped page beyond the end of a truncated file crashes the process
+            if os.fstat(self._file.fileno()).st_size < len(mapping):
+                return None
+            self._views += 1
+        whole = memoryview(mapping)
+        view = whole[span[0] : span[1]]
+        whole.release()
+        return view
+
+    def _release(self) -> None:
+        with self._lock:
+            self._views -= 1
+            if self._closed and not self._views:
+                self._close_mapping()
+
+    def _close_mapping(self) -> None:
+        if self._mmap:
+            self._mmap.close()
+            self._mmap = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _check_crc(self, name: str, span: Tuple[int, int]) -> None:
+        data = self._acquire_span(span)
+        if data is None:
+            return
+        try:
+            crc = zlib.crc32(data)
+        finally:
+            data.release()
+            self._release()
+        if crc != self._archive.getinfo(name).CRC:
+            raise zipfile.BadZipFile(f'Bad CRC-32 for file {name!r}')
+
+    def _find_stored_member(self, name: str) -> Optional[Tuple[int, int]]:
+        if not self._mmap or not isinstance(self._archive, zipfile.ZipFile):
+            return None
+        info = self._archive.getinfo(name)
+        if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+            return None
+        # The name and extra field lengths in the local file header may differ from those in the
+        # central directory, so the data offset is read from the local header itself
+        header = self._mmap[info.header_offset : info.header_offset + _LOCAL_HEADER_SIZE]
+        if len(header) < _LOCAL_HEADER_SIZE or header[:4] != b'PK\x03\x04':
+            return None
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        start = info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length
+        if start + info.compress_size > len(self._mmap):
+            return None
+        return start, start + info.compress_size
+
+
+# Size of the fixed part of a zip local file header
+_LOCAL_HEADER_SIZE = 30
+
+
+class MemoryFile(io.RawIOBase):
+    """Read-only binary file object over a buffer, such as a view of a memory mapped archive
+    member. The buffer is not copied, only the parts that are read."""
+
+    _buffer: memoryview
+    _position: int
+    _on_close: Optional[Callable[[], None]]
+
+    def __init__(self, buffer: memoryview, on_close: Optional[Callable[[], None]] = None):
+        """
+        Parameters:
+        * `on_close`: called once the file is closed and the buffer released.
+        """
+        super().__init__()
+        self._buffer = buffer
+        self._position = 0
+        self._on_close = on_close
+
+    def close(self) -> None:
+        if not self.closed:
+            self._buffer.release()
+            if self._on_close:
+                self._on_close()
+        super().close()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        end = len(self._buffer) if size is None or size < 0 else self._position + size
+        data = self._buffer[self._position : end].tobytes()
+        self._position += len(data)
+        return data
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, buffer) -> int:
+        data = self._buffer[self._position : self._position + len(buffer)]
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._buffer)
+        if offset < 0:
+            raise ValueError(f'Negative seek position {offset}')
+        self._position = offset
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+# Shared reader of each archive, with the size and modification time of the archive it was opened at
+_readers: Dict[Path, Tuple[Tuple[int, int], ArchiveReader]] = {}
+_readers_lock = Lock()
+
+
+def get_reader(path: Union[Path, str]) -> ArchiveReader:
+    """Get the shared reader for an archive, opening it if it is not already open. If the archive
+    has changed since, as of its size and modification time, it is opened again and the outdated
+    reader is closed, so that a long running app never reads a stale copy. Views of the outdated
+    reader still in use stay valid until they are released.
+
+    Throws: `OSError` if the archive cannot be read.
+    """
+    path = Path(path)
+    # Taken before opening, so that a change while opening is noticed by the next call
+    stat = os.stat(path)
+    version = (stat.st_size, stat.st_mtime_ns)
+    with _readers_lock:
+        cached = _readers.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+        reader = ArchiveReader(path)
+        _readers[path] = (version, reader)
+    if cached:
+        cached[1].close()
+    return reader
+
+
+def open_page(page: Union[Path, str, ArchivePage]) -> BinaryIO:
+    """Open an image file or archive page as a binary file object."""
+    if isinstance(page, ArchivePage):
+        return get_reader(page.archive).open(page.name)
+    return open(page, 'rb')
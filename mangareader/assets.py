@@ -0,0 +1,186 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from configparser import ConfigParser
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import appdirs
+
+from mangareader.config import CONFIG_KEY
+from mangareader.reporter import StageTimer
+
+BUNDLES_PATH = Path(appdirs.user_cache_dir('html-mangareader', appauthor=False)) / 'assets'
+# Bundles unused for longer than this are deleted. Longer than sessions are kept by default, so
+# that documents still open in the browser keep their assets.
+BUNDLE_MAX_AGE = 7 * 24 * 60 * 60
+BUNDLE_TEMP_PREFIX = '.tmp-'
+
+# Content hash of each asset file, as of its modification time and size
+_digests: Dict[str, Tuple[int, int, str]] = {}
+_digests_lock = threading.Lock()
+
+
+def file_digest(path: Union[Path, str]) -> str:
+    """Get the SHA-256 hash of the content of a file. Hashes are kept in memory while the file is
+    unchanged, so that checking the hash of an unchanged file costs a single stat call."""
+    key = os.fspath(path)
+    stat = os.stat(key)
+    with _digests_lock:
+        cached = _digests.get(key)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(key, 'rb') as asset_file:
+        for chunk in iter(lambda: asset_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    with _digests_lock:
+        _digests[key] = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def bundle_digest(asset_paths: Iterable[Union[Path, str]]) -> str:
+    """Get the content hash of a set of asset files, from their names and contents. It changes with
+    any asset, so that a bundle is never reused by another version of the app."""
+    digest = hashlib.sha256()
+    for asset in sorted(asset_paths, key=lambda p: Path(p).name):
+        digest.update(f'{Path(asset).name}\0{file_digest(asset)}\0'.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def install_bundle(
+    asset_paths: Iterable[Union[Path, str]],
+    root: Union[Path, str] = BUNDLES_PATH,
+    timer: Optional[StageTimer] = None,
+) -> Path:
+    """Install static assets into a directory named after their content hash, unless installed
+    already. Bundles are written to a temporary directory and renamed into place, so a bundle that
+    exists is always complete, even with several instances of the app installing it at once.
+
+    Parameters:
+    * `asset_paths`: paths of the static assets.
+    * `root`: directory to install bundles in.
+    * `timer`: records the bytes written as the `assets` stage.
+
+    Returns: path to the bundle.
+
+    Throws: `OSError` if the bundle could not be installed.
+    """
+    asset_paths = list(asset_paths)
+    root = Path(root)
+    bundle = root / bundle_digest(asset_paths)
+    if bundle.is_dir():
+        # Marks the bundle as used, see `remove_stale_bundles`
+        os.utime(bundle)
+        return bundle
+    root.mkdir(parents=True, exist_ok=True)
+    temp_path = Path(tempfile.mkdtemp(prefix=BUNDLE_TEMP_PREFIX, dir=root))
+    try:
+        for asset in asset_paths:
+            shutil.copy(asset, temp_path)
+        try:
+            os.rename(temp_path, bundle)
+        except OSError:
+            if not bundle.is_dir():
+                raise
+            # Installed by another instance of the app in the meantime
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return bundle
+    except OSError:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        raise
+    if timer:
+        timer.add_io('assets', written=sum(os.path.getsize(asset) for asset in asset_paths))
+    threading.Thread(target=remove_stale_bundles, args=(root, bundle), daemon=True).start()
+    return bundle
+
+
+def bundle_files(bundle: Path, asset_paths: Iterable[Union[Path, str]]) -> List[Path]:
+    """Get the paths of assets within an installed bundle."""
+    return [bundle / Path(asset).name for asset in asset_paths]
+
+
+def remove_stale_bundles(root: Union[Path, str], keep: Path, max_age: float = BUNDLE_MAX_AGE):
+    """Delete bundles, and temporary directories left behind by interrupted installs, that have not
+    been used for max_age seconds.
+
+    Parameters:
+    * `root`: directory containing bundles.
+    * `keep`: bundle that is never deleted, normally the current one.
+    """
+    now = time.time()
+    for entry in Path(root).iterdir():
+        try:
+            if entry == keep or not entry.is_dir() or now - entry.stat().st_mtime < max_age:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+
+
+def link_assets(
+    asset_paths: Iterable[Union[Path, str]], dest_path: Path, timer: Optional[StageTimer] = None
+) -> None:
+    """Hard link static assets into a directory, or copy them where hard links are not supported,
+    such as across file systems. Existing files are replaced.
+
+    Parameters:
+    * `timer`: records the bytes copied as the `assets` stage.
+    """
+    copied = 0
+    for asset in asset_paths:
+        target = dest_path / Path(asset).name
+        try:
+            target.unlink()
+        except OSError:
+            pass
+        try:
+            os.link(asset, target)
+        except OSError:
+            shutil.copy(asset, target)
+            copied += target.stat().st_size
+    if timer:
+        timer.add_io('assets', written=copied)
+
+
+def prepare_assets(
+    asset_paths: Iterable[Union[Path, str]],
+    outpath: Path,
+    config: ConfigParser,
+    timer: Optional[StageTimer] = None,
+    root: Union[Path, str] = BUNDLES_PATH,
+) -> str:
+    r"""Make the static assets of the webapp available to a document written to outpath. The assets
+    are installed once into a shared bundle in the user's cache directory. With the `sharedAssets`
+    config option, the document loads them from the bundle directly, so that the browser reuses its
+    cache of them across documents. Otherwise the bundle is hard linked into outpath.
+
+    If the bundle cannot be installed, the assets are linked or copied into outpath instead.
+
+    Parameters:
+    * `asset_paths`: paths of the static assets.
+    * `outpath`: directory the document is written to.
+    * `config`: parsed `config.ini` file.
+    * `timer`: records the bytes written as the `assets` stage.
+    * `root`: directory to install bundles in.
+
+    Returns: URI prefix to load the assets from in the document, which is empty if they are in
+    outpath.
+
+    Examples:
+        Windows 10: `C:\Users\username\AppData\Local\html-mangareader\Cache\assets`
+        MacOS: `/Users/username/Library/Caches/html-mangareader/assets`
+    """
+    asset_paths = list(asset_paths)
+    try:
+        bundle = install_bundle(asset_paths, root, timer)
+    except OSError:
+        link_assets(asset_paths, outpath, timer)
+        return ''
+    if config[CONFIG_KEY].getboolean('sharedAssets', fallback=False):
+        return f'{bundle.as_uri()}/'
+    link_assets(bundle_files(bundle, asset_paths), outpath, timer)
+    return ''
@@ -41,6 +41,48 @@ def get_or_create_config() -> ConfigParser:
     if not 'dynamicImageLoading' in config[CONFIG_KEY]:
         config[CONFIG_KEY]['dynamicImageLoading'] = 'no'
         dirty = True
+    if not 'streamArchives' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['streamArchives'] = 'no'
+        dirty = True
+    if not 'thumbnailCacheSize' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['thumbnailCacheSize'] = '256'
+        dirty = True
+    if not 'thumbnailExecutor' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['thumbnailExecutor'] = 'thread'
+        dirty = True
+    if not 'thumbnailSprites' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['thumbnailSprites'] = 'no'
+        dirty = True
+    if not 'progressiveRendering' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['progressiveRendering'] = 'no'
+        dirty = True
+    if not 'displayMaxWidth' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['displayMaxWidth'] = '0'
+        dirty = True
+    if not 'sessionMaxAge' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['sessionMaxAge'] = '24'
+        dirty = True
+    if not 'sessionMaxSize' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['sessionMaxSize'] = '1024'
+        dirty = True
+    if not 'prefetchPages' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['prefetchPages'] = '4'
+        dirty = True
+    if not 'residentMode' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['residentMode'] = 'no'
+        dirty = True
+    if not 'residentTimeout' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['residentTimeout'] = '30'
+        dirty = True
+    if not 'archiveIndex' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['archiveIndex'] = 'yes'
+        dirty = True
+    if not 'sharedAssets' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['sharedAssets'] = 'no'
+        dirty = True
+    if not 'libraryFolders' in config[CONFIG_KEY]:
+        config[CONFIG_KEY]['libraryFolders'] = 'no'
+        dirty = True
     if dirty:
         with open(config_path, 'w') as config_file:
             config.write(config_file)
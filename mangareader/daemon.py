@@ -0,0 +1,150 @@
+import json
+import os
+import socket
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+import appdirs
+
+SOCKET_PATH = Path(appdirs.user_cache_dir('html-mangareader', appauthor=False)) / 'daemon.sock'
+# Longest open request accepted, which only carries a path and a few flags
+MAX_REQUEST_SIZE = 64 * 1024
+
+Request = Dict[str, Any]
+
+
+def is_supported() -> bool:
+    """Whether the platform supports Unix domain sockets, which resident mode is built on. They are
+    not available on Windows."""
+    return hasattr(socket, 'AF_UNIX')
+
+
+def send_open_request(
+    request: Request, socket_path: Union[Path, str] = SOCKET_PATH, timeout: float = 2
+) -> bool:
+    """Forward a request to open a file to the resident app, if one is running.
+
+    Parameters:
+    * `request`: open request, with the absolute `path` to open and whether to open it as a
+      `library`.
+    * `socket_path`: socket the resident app listens on.
+    * `timeout`: seconds to wait for the resident app to accept the request.
+
+    Returns: whether the request was accepted. False if no resident app is running.
+    """
+    if not is_supported():
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(str(socket_path))
+            client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with client.makefile('rb') as reply_file:
+                reply = json.loads(reply_file.readline() or b'{}')
+        return reply.get('status') == 'ok'
+    except (OSError, ValueError):
+        return False
+
+
+class DaemonServer:
+    """Listens for open requests forwarded by later instances of the app over a Unix domain
+    socket, so that a resident app can open them with its worker pools and caches already warm.
+
+    Only one resident app listens at a time. The socket is only accessible to the current user.
+    """
+
+    socket_path: Path
+    on_request: Callable[[Request], None]
+    _socket: Optional[socket.socket]
+
+    def __init__(
+        self, on_request: Callable[[Request], None], socket_path: Union[Path, str] = SOCKET_PATH
+    ):
+        """
+        Parameters:
+        * `on_request`: called with each valid request, from the server thread.
+        * `socket_path`: path to create the socket at.
+        """
+        self.socket_path = Path(socket_path)
+        self.on_request = on_request
+        self._socket = None
+
+    def start(self) -> bool:
+        """Start listening in the background.
+
+        Returns: whether the server was started. False if another resident app is listening
+        already, or the socket could not be created.
+        """
+        if not is_supported():
+            return False
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                server.bind(str(self.socket_path))
+            except OSError:
+                if self._is_listening():
+                    server.close()
+                    return False
+                # Left behind by a resident app that did not exit cleanly
+                self.socket_path.unlink()
+                server.bind(str(self.socket_path))
+            os.chmod(self.socket_path, 0o600)
+            server.listen(8)
+        except OSError:
+            server.close()
+            return False
+        self._socket = server
+        threading.Thread(target=self._serve, name='mangareader-daemon', daemon=True).start()
+        return True
+
+    def stop(self) -> None:
+        """Stop listening and remove the socket, so that later instances open files themselves."""
+        if not self._socket:
+            return
+        self._socket.close()
+        self._socket = None
+        try:
+            self.socket_path.unlink()
+        except OSError:
+            pass
+
+    def _is_listening(self) -> bool:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(1)
+                client.connect(str(self.socket_path))
+            return True
+        except OSError:
+            return False
+
+    def _serve(self) -> None:
+        while self._socket:
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                # Closed by stop()
+                return
+            with connection:
+                self._handle(connection)
+
+    def _handle(self, connection: socket.socket) -> None:
+        try:
+            connection.settimeout(5)
+            with connection.makefile('rb') as request_file:
+                line = request_file.readline(MAX_REQUEST_SIZE)
+            if not line:
+                # Checked whether the server is listening
+                return
+            request = json.loads(line)
+            if not isinstance(request, dict) or not isinstance(request.get('path'), str):
+                raise ValueError('Invalid open request')
+            self.on_request(request)
+            status = 'ok'
+        except (OSError, ValueError):
+            status = 'error'
+        try:
+            connection.sendall(json.dumps({'status': status}).encode('utf-8') + b'\n')
+        except OSError:
+            pass
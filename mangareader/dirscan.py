@@ -0,0 +1,48 @@
+import os
+import re
+from pathlib import Path
+from typing import Any, Iterable, List, Union
+
+_DIGITS = re.compile(r'(\d+)')
+
+
+def natural_sort_key(filename: Union[str, Path]) -> List[Any]:
+    """Natural sort comparison key function for filename sorting, so that `page2` sorts before
+    `page10`."""
+    parts: List[Any] = _DIGITS.split(str(filename).lower())
+    # Split with a capturing group puts the numbers at the odd indices
+    parts[1::2] = map(int, parts[1::2])
+    return parts
+
+
+def list_files(path: Union[Path, str]) -> List[str]:
+    """List the names of the files in a directory, in natural sort order. Hidden files are included.
+
+    Directories are listed with `os.scandir`, which tells files apart from directories without a
+    stat call per entry on most platforms.
+
+    Throws: `OSError` if the directory cannot be read.
+    """
+    with os.scandir(path) as entries:
+        names = [entry.name for entry in entries if entry.is_file()]
+    names.sort(key=natural_sort_key)
+    return names
+
+
+def list_paths(path: Union[Path, str], extensions: Iterable[str]) -> List[Path]:
+    """List the paths of the files in a directory with one of the given extensions, in natural
+    sort order.
+
+    Parameters:
+    * `path`: absolute path of the directory.
+    * `extensions`: lowercase file extensions without the leading dot.
+
+    Throws: `OSError` if the directory cannot be read.
+    """
+    extensions = frozenset(extensions)
+    directory = Path(path)
+    return [
+        directory / name
+        for name in list_files(path)
+        if os.path.splitext(name)[1][1:].lower() in extensions
+    ]
@@ -1,2 +1,6 @@
 class ImagesNotFound(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class OperationCancelled(Exception):
+    pass
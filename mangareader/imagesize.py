@@ -0,0 +1,95 @@
+import struct
+from typing import BinaryIO, Optional, Tuple
+
+# JPEG start-of-frame markers that carry the image dimensions. 0xC4 (DHT), 0xC8 (JPG) and 0xCC
+# (DAC) fall in the same range but are not frame headers.
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Markers that stand alone without a length field.
+_JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD9)}
+
+HEADER_SIZE = 32
+
+
+def probe_image_size(fp: BinaryIO) -> Optional[Tuple[int, int]]:
+    """Get the pixel dimensions (width, height) of an image by parsing only its header.
+
+    Supports JPEG, PNG/APNG, GIF, WebP and BMP. For JPEG, segments before the frame header are
+    skipped with `seek()`, so only a few hundred bytes are typically read regardless of embedded
+    EXIF/ICC data.
+
+    Parameters:
+    * `fp`: binary file object positioned at the start of the image.
+
+    Returns: dimensions of the image, or None if the format is not recognized or the header is
+    malformed.
+    """
+    head = fp.read(HEADER_SIZE)
+    if len(head) < 24:
+        return None
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', head[6:10])
+    if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+        return _probe_webp(head)
+    if head.startswith(b'\xff\xd8'):
+        fp.seek(2 - len(head), 1)
+        return _probe_jpeg(fp)
+    if head.startswith(b'BM') and len(head) >= 26:
+        width, height = struct.unpack('<ii', head[18:26])
+        return width, abs(height)
+    return None
+
+
+def _probe_webp(head: bytes) -> Optional[Tuple[int, int]]:
+    """Read dimensions from the first chunk of a WebP container."""
+    if len(head) < 30:
+        return None
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        # Lossy: 14-bit dimensions follow the 3-byte frame tag and 3-byte start code
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L':
+        # Lossless: 14-bit dimensions minus one, packed after the 0x2F signature byte
+        bits = struct.unpack('<I', head[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        # Extended: 24-bit canvas dimensions minus one
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return width, height
+    return None
+
+
+def _probe_jpeg(fp: BinaryIO) -> Optional[Tuple[int, int]]:
+    """Walk JPEG segment markers until a start-of-frame header is found."""
+    while True:
+        byte = fp.read(1)
+        # Skip any fill bytes preceding the marker
+        while byte == b'\xff':
+            byte = fp.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in _JPEG_STANDALONE_MARKERS:
+            continue
+        if marker == 0xD9 or marker == 0xDA:
+            # End of image or start of scan reached without a frame header
+            return None
+        length_bytes = fp.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if marker in _JPEG_SOF_MARKERS:
+            frame = fp.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack('>HH', frame[1:5])
+            return width, height
+        if length < 2:
+            return None
+        fp.seek(length - 2, 1)
+        # The next byte should be the 0xFF prefix of the following marker
+        if fp.read(1) != b'\xff':
+            return None
@@ -0,0 +1,358 @@
+import html
+import os
+import threading
+import traceback
+from configparser import ConfigParser
+from concurrent.futures import Executor
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Set, Union
+
+from mangareader.dirscan import list_files
+from mangareader.excepts import ImagesNotFound, OperationCancelled
+from mangareader.mangarender import (
+    compile_template,
+    create_out_path,
+    extract_render,
+    resolve_template,
+)
+from mangareader.reporter import CancellationToken, ProgressReporter, StageTimer
+from mangareader.sessions import touch_session
+from mangareader.templates import _7Z_TYPES, RAR_TYPES, ZIP_TYPES
+from mangareader.thumbcache import ThumbnailCache, get_thumbnail_cache
+from mangareader.thumbnails import create_thumbnail_executor
+
+LIBRARY_TYPES = ZIP_TYPES | RAR_TYPES | _7Z_TYPES
+# Number of volumes after the one being read that are rendered ahead of time
+PREFETCH_VOLUMES = 1
+
+
+def scan_library(path: Union[Path, str]) -> List[Path]:
+    """Scan a series directory for comic book archives.
+
+    Returns: list of paths to archives, in natural sort order.
+
+    Throws: `ImagesNotFound` if the directory contains no archives.
+    """
+    volumes = [
+        Path(path) / name
+        for name in list_files(path)
+        if os.path.splitext(name)[1][1:].lower() in LIBRARY_TYPES and not name.startswith('.')
+    ]
+    if not volumes:
+        raise ImagesNotFound(f'No comic book archives were found in directory: {path}')
+    return volumes
+
+
+def is_library(path: Union[Path, str], img_types: Iterable[str]) -> bool:
+    """Determine whether path is a series directory, which contains comic book archives but no
+    images."""
+    if not os.path.isdir(path):
+        return False
+    img_types = set(img_types)
+    has_archives = False
+    for name in list_files(path):
+        ext = os.path.splitext(name)[1][1:].lower()
+        if ext in img_types:
+            return False
+        has_archives = has_archives or ext in LIBRARY_TYPES
+    return has_archives
+
+
+def render_status(
+    outfile: Path,
+    title: str,
+    message: str,
+    refresh: str,
+    status_template: str,
+    request: str = '',
+):
+    """Render a placeholder page in place of a volume document that is not available.
+
+    Parameters:
+    * `refresh`: seconds until the page reloads itself, or empty to not reload.
+    * `request`: URL the page requests each time it is loaded, to have the app render the volume.
+    """
+    outfile.write_text(
+        compile_template(status_template).substitute(
+            title=html.escape(title),
+            message=html.escape(message),
+            refresh=refresh,
+            request=html.escape(request),
+        ),
+        encoding='utf-8',
+    )
+
+
+def render_navigation(
+    index: int,
+    title: str,
+    volumes: List[Path],
+    links: List[str],
+    library_link: str,
+    library_url: str,
+    navigation_template: str,
+) -> str:
+    """Render the links from a volume document to the previous and next volumes and to the index
+    document. The document reports itself to the app at `library_url` when opened, so that the
+    volumes after it are rendered ahead of time.
+
+    Parameters:
+    * `index`: index of the volume in volumes.
+    * `title`: title of the series.
+    * `links`: relative URL of each volume from the volume document.
+    * `library_link`: relative URL of the index document from the volume document.
+    * `library_url`: URL of the local server the webapp reports the opened volume to.
+
+    Returns: HTML of the navigation links.
+    """
+    has_prev, has_next = index > 0, index < len(volumes) - 1
+    return compile_template(navigation_template).substitute(
+        id=index,
+        libraryurl=html.escape(library_url),
+        prev=links[index - 1] if has_prev else '#_none',
+        prevtitle=html.escape(volumes[index - 1].stem) if has_prev else '',
+        index=library_link,
+        title=html.escape(title),
+        next=links[index + 1] if has_next else '#_none',
+        nexttitle=html.escape(volumes[index + 1].stem) if has_next else '',
+    )
+
+
+def render_library_index(
+    outfile: Path,
+    title: str,
+    version: str,
+    volumes: List[Path],
+    links: List[Path],
+    library_template: str,
+    volume_template: str,
+) -> Path:
+    """Render the index document linking to each volume of a series."""
+    entry_template = compile_template(volume_template)
+    entries = ''.join(
+        entry_template.substitute(
+            id=i, link=link.relative_to(outfile.parent).as_posix(), title=html.escape(volume.stem)
+        )
+        for i, (volume, link) in enumerate(zip(volumes, links))
+    )
+    outfile.write_text(
+        compile_template(library_template).substitute(
+            title=html.escape(title), version=version, volumes=entries
+        ),
+        encoding='utf-8',
+    )
+    return outfile
+
+
+class VolumeQueue:
+    """Renders the volumes of a library in the background as the reader gets to them. When a volume
+    is opened, it is rendered unless rendered already, followed by the `PREFETCH_VOLUMES` volumes
+    after it, so that moving on to the next volume is instant without rendering the whole series
+    up front.
+
+    Volumes are rendered one at a time in a background daemon thread, which exits once no volumes
+    are queued, so that closing the app does not wait for a volume to finish. A volume that fails to render is replaced by an error page instead. Once `cancel` is
+    cancelled, no further volumes are rendered.
+    """
+
+    render: Callable[..., Path]
+    volumes: List[Path]
+    outpaths: List[Path]
+    status_template: str
+    cancel: Optional[CancellationToken]
+    _queued: List[int]
+    _requested: Set[int]
+    _running: bool
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        render: Callable[..., Path],
+        volumes: List[Path],
+        outpaths: List[Path],
+        status_template: str,
+        cancel: Optional[CancellationToken] = None,
+        rendered: Iterable[int] = (),
+    ):
+        """
+        Parameters:
+        * `render`: renders the volume at the index passed as first argument.
+        * `outpaths`: directory each volume is written to.
+        * `rendered`: volumes that are rendered already.
+        """
+        self.render = render
+        self.volumes = volumes
+        self.outpaths = outpaths
+        self.status_template = status_template
+        self.cancel = cancel
+        self._queued = []
+        self._requested = set(rendered)
+        self._running = False
+        self._lock = threading.Lock()
+
+    def open(self, index: int) -> None:
+        """Queue a volume opened by the reader and the volumes after it, ahead of the volumes
+        queued already. May be called from any thread."""
+        end = min(index + PREFETCH_VOLUMES + 1, len(self.volumes))
+        with self._lock:
+            wanted = [i for i in range(max(index, 0), end) if i not in self._requested]
+            self._requested.update(wanted)
+            self._queued[:0] = wanted
+            if not wanted or self._running:
+                return
+            self._running = True
+        # Does not keep the app running once closed, the volume being rendered is left unfinished
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._queued or (self.cancel and self.cancel.cancelled):
+                    self._running = False
+                    return
+                i = self._queued.pop(0)
+            try:
+                self.render(i, progress_bar=None, cancel=self.cancel)
+            except OperationCancelled:
+                continue
+            except Exception:
+                render_status(
+                    self.outpaths[i] / 'boot.html',
+                    self.volumes[i].name,
+                    traceback.format_exc(),
+                    '',
+                    self.status_template,
+                )
+
+
+def render_library(
+    path: str,
+    version: str,
+    doc_template_path: str,
+    page_template_path: str,
+    boot_template_path: str,
+    library_template_path: str,
+    volume_template_path: str,
+    status_template_path: str,
+    navigation_template_path: str,
+    asset_paths: Iterable[str],
+    img_types: Iterable[str],
+    config: ConfigParser,
+    progress_bar: Optional[ProgressReporter],
+    outpath: Path,
+    executor: Optional[Executor] = None,
+    thumbnail_cache: Optional[ThumbnailCache] = None,
+    timer: Optional[StageTimer] = None,
+    on_complete: Optional[Callable[[], None]] = None,
+    cancel: Optional[CancellationToken] = None,
+    session: Optional[Path] = None,
+) -> Path:
+    """Library mode controller procedure. Renders every comic book archive in a series directory to
+    its own document, and an index document linking to all of them.
+
+    The opened volume is rendered first, and the next volumes are then rendered in the background,
+    see `VolumeQueue`. The other volumes are rendered once the reader opens them, or the volume
+    before them. Until then, each volume is a placeholder page that asks the app to render it and
+    reloads itself. Each volume document links to the previous and next volumes and the index
+    document. Volumes share one thumbnail worker pool and cache.
+
+    The app keeps running in the background to receive the opened volumes, until no volume has
+    been opened for 30 minutes.
+
+    Parameters:
+    * `path`: path to a series directory, or to an archive inside one to open that volume.
+    * `library_template_path`: path to HTML template for the index document.
+    * `volume_template_path`: path to HTML template for each volume link in the index.
+    * `status_template_path`: path to HTML template for placeholder and error pages.
+    * `navigation_template_path`: path to HTML template for the links between volumes.
+    * `outpath`: directory to write the library to. Each volume is written to a subdirectory.
+    * `executor`: worker pool to render thumbnails in. Defaults to a new pool.
+    * `thumbnail_cache`: thumbnail cache shared by all volumes. Defaults to the configured cache.
+    * `timer`, `on_complete`: see `extract_render`. Only apply to the opened volume.
+    * `cancel`: aborts rendering the opened volume, and the remaining volumes in the background.
+    * `session`: session directory the library is written to, which is marked as used whenever a
+      volume is opened, see `extract_render`.
+
+    See `extract_render` for the other parameters.
+
+    Returns: Path to the index document if a directory was opened, otherwise to the bootstrap
+    document of the opened volume.
+
+    Throws: `ImagesNotFound` if no archives are found, or errors from rendering the opened volume.
+    """
+    pPath = Path(path).resolve()
+    series_path = pPath.parent if pPath.is_file() else pPath
+    volumes = scan_library(series_path)
+    start = volumes.index(pPath) if pPath.is_file() else 0
+    library_template, volume_template, status_template, navigation_template = (
+        resolve_template(p)
+        for p in (
+            library_template_path,
+            volume_template_path,
+            status_template_path,
+            navigation_template_path,
+        )
+    )
+    # The web server pulls in much of the standard library, so it is only imported when used
+    from mangareader.pageserver import PageServer
+
+    # Receives the volumes opened by the reader, started once the opened volume is rendered
+    server = PageServer([], on_request=partial(touch_session, session) if session else None)
+    create_out_path(outpath)
+    outpaths = [outpath / f'volume-{i}' for i in range(len(volumes))]
+    for i, (volume, volume_path) in enumerate(zip(volumes, outpaths)):
+        create_out_path(volume_path)
+        render_status(
+            volume_path / 'boot.html',
+            volume.name,
+            'Preparing volume...',
+            '1',
+            status_template,
+            f'{server.url}/volume?index={i}',
+        )
+    index = render_library_index(
+        outpath / 'index.html',
+        series_path.name,
+        version,
+        volumes,
+        [volume_path / 'boot.html' for volume_path in outpaths],
+        library_template,
+        volume_template,
+    )
+
+    render = partial(
+        extract_render,
+        version=version,
+        doc_template_path=doc_template_path,
+        page_template_path=page_template_path,
+        boot_template_path=boot_template_path,
+        asset_paths=list(asset_paths),
+        img_types=list(img_types),
+        config=config,
+        executor=executor or create_thumbnail_executor(config),
+        thumbnail_cache=thumbnail_cache or get_thumbnail_cache(config),
+        session=session,
+    )
+    links = [f'../{volume_path.name}/boot.html' for volume_path in outpaths]
+
+    def render_volume(i: int, **kwargs) -> Path:
+        navigation = render_navigation(
+            i, series_path.name, volumes, links, '../index.html', server.url, navigation_template
+        )
+        return render(path=str(volumes[i]), outpath=outpaths[i], navigation=navigation, **kwargs)
+
+    try:
+        bootfile = render_volume(
+            start, progress_bar=progress_bar, timer=timer, on_complete=on_complete, cancel=cancel
+        )
+    except BaseException:
+        server.stop()
+        raise
+    queue = VolumeQueue(render_volume, volumes, outpaths, status_template, cancel, [start])
+    server.on_volume = queue.open
+    if cancel:
+        cancel.on_cancel(server.stop)
+    server.start()
+    queue.open(start)
+    return bootfile if pPath.is_file() else index
@@ -1,42 +1,139 @@
 import base64
+import html
 import json
 import os
-import re
 import tempfile
+import threading
+import time
 import zipfile
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from configparser import ConfigParser
+from functools import lru_cache, partial
+from itertools import repeat, zip_longest
 from multiprocessing import cpu_count
 from pathlib import Path
-from shutil import copy
 from string import Template
-from typing import Any, Iterable, List, Optional, Tuple, Union
-
-import py7zr
-import rarfile
-from PIL import Image
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
+from mangareader.archiveindex import (
+    ArchiveIndex,
+    ArchiveIndexStore,
+    get_archive_index_store,
+    index_archive,
+)
+from mangareader.archivereader import (
+    Archive,
+    ArchivePage,
+    get_archive_format,
+    get_reader,
+    open_archive,
+    open_page,
+)
+from mangareader.assets import prepare_assets
 from mangareader.config import CONFIG_KEY
+from mangareader.dirscan import list_paths
+from mangareader.dirscan import natural_sort_key as filename_comparator
 from mangareader.excepts import ImagesNotFound
-from mangareader.progress import MRProgressBar
-from mangareader.sevenzipadapter import SevenZipAdapter
-from mangareader.templates import _7Z_TYPES, IMG_PLACEHOLDER, RAR_TYPES, ZIP_TYPES
+from mangareader.imagesize import probe_image_size
+from mangareader.reporter import CancellationToken, ProgressReporter, StageTimer
+from mangareader.scheduler import ThumbnailScheduler, when_all_complete
+from mangareader.sessions import touch_session
+from mangareader.sprites import SpriteSheetWriter
+from mangareader.templates import IMG_PLACEHOLDER, STREAM_TYPES
+from mangareader.thumbcache import ThumbnailCache, get_thumbnail_cache
+from mangareader.thumbnails import (
+    VARIANT_TYPES,
+    create_thumbnail_executor,
+    render_display_variant,
+    render_thumbnail,
+)
+
+if TYPE_CHECKING:
+    from mangareader.pageserver import PageServer
+
+Page = Union[Path, str, ArchivePage]
 
+# Number of pages rendered into the document up front from the opened page, and in each later
+# batch, when `progressiveRendering` is enabled.
+PROGRESSIVE_BATCH_SIZE = 50
+# Number of pages before the opened page rendered into the document up front in progressive mode.
+# The pages before those are placeholders until their batch is rendered.
+PROGRESSIVE_PAGES_BEFORE = 10
+# Placeholder for the page list in the document template, which is streamed in separately
+PAGES_MARKER = '\0mangareader-pages\0'
+# Pages the webapp loads ahead of the reading position if `prefetchPages` is not a number
+DEFAULT_PREFETCH_PAGES = 4
 
-def get_image_size(path: Union[Path, str]) -> Optional[Tuple[int, int]]:
-    """Get the pixel dimensions (width, height) of an image file.
+
+def get_image_size(path: Page) -> Optional[Tuple[int, int]]:
+    """Get the pixel dimensions (width, height) of an image file or archive page.
+
+    The image header is parsed directly where the format is supported; Pillow is used as a fallback
+    for other formats.
 
     Returns None if file is not a valid image.
     """
     try:
-        with Image.open(path) as img:
-            return img.size
+        with open_page(path) as img_file:
+            size = probe_image_size(img_file)
+            if size:
+                return size
+            img_file.seek(0)
+            # Pillow takes a while to import, and is only needed for uncommon formats
+            from PIL import Image
+
+            with Image.open(img_file) as img:
+                return img.size
     except:
         return None
 
 
+def get_image_sizes(
+    paths: Sequence[Page], max_workers: int = min(32, cpu_count() * 4)
+) -> List[Optional[Tuple[int, int]]]:
+    """Get the pixel dimensions of many image files in parallel. Reading headers is I/O bound, so
+    the pool is sized larger than the CPU count to overlap latency on network file systems.
+
+    Returns: list of dimensions in the same order as `paths`, see `get_image_size`.
+    """
+    if len(paths) < 2:
+        return [get_image_size(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(get_image_size, paths))
+
+
+def fill_image_sizes(
+    paths: Sequence[Page], dimensions: Optional[Sequence[Optional[Tuple[int, int]]]]
+) -> List[Optional[Tuple[int, int]]]:
+    """Get the pixel dimensions of many images, sizing only those whose dimensions are not known.
+
+    Parameters:
+    * `paths`: images to get the dimensions of.
+    * `dimensions`: known dimensions of each image, or None where not known. Defaults to none.
+
+    Returns: list of dimensions in the same order as `paths`, see `get_image_size`.
+    """
+    sizes = list(dimensions) if dimensions else [None for _ in paths]
+    unknown = [i for i, size in enumerate(sizes) if not size]
+    for i, size in zip(unknown, get_image_sizes([paths[i] for i in unknown])):
+        sizes[i] = size
+    return sizes
+
+
 def render_from_template(
-    paths: Iterable[Union[Path, str]],
+    paths: Iterable[Page],
     thumbnails: Iterable[Optional[Path]],
     version: str,
     title: str,
@@ -44,17 +141,39 @@ def render_from_template(
     page_template: str,
     config: ConfigParser,
     outfile: str = os.path.join(tempfile.gettempdir(), 'html-mangareader', 'render.html'),
+    uris: Optional[Iterable[str]] = None,
+    dimensions: Optional[Iterable[Optional[Tuple[int, int]]]] = None,
+    sprites: Optional[str] = None,
+    total: Optional[int] = None,
+    status_url: Optional[str] = None,
+    variants: Optional[Iterable[str]] = None,
+    assets: str = '',
+    navigation: str = '',
 ) -> str:
     """Render a list of image paths to the finished HTML document.
 
     Parameters:
-    * `paths`: full file:// paths to images to render on the page.
+    * `paths`: full file:// paths or archive pages of images to render on the page.
     * `version`: version number to render on page.
     * `title`: title of the page.
     * `doc_template`: HTML template for the overall document.
     * `page_template`: HTML template for each comic page element.
     * `config`: parsed `config.ini` file.
     * `outfile`: path to write the rendered document to. Defaults to OS temp directory.
+    * `uris`: URIs to load each image from. Defaults to the file:// URI of each path.
+    * `dimensions`: pixel dimensions of each image. Read from the images if not given.
+    * `sprites`: JSON index of thumbnail sprite sheets, if thumbnails are rendered as sprites.
+    * `total`: total number of pages in the document, if only the first pages are given in `paths`
+      and the rest are added later with `render_page_batches`. Pages given as placeholders are
+      replaced by their batch.
+    * `status_url`: URL of the local server the webapp reports the reading position to, which also
+      keeps the server alive while the document is open.
+    * `variants`: URI of the downscaled display variant of each image, which the webapp displays
+      instead of the original once it has been rendered, or an empty string for images without
+      one.
+    * `assets`: URI prefix of the static assets, see `prepare_assets`. Defaults to the directory of
+      outfile.
+    * `navigation`: HTML to render after the pages, such as links to the other volumes of a library.
 
     Returns: path to rendered HTML document.
 
@@ -62,54 +181,230 @@ def render_from_template(
     """
     if not paths:
         raise ImagesNotFound('No images were sent to the renderer.')
+    try:
+        prefetch_pages = config[CONFIG_KEY].getint('prefetchPages', fallback=DEFAULT_PREFETCH_PAGES)
+    except ValueError:
+        prefetch_pages = DEFAULT_PREFETCH_PAGES
     try:
         write_config = json.dumps(
             {
                 'disableNavButtons': config[CONFIG_KEY].getboolean('disableNavButtons'),
                 'disableNavBar': config[CONFIG_KEY].getboolean('disableNavBar'),
                 'dynamicImageLoading': config[CONFIG_KEY].getboolean('dynamicImageLoading'),
+                'prefetchPages': prefetch_pages,
             }
         )
     except:
         write_config = '{}'
-    with open(outfile, 'w', encoding='utf-8', newline='\r\n') as renderfd:
-        html_template = Template(doc_template)
-        img_template = Template(page_template)
-        img_dimensions = [get_image_size(path) for path in paths]
-        img_list = [
-            img_template.substitute(
-                img=(
-                    Path(path).as_uri()
-                    if not config[CONFIG_KEY].getboolean('dynamicImageLoading')
-                    else IMG_PLACEHOLDER
-                ),
-                lazyimg=(
-                    Path(path).as_uri()
-                    if config[CONFIG_KEY].getboolean('dynamicImageLoading')
-                    else ''
-                ),
-                thumbnail=thumbnail.as_uri() if thumbnail else IMG_PLACEHOLDER,
-                width=dimensions[0] if dimensions else 0,
-                height=dimensions[1] if dimensions else 0,
-                id=str(i),
-                previd=str(i - 1) if i > 0 else 'none',
-                nextid=str(i + 1) if i < len(list(paths)) - 1 else 'none',
-            )
-            for i, (path, thumbnail, dimensions) in enumerate(
-                zip(paths, thumbnails, img_dimensions)
-            )
-        ]
-        doc_string = html_template.substitute(
-            pages=''.join(img_list),
+    # Substitute a marker for the page list and stream the pages in its place, so the full document
+    # is never held in memory at once
+    doc_head, doc_tail = (
+        compile_template(doc_template)
+        .substitute(
+            pages=PAGES_MARKER,
             version=version,
             title=title,
             config=base64.b64encode(write_config.encode('utf-8')).decode('utf-8'),
+            sprites=(sprites or 'null').replace('</', '<\\/'),
+            progressive='true' if total is not None else '',
+            statusurl=status_url or '',
+            assets=html.escape(assets),
+            navigation=navigation,
+        )
+        .split(PAGES_MARKER, 1)
+    )
+    with open(outfile, 'w', encoding='utf-8', newline='\r\n') as renderfd:
+        renderfd.write(doc_head)
+        renderfd.writelines(
+            render_pages(
+                paths,
+                thumbnails,
+                page_template,
+                config,
+                uris,
+                dimensions,
+                total,
+                variants=variants,
+            )
         )
-        renderfd.write(doc_string)
+        renderfd.write(doc_tail)
     # print("view saved to " + outfile)
     return outfile
 
 
+def render_pages(
+    paths: Iterable[Page],
+    thumbnails: Iterable[Optional[Path]],
+    page_template: str,
+    config: ConfigParser,
+    uris: Optional[Iterable[str]] = None,
+    dimensions: Optional[Iterable[Optional[Tuple[int, int]]]] = None,
+    total: Optional[int] = None,
+    offset: int = 0,
+    variants: Optional[Iterable[str]] = None,
+) -> Iterator[str]:
+    """Render the HTML elements of a sequence of comic pages, in a single pass over the inputs.
+
+    Parameters:
+    * `offset`: index of the first page in the document.
+    * `total`: total number of pages in the document. Defaults to the number of paths.
+
+    See `render_from_template` for the other parameters.
+
+    Returns: generator of rendered HTML elements.
+    """
+    if dimensions is None or total is None:
+        # Sizing and counting both need the full sequence of paths
+        paths = list(paths)
+    img_template = compile_template(page_template)
+    img_dimensions = dimensions if dimensions is not None else get_image_sizes(paths)
+    img_uris = uris if uris is not None else (Path(path).as_uri() for path in paths)
+    last = (total if total is not None else len(paths)) - 1
+    img_variants = variants if variants is not None else repeat('')
+    dynamic = config[CONFIG_KEY].getboolean('dynamicImageLoading')
+    pages = zip(img_uris, thumbnails, img_dimensions, img_variants)
+    for i, (uri, thumbnail, size, variant) in enumerate(pages, offset):
+        yield img_template.substitute(
+            img=IMG_PLACEHOLDER if dynamic else uri,
+            lazyimg=uri if dynamic else '',
+            thumbnail=thumbnail.as_uri() if thumbnail else IMG_PLACEHOLDER,
+            width=size[0] if size else 0,
+            height=size[1] if size else 0,
+            id=i,
+            previd=i - 1 if i > 0 else 'none',
+            nextid=i + 1 if i < last else 'none',
+            variant=variant,
+        )
+
+
+def progressive_batches(window_start: int, window_end: int, total: int) -> List[Tuple[int, int]]:
+    """Split the pages left out of the main HTML document in progressive mode into batches of
+    `PROGRESSIVE_BATCH_SIZE`, nearest to the rendered window first, alternating between the pages
+    after and before it.
+
+    Parameters:
+    * `window_start`, `window_end`: range of pages rendered in the main document.
+    * `total`: total number of pages in the document.
+
+    Returns: list of the start and end index of each batch, in the order to render them in.
+    """
+    after = [
+        (batch_start, min(batch_start + PROGRESSIVE_BATCH_SIZE, total))
+        for batch_start in range(window_end, total, PROGRESSIVE_BATCH_SIZE)
+    ]
+    before = [
+        (max(batch_end - PROGRESSIVE_BATCH_SIZE, 0), batch_end)
+        for batch_end in range(window_start, 0, -PROGRESSIVE_BATCH_SIZE)
+    ]
+    return [batch for pair in zip_longest(after, before) for batch in pair if batch]
+
+
+def render_page_batches(
+    paths: Sequence[Page],
+    thumbnails: Sequence[Optional[Path]],
+    page_template: str,
+    config: ConfigParser,
+    outpath: Path,
+    batches: Sequence[Tuple[int, int]],
+    uris: Optional[Sequence[str]] = None,
+    on_complete: Optional[Callable[[List[Optional[Tuple[int, int]]]], Optional[str]]] = None,
+    variants: Optional[Sequence[str]] = None,
+    known_dimensions: Optional[Sequence[Optional[Tuple[int, int]]]] = None,
+    cancel: Optional[CancellationToken] = None,
+) -> bool:
+    """Render the pages that were left out of the main HTML document in progressive mode. Pages are
+    sized and rendered in batches, and each batch is written to `pages-{n}.js` in outpath as soon as
+    it is ready, to be loaded by the webapp. Batches of pages after the pages in the document are
+    appended to it, and batches of pages before them replace their placeholders.
+
+    Parameters:
+    * `paths`: all images in the document.
+    * `thumbnails`: thumbnail of each image.
+    * `page_template`: HTML template for each comic page element.
+    * `config`: parsed `config.ini` file.
+    * `outpath`: directory to write batch files to.
+    * `batches`: range of pages in each batch, in the order to render them in, see
+      `progressive_batches`.
+    * `uris`: URIs to load each image from. Defaults to the file:// URI of each path.
+    * `on_complete`: called with the dimensions of every page in paths before the last batch is
+      written. May return a JSON sprite sheet index, which is sent with the last batch.
+    * `variants`: URI of the display variant of each image, see `render_from_template`.
+    * `known_dimensions`: dimensions of each image in paths, or None where not known yet. Only
+      images of unknown size are sized.
+    * `cancel`: stops rendering before the next batch once cancelled.
+
+    Returns: whether every batch was written, which is not the case if cancelled.
+    """
+    dimensions: List[Optional[Tuple[int, int]]] = (
+        list(known_dimensions) if known_dimensions else [None for _ in paths]
+    )
+    for batch, (batch_start, batch_end) in enumerate(batches, 1):
+        if cancel and cancel.cancelled:
+            return False
+        batch_dimensions = fill_image_sizes(
+            paths[batch_start:batch_end], dimensions[batch_start:batch_end]
+        )
+        dimensions[batch_start:batch_end] = batch_dimensions
+        pages = render_pages(
+            paths[batch_start:batch_end],
+            thumbnails[batch_start:batch_end],
+            page_template,
+            config,
+            uris[batch_start:batch_end] if uris is not None else None,
+            batch_dimensions,
+            len(paths),
+            batch_start,
+            variants[batch_start:batch_end] if variants is not None else None,
+        )
+        last = batch == len(batches)
+        sprites = on_complete(dimensions) if last and on_complete else None
+        write_page_batch(
+            outpath,
+            {
+                'batch': batch,
+                'offset': batch_start,
+                'pages': ''.join(pages),
+                'last': last,
+                'sprites': json.loads(sprites) if sprites else None,
+                'error': None,
+            },
+        )
+    return True
+
+
+def write_page_batch(outpath: Path, payload: Dict[str, Any]) -> None:
+    """Write a page batch to `pages-{n}.js` in outpath, see `render_page_batches`."""
+    batch_file = outpath / f'pages-{payload["batch"]}.js'
+    temp_file = batch_file.with_suffix('.tmp')
+    temp_file.write_text(f'mangareaderAddPages({json.dumps(payload)});', encoding='utf-8')
+    # Move into place only once complete, as the webapp polls for the file
+    os.replace(temp_file, batch_file)
+
+
+def write_error_batch(outpath: Path, total: int, error: str) -> None:
+    """Write a last page batch without pages after the batches written so far, reporting the error
+    that stopped `render_page_batches`, so that the webapp stops waiting for the remaining batches.
+
+    Parameters:
+    * `total`: total number of pages in the document.
+    * `error`: message displayed by the webapp.
+    """
+    batch = 1
+    while (outpath / f'pages-{batch}.js').exists():
+        batch += 1
+    write_page_batch(
+        outpath,
+        {
+            'batch': batch,
+            'offset': total,
+            'pages': '',
+            'last': True,
+            'sprites': None,
+            'error': error,
+        },
+    )
+
+
 def render_bootstrap(outfile: str, render: str, index: int, boot_template: str) -> str:
     """Render the bootstrap document, which redirects to the main HTML document at the opened image.
     This is required because an HTML bookmark link cannot be used as a file:// URI.
@@ -123,17 +418,11 @@ def render_bootstrap(outfile: str, render: str, index: int, boot_template: str)
     Returns: path to the rendered bootstrap document.
     """
     with open(outfile, 'w', encoding='utf-8', newline='\r\n') as bootfd:
-        html_boot = Template(boot_template).substitute(document=render, index=str(index))
+        html_boot = compile_template(boot_template).substitute(document=render, index=str(index))
         bootfd.write(html_boot)
     return outfile
 
 
-def render_copy(src_paths: Iterable[Union[Path, str]], dest_path: Path) -> None:
-    """Copy all files pointed by src_paths to destination."""
-    for src in src_paths:
-        copy(src, dest_path)
-
-
 def scan_directory(path: Union[str, Path], img_types: Iterable[str]) -> List[Path]:
     """Get a list of image file paths from a directory.
 
@@ -145,25 +434,81 @@ def scan_directory(path: Union[str, Path], img_types: Iterable[str]) -> List[Pat
 
     Throws: `ImagesNotFound` if no images were found in the directory.
     """
-    files = filter(lambda f: f.is_file(), Path(path).iterdir())
-    imagefiles = list(filter(lambda f: f.suffix.lower()[1:] in img_types, files))
+    directory = Path(path).resolve()
+    imagefiles = list_paths(directory, img_types)
     if not imagefiles:
-        raise ImagesNotFound(f'No image files were found in directory "{Path(path).resolve()}"')
-    return [
-        p if p.is_absolute() else p.resolve() for p in sorted(imagefiles, key=filename_comparator)
-    ]
+        raise ImagesNotFound(f'No image files were found in directory "{directory}"')
+    return imagefiles
+
+
+def load_archive_index(
+    path: Path,
+    img_types: Iterable[str],
+    store: Optional[ArchiveIndexStore],
+    stream: bool,
+    timer: Optional[StageTimer] = None,
+) -> Tuple[ArchiveIndex, bool]:
+    """Get the index of the image pages in an archive file, from the index store if it is current,
+    or else by listing the archive. A rebuilt index keeps the dimensions of the pages that have not
+    changed since the stored index.
+
+    Parameters:
+    * `path`: resolved path to archive.
+    * `img_types`: list of recognized image file extensions.
+    * `store`: persistent index store, if enabled.
+    * `stream`: list the archive with the shared reader that its pages are served from.
+    * `timer`: counts the pages whose dimensions are known from the index as `indexed_pages`.
+
+    Returns: tuple of the index, and whether it is the current stored index.
+
+    Throws: `ImagesNotFound` if no images were found in the archive.
+    """
+    stat = os.stat(path)
+    stored = store.load(path) if store else None
+    current = bool(stored and stored.is_current(stat, img_types))
+    if stored and current:
+        index = stored
+    elif stream:
+        index = index_archive(get_reader(path), path, stat, img_types, stored)
+    else:
+        with open_archive(path) as archive:
+            index = index_archive(archive, path, stat, img_types, stored)
+    if not index.pages:
+        raise ImagesNotFound(f'No image files were found in archive: {path}')
+    if timer:
+        timer.count('indexed_pages', sum(1 for size in index.dimensions if size))
+    return index, current
 
 
 def extract_archive(
     img_types: Iterable[str],
-    archive: Union[zipfile.ZipFile, rarfile.RarFile],
+    archive: Archive,
     outpath: str = os.path.join(tempfile.gettempdir(), 'html-mangareader'),
+    timer: Optional[StageTimer] = None,
+    names: Optional[Sequence[str]] = None,
+    cancel: Optional[CancellationToken] = None,
 ) -> List[Path]:
-    """Extract image files in archive to the outpath."""
-    imagefiles = list(filter(lambda f: f.split('.')[-1].lower() in img_types, archive.namelist()))
+    """Extract image files in archive to the outpath. The bytes written are counted in timer as
+    the `extract` stage. If names is given, those members are extracted instead of listing the
+    archive.
+
+    Members of solid archives cannot be decompressed independently, so they are extracted in one
+    pass, and `cancel` is only checked before and after it.
+    """
+    imagefiles = (
+        list(names)
+        if names is not None
+        else list(filter(lambda f: f.split('.')[-1].lower() in img_types, archive.namelist()))
+    )
     if not imagefiles:
         raise ImagesNotFound()
+    if cancel:
+        cancel.check()
     archive.extractall(outpath, imagefiles)
+    if cancel:
+        cancel.check()
+    if timer:
+        timer.add_io('extract', written=sum(archive.getinfo(f).file_size for f in imagefiles))
     return [Path(outpath) / image for image in sorted(imagefiles, key=filename_comparator)]
 
 
@@ -171,6 +516,7 @@ def extract_zip(
     path: Path,
     img_types: Iterable[str],
     outpath: str = os.path.join(tempfile.gettempdir(), 'html-mangareader'),
+    timer: Optional[StageTimer] = None,
 ) -> List[Path]:
     """Extract image files found in an archive file.
 
@@ -178,6 +524,7 @@ def extract_zip(
     * `path`: path to archive.
     * `img_types`: list of recognized image file extensions.
     * `outpath`: directory to extract images to. Defaults to OS temp directory.
+    * `timer`: records the bytes read and written by extraction.
 
     Returns: list of absolute paths to extracted image files.
 
@@ -187,27 +534,179 @@ def extract_zip(
     * `BadRarFile` if CBR/RAR archive could not be read.
     * `Bad7zFile` if CB7/7Z archive could not be read.
     """
-    file_ext = path.suffix.lower()[1:]
+    return extract_pages(path, img_types, outpath, timer)[0]
+
+
+def extract_pages(
+    path: Path,
+    img_types: Iterable[str],
+    outpath: str = os.path.join(tempfile.gettempdir(), 'html-mangareader'),
+    timer: Optional[StageTimer] = None,
+    max_workers: int = min(8, cpu_count() * 2),
+    index: Optional[ArchiveIndex] = None,
+    cancel: Optional[CancellationToken] = None,
+) -> Tuple[List[Path], List[Optional[Tuple[int, int]]]]:
+    """Extract image files found in an archive file, and get their pixel dimensions.
+
+    Members of zip archives are extracted in parallel, each worker with its own handle on the
+    archive, and each page is sized by the same worker as soon as it has been written, so that
+    decompression, writing and sizing of different pages overlap. Other archives are extracted in
+    one pass, as their members may not be decompressible independently. Their pages are not sized
+    here, so that progressive rendering only sizes the pages it renders first.
+
+    Parameters:
+    * `max_workers`: number of zip members extracted at once.
+    * `index`: current index of the archive. The pages it lists are extracted without listing the
+      archive, and pages whose dimensions it has are not sized again.
+    * `cancel`: stops extraction once cancelled. Zip members not started yet are skipped.
+
+    See `extract_zip` for the other parameters and exceptions. Also throws `OperationCancelled` if
+    cancelled.
+
+    Returns: tuple of the absolute paths to the extracted image files, and the dimensions of each
+    image, see `get_image_size`. Dimensions are None where not known from the index for archives
+    other than zip, to be sized with `fill_image_sizes`.
+    """
     try:
-        if file_ext in ZIP_TYPES:
-            with zipfile.ZipFile(path, mode='r') as zip_file:
-                return extract_archive(img_types, zip_file, outpath)
-        elif file_ext in RAR_TYPES:
-            with rarfile.RarFile(path, mode='r') as rar_file:
-                return extract_archive(img_types, rar_file, outpath)
-        elif file_ext in _7Z_TYPES:
-            with SevenZipAdapter(path, mode='r') as _7z_file:
-                return extract_archive(img_types, _7z_file, outpath)
-        else:
-            raise ImagesNotFound(f'Unknown archive format: {path}')
+        with open_archive(path) as archive:
+            if index and not index.pages:
+                raise ImagesNotFound()
+            known = index.dimensions if index else None
+            if not isinstance(archive, zipfile.ZipFile):
+                imgpaths = extract_archive(
+                    img_types, archive, outpath, timer, index.names if index else None, cancel
+                )
+                dimensions = list(known) if known else [None for _ in imgpaths]
+            else:
+                # Of several members with the same name, the last is extracted, as by extractall
+                imagefiles = (
+                    index.names
+                    if index
+                    else sorted(
+                        dict.fromkeys(
+                            f for f in archive.namelist() if f.split('.')[-1].lower() in img_types
+                        ),
+                        key=filename_comparator,
+                    )
+                )
+                if not imagefiles:
+                    raise ImagesNotFound()
+                imgpaths, dimensions = extract_zip_members(
+                    path, imagefiles, outpath, max_workers, known, cancel
+                )
+                if timer:
+                    timer.add_io(
+                        'extract', written=sum(archive.getinfo(f).file_size for f in imagefiles)
+                    )
+        if timer:
+            timer.add_io('extract', read=os.path.getsize(path))
+        return imgpaths, dimensions
     except ImagesNotFound:
         raise ImagesNotFound(f'No image files were found in archive: {path}')
 
 
+def extract_zip_members(
+    path: Path,
+    names: Sequence[str],
+    outpath: str,
+    max_workers: int,
+    dimensions: Optional[Sequence[Optional[Tuple[int, int]]]] = None,
+    cancel: Optional[CancellationToken] = None,
+) -> Tuple[List[Path], List[Optional[Tuple[int, int]]]]:
+    """Extract members of a zip archive in parallel, and get the pixel dimensions of each.
+    Decompression and CRC checks release the GIL, so threads scale with the number of cores.
+    Members whose dimensions are already known from `dimensions` are not sized again. Once `cancel`
+    is cancelled, the members not started yet are skipped.
+
+    Returns: tuple of the absolute path of each extracted member, and its dimensions.
+
+    Throws:
+    * `BadZipFile` if a member could not be read.
+    * `OperationCancelled` if cancelled.
+    """
+    local = threading.local()
+    handles: List[zipfile.ZipFile] = []
+    handles_lock = threading.Lock()
+
+    def extract(
+        name: str, size: Optional[Tuple[int, int]]
+    ) -> Tuple[Path, Optional[Tuple[int, int]]]:
+        if cancel:
+            cancel.check()
+        handle = getattr(local, 'archive', None)
+        if handle is None:
+            handle = local.archive = zipfile.ZipFile(path)
+            with handles_lock:
+                handles.append(handle)
+        # extract() sanitizes the member name against path traversal
+        try:
+            target = Path(handle.extract(name, outpath))
+        except FileExistsError:
+            # Another worker created the same parent directory at the same time
+            target = Path(handle.extract(name, outpath))
+        return target, size or get_image_size(target)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(names)))) as pool:
+            results = list(pool.map(extract, names, dimensions or repeat(None)))
+    finally:
+        for handle in handles:
+            handle.close()
+    return [target for target, _ in results], [size for _, size in results]
+
+
+class CompiledTemplate:
+    """A `string.Template` parsed once into a format string, so that substituting it does not scan
+    the template for placeholders again. Pages are rendered from the same template thousands of
+    times per document. Substitutes like `Template.substitute`."""
+
+    template: str
+    _format: str
+
+    def __init__(self, template: str):
+        """
+        Throws: `ValueError` if the template has an invalid placeholder.
+        """
+        self.template = template
+        parts = []
+        last = 0
+        for match in Template.pattern.finditer(template):
+            parts.append(template[last : match.start()].replace('{', '{{').replace('}', '}}'))
+            if match.group('invalid') is not None:
+                raise ValueError(f'Invalid placeholder in template at index {match.start()}')
+            name = match.group('named') or match.group('braced')
+            parts.append(f'{{{name}}}' if name else Template.delimiter)
+            last = match.end()
+        parts.append(template[last:].replace('{', '{{').replace('}', '}}'))
+        self._format = ''.join(parts)
+
+    def substitute(self, **mapping: object) -> str:
+        """Throws: `KeyError` if a placeholder is missing from mapping."""
+        return self._format.format_map(mapping)
+
+
+@lru_cache(maxsize=32)
+def compile_template(template: str) -> CompiledTemplate:
+    """Get the compiled template of a template string. Compiled templates are kept in memory, so
+    that each template is only compiled once per process."""
+    return CompiledTemplate(template)
+
+
+_templates: Dict[str, Tuple[int, str]] = {}
+
+
 def resolve_template(path: Union[Path, str]) -> str:
-    """Load the file at path a a UTF-8 string."""
+    """Load the file at path a a UTF-8 string. Templates are kept in memory while the file is
+    unchanged, so that a resident app does not read them again for every document."""
+    key = os.fspath(path)
+    mtime = os.stat(key).st_mtime_ns
+    cached = _templates.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
     with open(path, encoding='utf-8') as template_file:
-        return template_file.read()
+        template = template_file.read()
+    _templates[key] = (mtime, template)
+    return template
 
 
 def create_out_path(outpath: Path) -> None:
@@ -217,31 +716,201 @@ def create_out_path(outpath: Path) -> None:
     outpath.mkdir(parents=True, exist_ok=True)
 
 
+def page_stem(path: Page) -> str:
+    """Get the file name of an image file or archive page, without its extension."""
+    return Path(path.name if isinstance(path, ArchivePage) else path).stem
+
+
 def create_thumbnails(
-    paths: Iterable[Union[Path, str]],
+    paths: Iterable[Page],
     outpath: Path,
-    progress_bar: MRProgressBar = None,
+    progress_bar: ProgressReporter = None,
+    cache: Optional[ThumbnailCache] = None,
+    sources: Optional[Iterable[Page]] = None,
+    executor: Optional[Executor] = None,
+    on_thumbnail: Optional[Callable[[int, Path], None]] = None,
+    scheduler: Optional[ThumbnailScheduler] = None,
+    timer: Optional[StageTimer] = None,
+    keys: Optional[Sequence[str]] = None,
+    cancel: Optional[CancellationToken] = None,
 ) -> Iterable[Path]:
-    """Create thumbnails for all images in paths and save them to outpath."""
-    executor = ThreadPoolExecutor(max_workers=cpu_count() - 1)
+    """Create thumbnails for all images in paths and save them to outpath, or to the thumbnail
+    cache if one is given. Images already in the cache are not rendered again.
+
+    Parameters:
+    * `paths`: images to create thumbnails of.
+    * `outpath`: directory to save thumbnails to if `cache` is not used.
+    * `progress_bar`: progress bar UI to update.
+    * `cache`: persistent thumbnail cache.
+    * `sources`: original location of each image in paths, used as the cache key. Useful when the
+      images have been extracted from an archive to a temporary path. Defaults to `paths`.
+    * `executor`: worker pool to render thumbnails in. Defaults to a new thread pool.
+    * `on_thumbnail`: called with the index and path of each thumbnail once it is available. May be
+      called from any thread.
+    * `scheduler`: scheduler to submit jobs to the executor with, which determines the order that
+      thumbnails are rendered in. Defaults to the order of paths.
+    * `timer`: records the bytes read and written by rendering thumbnails.
+    * `keys`: cache key of each image, if known already, see `ThumbnailCache.key_for`.
+    * `cancel`: drops the jobs not submitted yet once cancelled.
+
+    Returns: paths to the thumbnail of each image.
+    """
+    paths = list(paths)
+    if not scheduler:
+        scheduler = ThumbnailScheduler(
+            executor or ThreadPoolExecutor(max_workers=max(1, cpu_count() - 1))
+        )
+    if cache:
+        keys = keys or [cache.key_for(source) for source in (sources or paths)]
+        thumbnails = [cache.path_for(key) for key in keys]
+    else:
+        thumbnails = [outpath / f'{page_stem(path)}_thumbnail.png' for path in paths]
 
     # Render thumbnails in parallel. No need to await these since the webapp can be started before
-    # this is completed. The last task to be completed exits the program
-    def task(path: Union[Path, str]):
-        path = Path(path)
-        try:
-            with Image.open(path) as img:
-                img.thumbnail((2000, 360), Image.Resampling.NEAREST)
-                img.save(outpath / f'{path.stem}_thumbnail.png')
-        except:
-            pass
-        finally:
+    # this is completed. The last task to be completed exits the program. Failed thumbnails are
+    # ignored, the webapp retries loading them and falls back to a placeholder. The scheduler
+    # submits jobs nearest to the page being read first.
+    def on_done(index: int, thumbnail: Path, future: Future):
+        if timer:
+            _record_job_io(timer, 'thumbnails', paths[index], thumbnail, future)
+        if on_thumbnail:
+            on_thumbnail(index, thumbnail)
+        if progress_bar:
+            progress_bar.increment()
+
+    for i, (p, thumbnail) in enumerate(zip(paths, thumbnails)):
+        if cache and cache.lookup(thumbnail):
+            if on_thumbnail:
+                on_thumbnail(i, thumbnail)
             if progress_bar:
-                progress_bar.increment()
+                progress_bar.increment(cached=True)
+        else:
+            scheduler.add(i, partial(on_done, i, thumbnail), render_thumbnail, p, thumbnail)
+    if cancel:
+        cancel.on_cancel(scheduler.cancel)
+    scheduler.start()
+    if cache:
+        cache.evict_in_background()
+    return thumbnails
 
-    for p in paths:
-        executor.submit(task, p)
-    return ((outpath / f'{Path(path).stem}_thumbnail.png') for path in paths)
+
+def start_thumbnails(
+    paths: Sequence[Page],
+    dimensions: Sequence[Optional[Tuple[int, int]]],
+    outpath: Path,
+    config: ConfigParser,
+    progress_bar: Optional[ProgressReporter],
+    sources: Optional[Sequence[Page]] = None,
+    executor: Optional[Executor] = None,
+    thumbnail_cache: Optional[ThumbnailCache] = None,
+    scheduler: Optional[ThumbnailScheduler] = None,
+    timer: Optional[StageTimer] = None,
+    cache_keys: Optional[Sequence[str]] = None,
+    cancel: Optional[CancellationToken] = None,
+) -> Tuple[List[Optional[Path]], Optional[str]]:
+    """Start rendering navbar thumbnails in the background, using the thumbnail cache, executor
+    and output format configured in `config.ini`.
+
+    Parameters:
+    * `paths`: images to create thumbnails of.
+    * `dimensions`: pixel dimensions of each image.
+    * `outpath`: directory to write thumbnails to.
+    * `config`: parsed `config.ini` file.
+    * `progress_bar`: progress bar UI to update.
+    * `sources`: original location of each image, see `create_thumbnails`.
+    * `executor`: worker pool to render thumbnails in. Defaults to a new pool.
+    * `thumbnail_cache`: persistent thumbnail cache. Defaults to the configured cache.
+    * `scheduler`: scheduler that orders thumbnail jobs. Defaults to the order of paths.
+    * `timer`: records the bytes read and written by rendering thumbnails.
+    * `cache_keys`: thumbnail cache key of each image, if known already.
+    * `cancel`: stops rendering thumbnails once cancelled.
+
+    Returns: tuple of the path to the thumbnail of each image, and the JSON sprite sheet index if
+    thumbnails are rendered as sprites. Thumbnail paths are all None in sprite mode.
+    """
+    thumbnail_cache = thumbnail_cache or get_thumbnail_cache(config)
+    sprite_writer = (
+        SpriteSheetWriter(dimensions, outpath, delete_thumbnails=not thumbnail_cache)
+        if config[CONFIG_KEY].getboolean('thumbnailSprites', fallback=False)
+        else None
+    )
+    thumbnail_paths = create_thumbnails(
+        paths,
+        outpath,
+        progress_bar,
+        thumbnail_cache,
+        sources,
+        None if scheduler else executor or create_thumbnail_executor(config),
+        on_thumbnail=sprite_writer.add if sprite_writer else None,
+        scheduler=scheduler,
+        timer=timer,
+        keys=cache_keys,
+        cancel=cancel,
+    )
+    if sprite_writer:
+        # Thumbnails are loaded from the sprite sheets instead
+        return [None for _ in paths], sprite_writer.to_json()
+    return list(thumbnail_paths), None
+
+
+def create_display_variants(
+    paths: Sequence[Page],
+    dimensions: Sequence[Optional[Tuple[int, int]]],
+    outpath: Path,
+    max_width: int,
+    scheduler: ThumbnailScheduler,
+    timer: Optional[StageTimer] = None,
+    cancel: Optional[CancellationToken] = None,
+) -> List[Optional[Path]]:
+    """Start rendering display variants of images wider than max_width in the background. Variants
+    are downscaled to max_width, so that the browser does not have to decode and scale down images
+    much larger than the screen.
+
+    Parameters:
+    * `paths`: images to create variants of.
+    * `dimensions`: pixel dimensions of each image, or None where not known yet. Variants are
+      rendered for all images of unknown size.
+    * `outpath`: directory to write variants to.
+    * `max_width`: width in pixels to downscale images to.
+    * `scheduler`: scheduler that orders variant jobs.
+    * `timer`: records the bytes read and written by rendering variants.
+    * `cancel`: drops the jobs not submitted yet once cancelled.
+
+    Returns: path that the variant of each image is written to, or None for images that are
+    displayed from the original.
+    """
+    variants: List[Optional[Path]] = []
+    for i, (path, size) in enumerate(zip(paths, dimensions)):
+        ext = Path(path.name if isinstance(path, ArchivePage) else path).suffix.lower()[1:]
+        if ext not in VARIANT_TYPES or (size and size[0] <= max_width):
+            variants.append(None)
+            continue
+        variant = outpath / 'display' / f'{i}.jpg'
+        # Failed variants are ignored, the webapp keeps displaying the original
+        on_done = partial(_record_job_io, timer, 'variants', path, variant) if timer else None
+        scheduler.add(
+            i, on_done or (lambda future: None), render_display_variant, path, variant, max_width
+        )
+        variants.append(variant)
+    if cancel:
+        cancel.on_cancel(scheduler.cancel)
+    scheduler.start()
+    return variants
+
+
+def _record_job_io(
+    timer: StageTimer, stage: str, source: Page, outfile: Path, future: Future
+) -> None:
+    """Count the bytes read and written by a completed thumbnail or variant job. Pages read out of
+    an archive are not counted as read."""
+    if future.exception():
+        return
+    try:
+        read = 0 if isinstance(source, ArchivePage) else os.path.getsize(source)
+        timer.add_io(stage, read=read, written=outfile.stat().st_size)
+    except OSError:
+        # Evicted from the cache or combined into a sprite sheet in the meantime
+        pass
 
 
 def extract_render(
@@ -253,8 +922,16 @@ def extract_render(
     asset_paths: Iterable[str],
     img_types: Iterable[str],
     config: ConfigParser,
-    progress_bar: MRProgressBar,
+    progress_bar: Optional[ProgressReporter],
     outpath: Path = Path(tempfile.gettempdir()) / 'html-mangareader',
+    executor: Optional[Executor] = None,
+    thumbnail_cache: Optional[ThumbnailCache] = None,
+    timer: Optional[StageTimer] = None,
+    serve_focus: bool = True,
+    on_complete: Optional[Callable[[], None]] = None,
+    cancel: Optional[CancellationToken] = None,
+    navigation: str = '',
+    session: Optional[Path] = None,
 ) -> Path:
     """Main controller procedure. Handles opening of archive, image, or directory and renders the images
     appropriately for each, then opens the document in the user's default browser.
@@ -265,11 +942,27 @@ def extract_render(
     * `doc_template_path`: path to HTML template for the main document.
     * `page_template_path`: path to HTML template for individual comic page elements.
     * `boot_template_path`: path to HTML template for bootstrap document.
-    * `asset_paths`: paths of static assets to copy.
+    * `asset_paths`: paths of static assets, see `prepare_assets`.
     * `img_types`: list of recognized image file extensions.
     * `config`: parsed `config.ini` file.
-    * `progress_bar`: progress bar UI to update.
+    * `progress_bar`: progress bar UI to update, if any.
     * `outpath`: directory to write temporary files in. Defaults to OS temp directory.
+    * `executor`: worker pool to render thumbnails in, to share it between documents. Defaults to a
+      new pool.
+    * `thumbnail_cache`: thumbnail cache to share between documents. Defaults to the configured
+      cache.
+    * `timer`: records the time spent in each stage of rendering, and in total as `total`, the
+      bytes each stage read and wrote, and the latency of each thumbnail and variant job.
+    * `serve_focus`: receive the reading position from the webapp while thumbnails are rendered, to
+      render the thumbnails nearest to it first. Requires the app to keep running.
+    * `on_complete`: called once all thumbnails and display variants have been rendered in the
+      background, or the rest cancelled, also if rendering the document fails after they were
+      started. May be called from any thread.
+    * `cancel`: aborts opening the file. Extraction and rendering stop at the next page or stage,
+      and thumbnail and display variant jobs not submitted to the pool yet are dropped.
+    * `navigation`: HTML to render after the pages, see `render_from_template`.
+    * `session`: session directory the document is written to, which is marked as used whenever the
+      webapp loads pages from the app or reports the reading position, see `touch_session`.
 
     Returns: Path to the bootstrap document, which can be opened in a web browser.
 
@@ -278,70 +971,310 @@ def extract_render(
     * `BadRarFile`: opened file was a rar file, but could not be read.
     * `Bad7zFile`: opened file was a 7z file, but could not be read.
     * `ImagesNotFound`: if no images could be found in an opened directory or archive.
+    * `OperationCancelled`: if cancelled before the document was rendered.
     """
     start = 0
+    timer = timer or StageTimer()
+    cancel = cancel or CancellationToken()
+    started = time.perf_counter()
+    started_cpu = time.process_time()
+    # The web server pulls in much of the standard library, so it is only imported when used
+    from mangareader.pageserver import PageServer
+
+    page_server: Optional[PageServer] = None
+    img_uris: Optional[List[str]] = None
+    thumbnail_sources: Optional[List[Page]] = None
+    known_dimensions: Optional[List[Optional[Tuple[int, int]]]] = None
+    index: Optional[ArchiveIndex] = None
+    index_current = False
+    index_store: Optional[ArchiveIndexStore] = None
     pPath = Path(path).resolve()
     doc_template, page_template, boot_template = (
         resolve_template(p) for p in (doc_template_path, page_template_path, boot_template_path)
     )
     try:
-        if pPath.is_file():
-            if pPath.suffix.lower()[1:] in img_types:
-                imgpaths = scan_directory(pPath.parent, img_types)
-                start = imgpaths.index(pPath)
-                title = pPath.parent.name
+        with timer.stage('open'):
+            if pPath.is_file():
+                if pPath.suffix.lower()[1:] in img_types:
+                    with timer.stage('scan'):
+                        imgpaths = scan_directory(pPath.parent, img_types)
+                    start = imgpaths.index(pPath)
+                    title = pPath.parent.name
+                else:
+                    try:
+                        stream = is_stream_archive(pPath, config)
+                        index_store = get_archive_index_store(config)
+                        with timer.stage('scan'):
+                            index, index_current = load_archive_index(
+                                pPath, img_types, index_store, stream, timer
+                            )
+                        if stream:
+                            imgpaths = [ArchivePage(pPath, name) for name in index.names]
+                            known_dimensions = index.dimensions
+                            page_server = PageServer(imgpaths)
+                            img_uris = [page_server.url_for(i) for i in range(len(imgpaths))]
+                        else:
+                            with timer.stage('extract'):
+                                imgpaths, known_dimensions = extract_pages(
+                                    pPath,
+                                    img_types,
+                                    str(outpath),
+                                    timer,
+                                    index=index,
+                                    cancel=cancel,
+                                )
+                            thumbnail_sources = [
+                                ArchivePage(pPath, imgpath.relative_to(outpath).as_posix())
+                                for imgpath in imgpaths
+                            ]
+                        title = pPath.name
+                    except Exception as e:
+                        archive_format = get_archive_format(pPath)
+                        if not archive_format or not isinstance(e, archive_format.error_type()):
+                            raise
+                        raise archive_format.error_type()(
+                            f'"{path}" does not appear to be a valid {archive_format.name} file.'
+                        ).with_traceback(e.__traceback__)
             else:
-                try:
-                    imgpaths = extract_zip(pPath, img_types, str(outpath))
-                    title = pPath.name
-                except zipfile.BadZipFile as e:
-                    raise zipfile.BadZipfile(
-                        f'"{path}" does not appear to be a valid zip/cbz file.'
-                    ).with_traceback(e.__traceback__)
-                except rarfile.BadRarFile as e:
-                    raise rarfile.BadRarFile(
-                        f'"{path}" does not appear to be a valid rar/cbr file.'
-                    ).with_traceback(e.__traceback__)
-                except py7zr.Bad7zFile as e:
-                    raise py7zr.Bad7zFile(
-                        f'"{path}" does not appear to be a valid 7z/cb7 file.'
-                    ).with_traceback(e.__traceback__)
-        else:
-            imgpaths = scan_directory(path, img_types)
-            title = pPath.name
-        create_out_path(outpath)
-        render_copy(asset_paths, outpath)
-        if not config[CONFIG_KEY].getboolean('disableNavBar'):
-            progress_bar.set_total(len(imgpaths))
-            thumbnail_paths: Iterable[Optional[Path]] = create_thumbnails(
-                imgpaths, outpath, progress_bar
+                with timer.stage('scan'):
+                    imgpaths = scan_directory(path, img_types)
+                title = pPath.name
+        timer.count('pages', len(imgpaths))
+        cancel.check()
+        with timer.stage('assets'):
+            create_out_path(outpath)
+            assets_uri = prepare_assets(asset_paths, outpath, config, timer)
+        is_nav_bar = not config[CONFIG_KEY].getboolean('disableNavBar')
+        is_sprites = is_nav_bar and config[CONFIG_KEY].getboolean(
+            'thumbnailSprites', fallback=False
+        )
+        # In progressive mode, only a window of pages around the opened page is sized and rendered
+        # before the document is opened
+        window_start, window_end = 0, len(imgpaths)
+        if config[CONFIG_KEY].getboolean('progressiveRendering', fallback=False):
+            window_start = max(start - PROGRESSIVE_PAGES_BEFORE, 0)
+            window_end = min(start + PROGRESSIVE_BATCH_SIZE, len(imgpaths))
+        is_progressive = window_start > 0 or window_end < len(imgpaths)
+        with timer.stage('size'):
+            # Pages extracted from zip archives are sized during extraction already, and indexed
+            # pages when the archive was last opened
+            img_dimensions: List[Optional[Tuple[int, int]]] = (
+                list(known_dimensions) if known_dimensions else [None for _ in imgpaths]
+            )
+            img_dimensions[window_start:window_end] = fill_image_sizes(
+                imgpaths[window_start:window_end], img_dimensions[window_start:window_end]
             )
-        else:
-            thumbnail_paths = (None for _ in imgpaths)
-            progress_bar.tk.after_idle(lambda: progress_bar.tk.destroy())
 
-        renderfile = render_from_template(
-            paths=imgpaths,
-            thumbnails=thumbnail_paths,
-            version=version,
-            title=title,
-            doc_template=doc_template,
-            page_template=page_template,
-            outfile=str(outpath / 'index.html'),
-            config=config,
-        )
-        bootfile = render_bootstrap(
-            outfile=str(outpath / 'boot.html'),
-            render=Path(renderfile).as_uri(),
-            index=start,
-            boot_template=boot_template,
-        )
+        def save_index(dimensions: List[Optional[Tuple[int, int]]]) -> None:
+            if index and index_store:
+                updated = index.with_dimensions(dimensions)
+                if updated != index or not index_current:
+                    index_store.save(updated)
+
+        cancel.check()
+        with timer.stage('index'):
+            save_index(img_dimensions)
+        cache_keys = index.thumbnail_keys if index else None
+        thumbnail_paths: List[Optional[Path]] = [None for _ in imgpaths]
+        sprites: Optional[str] = None
+        variant_width = config[CONFIG_KEY].getint('displayMaxWidth', fallback=0)
+        # Thumbnails and display variants are rendered outward from the opened page, and
+        # reprioritized as the webapp reports the reading position
+        scheduler: Optional[ThumbnailScheduler] = None
+        variant_scheduler: Optional[ThumbnailScheduler] = None
+        if is_nav_bar or variant_width > 0:
+            pool = executor or create_thumbnail_executor(config)
+            if is_nav_bar:
+                scheduler = ThumbnailScheduler(pool, focus=start, timer=timer)
+            if variant_width > 0:
+                variant_scheduler = ThumbnailScheduler(
+                    pool, focus=start, name='variant', timer=timer
+                )
+        schedulers = [s for s in (scheduler, variant_scheduler) if s]
+        for s in schedulers:
+            cancel.on_cancel(s.cancel)
+        callbacks = [on_complete] if on_complete else []
+        status_server = page_server
+        if serve_focus and schedulers:
+            if not status_server:
+                status_server = PageServer([])
+                callbacks.append(status_server.stop)
+
+            def on_focus(index: int, first: int, last: int) -> None:
+                for s in schedulers:
+                    s.focus(index, first, last)
+
+            status_server.on_focus = on_focus
+
+        if status_server and session:
+            status_server.on_request = partial(touch_session, session)
+
+        if progress_bar:
+            callbacks.append(progress_bar.finish)
+
+        def on_background_complete() -> None:
+            for callback in callbacks:
+                callback()
+
+        # Not called back before the document is rendered
+        release_complete = when_all_complete(schedulers, on_background_complete)
+        try:
+            if is_nav_bar:
+                if progress_bar:
+                    progress_bar.set_total(len(imgpaths))
+                # The sprite sheet layout depends on the dimensions of every page, so in progressive
+                # mode sprites are started once all pages have been sized
+                if not (is_sprites and is_progressive):
+                    with timer.stage('thumbnails'):
+                        thumbnail_paths, sprites = start_thumbnails(
+                            imgpaths,
+                            img_dimensions,
+                            outpath,
+                            config,
+                            progress_bar,
+                            thumbnail_sources,
+                            executor,
+                            thumbnail_cache,
+                            scheduler,
+                            timer,
+                            cache_keys,
+                            cancel,
+                        )
+            variant_uris: Optional[List[str]] = None
+            if variant_scheduler:
+                with timer.stage('variants'):
+                    variants = create_display_variants(
+                        imgpaths,
+                        img_dimensions,
+                        outpath,
+                        variant_width,
+                        variant_scheduler,
+                        timer,
+                        cancel,
+                    )
+                variant_uris = [variant.as_uri() if variant else '' for variant in variants]
+
+            cancel.check()
+            with timer.stage('render'):
+                doc_uris = (
+                    img_uris[:window_end]
+                    if img_uris
+                    else [Path(p).as_uri() for p in imgpaths[:window_end]]
+                )
+                doc_dimensions = img_dimensions[:window_end]
+                doc_variants = variant_uris[:window_end] if variant_uris else None
+                # The pages before the window are placeholders the size of the opened page until
+                # their batch is rendered, so that every page keeps its index in the document
+                for i in range(window_start):
+                    doc_uris[i] = IMG_PLACEHOLDER
+                    doc_dimensions[i] = img_dimensions[start]
+                    if doc_variants:
+                        doc_variants[i] = ''
+                renderfile = render_from_template(
+                    paths=imgpaths[:window_end],
+                    thumbnails=thumbnail_paths[:window_end],
+                    version=version,
+                    title=title,
+                    doc_template=doc_template,
+                    page_template=page_template,
+                    outfile=str(outpath / 'index.html'),
+                    config=config,
+                    uris=doc_uris,
+                    dimensions=doc_dimensions,
+                    sprites=sprites,
+                    total=len(imgpaths) if is_progressive else None,
+                    status_url=status_server.url if status_server else None,
+                    variants=doc_variants,
+                    assets=assets_uri,
+                    navigation=navigation,
+                )
+                bootfile = render_bootstrap(
+                    outfile=str(outpath / 'boot.html'),
+                    render=Path(renderfile).as_uri(),
+                    index=start,
+                    boot_template=boot_template,
+                )
+                timer.add_io(
+                    'render', written=os.path.getsize(renderfile) + os.path.getsize(bootfile)
+                )
+            if status_server:
+                status_server.start()
+            if is_progressive:
+
+                def on_sized(dimensions: List[Optional[Tuple[int, int]]]) -> Optional[str]:
+                    save_index(dimensions)
+                    if not is_sprites:
+                        return None
+                    return start_thumbnails(
+                        imgpaths,
+                        dimensions,
+                        outpath,
+                        config,
+                        progress_bar,
+                        thumbnail_sources,
+                        executor,
+                        thumbnail_cache,
+                        scheduler,
+                        timer,
+                        cache_keys,
+                        cancel,
+                    )[1]
+
+                def render_batches() -> None:
+                    error: Optional[str] = 'The app stopped before all pages were loaded.'
+                    try:
+                        if render_page_batches(
+                            imgpaths,
+                            thumbnail_paths,
+                            page_template,
+                            config,
+                            outpath,
+                            progressive_batches(window_start, window_end, len(imgpaths)),
+                            uris=img_uris,
+                            on_complete=on_sized,
+                            variants=variant_uris,
+                            known_dimensions=img_dimensions,
+                            cancel=cancel,
+                        ):
+                            error = None
+                    except Exception as e:
+                        error = f'The remaining pages could not be loaded: {e}'
+                        raise
+                    finally:
+                        if error:
+                            try:
+                                write_error_batch(outpath, len(imgpaths), error)
+                            except OSError:
+                                # The session may have been deleted already
+                                pass
+                        # Sprites are not started if rendering stopped early, so the scheduler is
+                        # started without jobs to complete and stop the status server
+                        if scheduler:
+                            scheduler.start()
+
+                threading.Thread(target=render_batches).start()
+            timer.add_time(
+                'total', time.perf_counter() - started, time.process_time() - started_cpu
+            )
+        except BaseException:
+            # Nothing more is rendered, so the background work is dropped. Schedulers that were not
+            # started yet are started without jobs, so that they complete and run the callbacks.
+            for s in schedulers:
+                s.cancel()
+                s.start()
+            release_complete()
+            raise
+        release_complete()
         return Path(bootfile)
 
     except ImagesNotFound:
         raise
 
 
-def filename_comparator(filename: Union[str, Path]) -> List[Any]:
-    """Natural sort comparison key function for filename sorting."""
-    return [int(s) if s.isdigit() else s.lower() for s in re.split(r'(\d+)', str(filename))]
+def is_stream_archive(path: Path, config: ConfigParser) -> bool:
+    """Determine whether pages of the archive at path should be served directly from the archive
+    instead of extracted, based on the `streamArchives` config option."""
+    return (
+        config[CONFIG_KEY].getboolean('streamArchives', fallback=False)
+        and path.suffix.lower()[1:] in STREAM_TYPES
+    )
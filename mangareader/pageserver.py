@@ -0,0 +1,183 @@
+import mimetypes
+import secrets
+import time
+from contextlib import ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Callable, Optional, Sequence
+from urllib.parse import parse_qs, quote, urlsplit
+
+from mangareader.archivereader import ArchivePage, get_reader
+
+
+class PageServer:
+    """Local HTTP server that serves page images directly out of an open archive, so that pages do
+    not need to be extracted to disk before they can be displayed.
+
+    The server also receives reports of the reading position from the webapp at `/focus`, which
+    are passed to `on_focus` with the index of the page being read and the range of pages visible
+    in the nav bar. In library mode, it receives the volumes opened by the reader at `/volume`,
+    which are passed to `on_volume` with the index of the volume. `on_request` is called on every
+    request, to tell that the document is still being read.
+
+    Every URL served starts with a random secret, so that other web pages open in the browser
+    cannot read pages or report to the app. Requests without it are rejected.
+
+    The server runs in a non-daemon thread, keeping the app alive while the document is being
+    read. It shuts itself down once no requests have been received for `idle_timeout` seconds, or
+    when `stop()` is called. The webapp reports the reading position periodically while it is
+    open, which keeps the server alive.
+    """
+
+    pages: Sequence[ArchivePage]
+    idle_timeout: float
+    last_request: float
+    on_focus: Optional[Callable[[int, int, int], None]]
+    on_volume: Optional[Callable[[int], None]]
+    on_request: Optional[Callable[[], None]]
+    secret: str
+    _started: bool
+    _stopped: bool
+    _httpd: ThreadingHTTPServer
+    _lock: Lock
+
+    def __init__(
+        self,
+        pages: Sequence[ArchivePage],
+        idle_timeout: float = 30 * 60,
+        on_focus: Optional[Callable[[int, int, int], None]] = None,
+        on_volume: Optional[Callable[[int], None]] = None,
+        on_request: Optional[Callable[[], None]] = None,
+    ):
+        self.pages = pages
+        self.idle_timeout = idle_timeout
+        self.last_request = time.monotonic()
+        self.on_focus = on_focus
+        self.on_volume = on_volume
+        self.on_request = on_request
+        self.secret = secrets.token_urlsafe(16)
+        self._started = False
+        self._stopped = False
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._httpd.timeout = 1
+        self._lock = Lock()
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    def url_for(self, index: int) -> str:
+        """Get the URL the page at `index` is served from."""
+        filename = quote(Path(self.pages[index].name).name)
+        return f'{self.url}/page/{index}/{filename}'
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server, including the secret."""
+        return f'http://127.0.0.1:{self.port}/{self.secret}'
+
+    def start(self) -> None:
+        """Start serving in the background. Does nothing if the server has been stopped."""
+        with self._lock:
+            if self._stopped:
+                return
+            self._started = True
+        Thread(target=self._serve, name='mangareader-pageserver').start()
+
+    def stop(self) -> None:
+        """Shut down the server within a second, or right away if it was never started. May be
+        called from any thread."""
+        with self._lock:
+            self._stopped = True
+            if self._started:
+                return
+        self._httpd.server_close()
+
+    def _serve(self) -> None:
+        with self._httpd:
+            while not self._stopped and time.monotonic() - self.last_request < self.idle_timeout:
+                self._httpd.handle_request()
+
+    def _make_handler(self) -> type:
+        server = self
+
+        class PageRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                prefix = f'/{server.secret}/'
+                if not self.path.startswith(prefix):
+                    self.send_error(403)
+                    return
+                server.last_request = time.monotonic()
+                if server.on_request:
+                    server.on_request()
+                path = self.path[len(prefix) - 1 :]
+                if path.startswith('/focus?'):
+                    self.handle_focus()
+                    return
+                if path.startswith('/volume?'):
+                    self.handle_volume()
+                    return
+                parts = path.split('/')
+                try:
+                    if parts[1] != 'page':
+                        raise ValueError(path)
+                    page = server.pages[int(parts[2])]
+                except (IndexError, ValueError):
+                    self.send_error(404)
+                    return
+                with ExitStack() as stack:
+                    try:
+                        reader = get_reader(page.archive)
+                        # Stored members are sent straight out of the memory mapped archive,
+                        # which stays mapped until they have been sent
+                        data = stack.enter_context(reader.view(page.name))
+                        if data is None:
+                            data = reader.read(page.name)
+                    except Exception:
+                        self.send_error(500)
+                        return
+                    content_type = mimetypes.guess_type(page.name)[0] or 'application/octet-stream'
+                    self.send_response(200)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(data)))
+                    self.send_header('Cache-Control', 'max-age=86400')
+                    self.end_headers()
+                    self.wfile.write(data)
+
+            def handle_focus(self) -> None:
+                query = parse_qs(urlsplit(self.path).query)
+                try:
+                    page = int(query['page'][0])
+                    first = int(query.get('first', [page])[0])
+                    last = int(query.get('last', [page])[0])
+                except (KeyError, ValueError):
+                    self.send_error(400)
+                    return
+                if server.on_focus:
+                    server.on_focus(page, first, last)
+                self.send_no_content()
+
+            def handle_volume(self) -> None:
+                query = parse_qs(urlsplit(self.path).query)
+                try:
+                    volume = int(query['index'][0])
+                except (KeyError, ValueError):
+                    self.send_error(400)
+                    return
+                if server.on_volume:
+                    server.on_volume(volume)
+                self.send_no_content()
+
+            def send_no_content(self) -> None:
+                # The webapp sends reports without reading the response, so no CORS headers are
+                # needed to receive them from a file:// document
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format: str, *args) -> None:
+                # stderr is unavailable in windowed builds
+                pass
+
+        return PageRequestHandler
@@ -1,38 +1,136 @@
-from tkinter import Tk
+import threading
+import time
+from tkinter import Tk, Toplevel
 from tkinter.ttk import Label, Progressbar
+from typing import Optional, Union
+
+from mangareader.reporter import CancellationToken
+
+# Interval at which the progress bar is redrawn. Progress from workers in between is coalesced.
+REFRESH_INTERVAL_MS = 100
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration in seconds as `m:ss`, or `h:mm:ss` if longer than an hour."""
+    minutes, secs = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{secs:02}' if hours else f'{minutes}:{secs:02}'
 
 
 class MRProgressBar:
-    """Progress bar UI component for the thumbnail loading UI."""
+    """Progress bar UI component for the thumbnail loading UI.
+
+    Workers only count processed images, and the Tk thread redraws the bar from the counts at a
+    fixed rate, so that a large volume does not flood the Tk event queue with a redraw per image.
+    Closing the window cancels the `cancel` token, to stop the work still outstanding.
+    """
 
-    tk: Tk
+    tk: Union[Tk, Toplevel]
     progress: Progressbar
     label: Label
+    cancel: CancellationToken
     count: int
-    total: int
+    cached: int
+    total: Optional[int]
+    _started: Optional[float]
+    _finished: bool
+    _close_when_complete: bool
+    _closed: bool
+    _refresh_id: Optional[str]
+    _lock: threading.Lock
 
-    def __init__(self, tk: Tk):
+    def __init__(self, tk: Union[Tk, Toplevel], cancel: Optional[CancellationToken] = None):
+        """
+        Parameters:
+        * `tk`: window to show the progress bar in.
+        * `cancel`: cancelled when the window is closed by the user. Defaults to a new token.
+        """
         self.tk = tk
         self.progress = Progressbar(tk, orient='horizontal', length=380, mode='determinate')
+        self.cancel = cancel or CancellationToken()
         self.count = 0
-        self.label = Label(tk, text='Select a file to open')
+        self.cached = 0
+        self.total = None
+        self._started = None
+        self._finished = False
+        self._close_when_complete = False
+        self._closed = False
+        self._lock = threading.Lock()
+        self.label = Label(tk, text='Select a file to open', justify='center')
         self.progress.grid(row=0, column=0, padx=10, pady=10)
         self.label.grid(row=1, column=0, padx=10, pady=5)
+        tk.protocol('WM_DELETE_WINDOW', self.abort)
+        self._refresh_id = tk.after(REFRESH_INTERVAL_MS, self._refresh)
 
     def set_total(self, total: int) -> None:
-        """Set the total number of images to process. Must be called before increment()."""
-        self.total = total
+        """Set the total number of images to process. Must be called before increment(). May be
+        called from any thread."""
+        with self._lock:
+            self.total = total
+            self._started = time.perf_counter()
 
-    def increment(self) -> None:
-        """Increment the progress bar by 1. May be called from any thread.
+    def increment(self, cached: bool = False) -> None:
+        """Count one processed image. May be called from any thread.
 
-        If the progress bar is full, destroys the host Tk window.
+        Parameters:
+        * `cached`: whether the image was loaded from the thumbnail cache instead of processed.
         """
-        self.tk.after(0, self._increment)
-
-    def _increment(self) -> None:
-        self.count += 1
-        self.progress.step(100 / self.total)
-        self.label['text'] = f'Processed image {self.count}/{self.total}'
-        if self.count == self.total:
-            self.tk.destroy()
+        with self._lock:
+            self.count += 1
+            if cached:
+                self.cached += 1
+
+    def finish(self) -> None:
+        """Treat the progress as complete even if not all images were processed, such as when
+        cancelled. May be called from any thread."""
+        with self._lock:
+            self._finished = True
+
+    def close_when_complete(self) -> None:
+        """Destroy the window once all images are processed or `finish()` is called, or right away
+        if either happened already. Must be called from the Tk thread."""
+        self._close_when_complete = True
+        self._refresh()
+
+    def close(self) -> None:
+        """Destroy the window, if not destroyed already. Must be called from the Tk thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._refresh_id:
+            self.tk.after_cancel(self._refresh_id)
+            self._refresh_id = None
+        self.tk.destroy()
+
+    def abort(self) -> None:
+        """Cancel the work still outstanding and destroy the window."""
+        self.cancel.cancel()
+        self.close()
+
+    def _refresh(self) -> None:
+        if self._closed:
+            return
+        with self._lock:
+            count, cached, total, started = self.count, self.cached, self.total, self._started
+            finished = self._finished
+        if finished and self._close_when_complete:
+            self.close()
+            return
+        if total is not None and started is not None:
+            self.progress['value'] = 100 * count / total if total else 100
+            text = (
+                f'Processed image {count}/{total} (cache: {cached} hits, {count - cached} misses)'
+            )
+            # Cached images take no time, so the rate is of the processed images only
+            elapsed = time.perf_counter() - started
+            processed = count - cached
+            if processed and elapsed > 0 and count < total:
+                rate = processed / elapsed
+                text += f'\n{rate:.1f} images/s, {format_duration((total - count) / rate)} left'
+            self.label['text'] = text
+            if count >= total and self._close_when_complete:
+                self.close()
+                return
+        if self._refresh_id:
+            self.tk.after_cancel(self._refresh_id)
+        self._refresh_id = self.tk.after(REFRESH_INTERVAL_MS, self._refresh)
@@ -0,0 +1,219 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Protocol
+
+from mangareader.excepts import OperationCancelled
+
+
+class ProgressReporter(Protocol):
+    """Receiver of thumbnail processing progress. Implemented by the Tk progress bar UI
+    (`MRProgressBar`) and by `ProgressCounter` for headless use."""
+
+    def set_total(self, total: int) -> None:
+        """Set the total number of images to process. Called before increment()."""
+        ...
+
+    def increment(self, cached: bool = False) -> None:
+        """Count one processed image. May be called from any thread.
+
+        Parameters:
+        * `cached`: whether the image was loaded from the thumbnail cache instead of processed.
+        """
+        ...
+
+    def finish(self) -> None:
+        """Stop waiting for images, for when no more are going to be processed, such as when
+        cancelled. May be called from any thread."""
+        ...
+
+
+class ProgressCounter:
+    """Progress reporter without a UI, which can be waited on until all images are processed."""
+
+    total: Optional[int]
+    count: int
+    cached: int
+    on_progress: Optional[Callable[['ProgressCounter'], None]]
+    _done: threading.Event
+    _lock: threading.Lock
+
+    def __init__(self, on_progress: Optional[Callable[['ProgressCounter'], None]] = None):
+        """
+        Parameters:
+        * `on_progress`: called with this counter after each processed image, from any thread.
+        """
+        self.total = None
+        self.count = 0
+        self.cached = 0
+        self.on_progress = on_progress
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def set_total(self, total: int) -> None:
+        with self._lock:
+            self.total = total
+            self._check_done()
+
+    def increment(self, cached: bool = False) -> None:
+        with self._lock:
+            self.count += 1
+            if cached:
+                self.cached += 1
+            self._check_done()
+        if self.on_progress:
+            self.on_progress(self)
+
+    def finish(self) -> None:
+        """Stop waiting, for when no more images are going to be processed."""
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until all images are processed, or timeout seconds have passed.
+
+        Returns: whether all images were processed.
+        """
+        return self._done.wait(timeout)
+
+    def _check_done(self) -> None:
+        if self.total is not None and self.count >= self.total:
+            self._done.set()
+
+
+class CancellationToken:
+    """Signals that opening a file was aborted, such as by closing its progress window, so that the
+    work still outstanding for it stops. Work checks the token between units, such as pages, and
+    registers callbacks to drop work queued elsewhere, such as in a `ThumbnailScheduler`."""
+
+    _event: threading.Event
+    _callbacks: List[Callable[[], None]]
+    _lock: threading.Lock
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """Cancel the operation and call the registered callbacks. May be called from any thread,
+        and more than once."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """Call callback once the operation is cancelled, or right away if it is already."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def check(self) -> None:
+        """Throws: `OperationCancelled` if the operation has been cancelled."""
+        if self._event.is_set():
+            raise OperationCancelled()
+
+
+class StageTimer:
+    """Records the time spent in each stage of rendering a document, the bytes each stage read and
+    wrote, counts of items processed, and distributions of sampled values such as the latency of
+    each thumbnail job."""
+
+    stages: Dict[str, float]
+    cpu: Dict[str, float]
+    io: Dict[str, Dict[str, int]]
+    counts: Dict[str, int]
+    samples: Dict[str, List[float]]
+    _lock: threading.Lock
+
+    def __init__(self):
+        self.stages = {}
+        self.cpu = {}
+        self.io = {}
+        self.counts = {}
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Context manager timing a stage. Time spent in a stage entered more than once is summed.
+
+        Both wall clock and CPU time are recorded. CPU time is that of the whole process, so it
+        includes any background work running at the same time.
+        """
+        start = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start, time.process_time() - start_cpu)
+
+    def add_time(self, name: str, seconds: float, cpu_seconds: float = 0) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0) + seconds
+            self.cpu[name] = self.cpu.get(name, 0) + cpu_seconds
+
+    def add_io(self, name: str, read: int = 0, written: int = 0) -> None:
+        """Count bytes read and written by a stage."""
+        with self._lock:
+            stage_io = self.io.setdefault(name, {'read': 0, 'written': 0})
+            stage_io['read'] += read
+            stage_io['written'] += written
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a sample of a distribution, such as the latency of a single job."""
+        with self._lock:
+            self.samples.setdefault(name, []).append(value)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Machine readable summary of the recorded timings, in seconds, and distributions."""
+        with self._lock:
+            return {
+                'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+                'cpu': {name: round(seconds, 6) for name, seconds in self.cpu.items()},
+                'io': {name: dict(stage_io) for name, stage_io in self.io.items()},
+                'counts': dict(self.counts),
+                'distributions': {
+                    name: summarize(values) for name, values in self.samples.items() if values
+                },
+            }
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    """Summarize a distribution of samples with its percentiles, and a histogram with power of two
+    bucket bounds. Each bucket counts the samples greater than the previous bound, up to and
+    including its own bound.
+    """
+    ordered = sorted(values)
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 6)
+
+    histogram: Dict[float, int] = {}
+    for value in ordered:
+        bound = 2.0 ** math.ceil(math.log2(value)) if value > 0 else 0.0
+        histogram[bound] = histogram.get(bound, 0) + 1
+    return {
+        'count': len(ordered),
+        'min': round(ordered[0], 6),
+        'mean': round(sum(ordered) / len(ordered), 6),
+        'p50': percentile(0.5),
+        'p90': percentile(0.9),
+        'p99': percentile(0.99),
+        'max': round(ordered[-1], 6),
+        'histogram': {f'{bound:g}': count for bound, count in histogram.items()},
+    }
@@ -0,0 +1,180 @@
+import heapq
+import threading
+import time
+from concurrent.futures import Executor, Future
+from functools import partial
+from multiprocessing import cpu_count
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from mangareader.reporter import StageTimer
+
+
+class ThumbnailScheduler:
+    """Submits thumbnail rendering jobs to a worker pool in order of priority, nearest to the page
+    being read first.
+
+    Only a few jobs more than the pool has workers are submitted at a time, and the rest wait in a
+    priority queue. Calling `focus()` when the reader moves to another page reorders the waiting
+    jobs, so that the thumbnails around the new position are rendered next and jobs for far away
+    pages are deferred.
+    """
+
+    max_in_flight: int
+    on_complete: Optional[Callable[[], None]]
+    name: str
+    timer: Optional[StageTimer]
+    _executor: Executor
+    _jobs: Dict[int, Tuple[Callable[..., Any], Tuple[Any, ...], Callable[[Future], None]]]
+    _queue: List[Tuple[Tuple[int, int, int], int]]
+    _focus: Tuple[int, int, int]
+    _in_flight: int
+    _started: bool
+    _condition: threading.Condition
+
+    def __init__(
+        self,
+        executor: Executor,
+        focus: int = 0,
+        max_in_flight: Optional[int] = None,
+        on_complete: Optional[Callable[[], None]] = None,
+        name: str = 'thumbnail',
+        timer: Optional[StageTimer] = None,
+    ):
+        """
+        Parameters:
+        * `executor`: worker pool to run jobs in. May be shared with other schedulers.
+        * `focus`: index of the page to start from.
+        * `max_in_flight`: number of jobs submitted to the pool at once. Defaults to twice the
+          number of workers.
+        * `on_complete`: called once all jobs have completed or the scheduler is cancelled.
+        * `name`: kind of job scheduled, which names the distributions recorded in `timer`.
+        * `timer`: records the latency of each job from submission to completion as
+          `{name}_latency`, and the number of jobs waiting or in flight at each submission as
+          `{name}_queue_depth`.
+        """
+        self._executor = executor
+        workers = getattr(executor, '_max_workers', None) or cpu_count()
+        self.max_in_flight = max_in_flight or 2 * workers
+        self.on_complete = on_complete
+        self.name = name
+        self.timer = timer
+        self._jobs = {}
+        self._queue = []
+        self._focus = (focus, focus, focus)
+        self._in_flight = 0
+        self._started = False
+        self._condition = threading.Condition()
+
+    def add(
+        self, index: int, callback: Callable[[Future], None], fn: Callable[..., Any], *args: Any
+    ) -> None:
+        """Add a job for the page at index, which calls `fn(*args)` in the pool. callback is called
+        with the future of the job once it is done. Jobs must be added before `start()`."""
+        with self._condition:
+            if self._started:
+                raise RuntimeError('Jobs cannot be added to a started scheduler')
+            self._jobs[index] = (fn, args, callback)
+
+    def start(self) -> None:
+        """Start submitting jobs to the pool in the background. Does nothing if already started."""
+        with self._condition:
+            if self._started:
+                return
+            self._started = True
+            self._reprioritize()
+        threading.Thread(target=self._dispatch, name='mangareader-scheduler').start()
+
+    def focus(self, index: int, first: Optional[int] = None, last: Optional[int] = None) -> None:
+        """Reorder waiting jobs around a new reading position. May be called from any thread.
+
+        Parameters:
+        * `index`: index of the page being read.
+        * `first`, `last`: range of pages whose thumbnails are visible in the nav bar, which are
+          rendered before any others.
+        """
+        first = index if first is None else first
+        last = index if last is None else last
+        with self._condition:
+            self._focus = (index, min(first, last), max(first, last))
+            if self._started:
+                self._reprioritize()
+
+    def cancel(self) -> None:
+        """Drop all jobs that have not been submitted yet."""
+        with self._condition:
+            self._jobs.clear()
+            self._queue.clear()
+            self._condition.notify_all()
+
+    def _priority(self, index: int) -> Tuple[int, int, int]:
+        focus, first, last = self._focus
+        return (0 if first <= index <= last else 1, abs(index - focus), index)
+
+    def _reprioritize(self) -> None:
+        self._queue = [(self._priority(index), index) for index in self._jobs]
+        heapq.heapify(self._queue)
+        self._condition.notify_all()
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._condition:
+                # Wait until there is both a job and a free slot for it, or all jobs are done
+                self._condition.wait_for(
+                    lambda: (self._queue and self._in_flight < self.max_in_flight)
+                    or (not self._queue and not self._in_flight)
+                )
+                if not self._queue:
+                    break
+                _, index = heapq.heappop(self._queue)
+                fn, args, callback = self._jobs.pop(index)
+                if self.timer:
+                    self.timer.observe(
+                        f'{self.name}_queue_depth', len(self._queue) + self._in_flight + 1
+                    )
+                self._in_flight += 1
+            try:
+                future = self._executor.submit(fn, *args)
+            except RuntimeError:
+                # The pool has been shut down
+                self.cancel()
+                self._on_done(None)
+                continue
+            if self.timer:
+                future.add_done_callback(partial(self._observe_latency, time.perf_counter()))
+            future.add_done_callback(callback)
+            future.add_done_callback(self._on_done)
+        if self.on_complete:
+            self.on_complete()
+
+    def _observe_latency(self, submitted: float, future: Future) -> None:
+        if self.timer:
+            self.timer.observe(f'{self.name}_latency', time.perf_counter() - submitted)
+
+    def _on_done(self, future: Optional[Future]) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+
+def when_all_complete(
+    schedulers: Sequence[ThumbnailScheduler], callback: Callable[[], None]
+) -> Callable[[], None]:
+    """Call callback once every one of the schedulers has completed, and the returned function has
+    been called. Schedulers may complete as soon as they are started, so the caller calls the
+    returned function once it is done, to not be called back before then.
+
+    Returns: function to call once the caller is done.
+    """
+    remaining = [len(schedulers) + 1]
+    lock = threading.Lock()
+
+    def on_complete() -> None:
+        with lock:
+            remaining[0] -= 1
+            done = remaining[0] == 0
+        if done:
+            callback()
+
+    for scheduler in schedulers:
+        scheduler.on_complete = on_complete
+    return on_complete
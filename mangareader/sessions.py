@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from configparser import ConfigParser
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+from mangareader.config import CONFIG_KEY
+
+SESSIONS_PATH = Path(tempfile.gettempdir()) / 'html-mangareader'
+SESSION_PREFIX = 'session-'
+# Sessions used more recently than this are never deleted to make room, as they are likely still
+# being read
+SESSION_GRACE_SECONDS = 60 * 60
+# Touched whenever a session is used, as the session directory itself is only modified when files
+# are added to it
+SESSION_MARKER = '.last-used'
+
+
+def create_session(root: Union[Path, str] = SESSIONS_PATH) -> Path:
+    """Create a new, empty output directory for one opened file, so that any number of files can be
+    open at once without overwriting each other's pages.
+
+    Returns: path to the session directory.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    prefix = f'{SESSION_PREFIX}{time.strftime("%Y%m%d-%H%M%S")}-'
+    session = Path(tempfile.mkdtemp(prefix=prefix, dir=root))
+    touch_session(session)
+    return session
+
+
+def touch_session(session: Path) -> None:
+    """Mark a session as used now, such as when the webapp loads pages from the app or reports
+    the reading position, so that it is not deleted as stale while it is being read."""
+    try:
+        (session / SESSION_MARKER).touch()
+    except OSError:
+        # Deleted already, or the document was not rendered to a session
+        pass
+
+
+def last_used(entry: Path) -> float:
+    """Time a session was last used, see `touch_session`, or the modification time of anything
+    else.
+
+    Throws: `OSError` if entry does not exist.
+    """
+    modified = entry.lstat().st_mtime
+    try:
+        return max(modified, (entry / SESSION_MARKER).stat().st_mtime)
+    except OSError:
+        return modified
+
+
+def directory_size(path: Path) -> int:
+    """Total size in bytes of the files in a directory tree, or of a single file."""
+    if not path.is_dir():
+        return path.stat().st_size
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.stat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def clean_sessions(
+    root: Union[Path, str],
+    max_age: float,
+    max_size: int,
+    keep: Optional[Path] = None,
+) -> None:
+    """Delete stale sessions. Sessions unused for longer than max_age are deleted, then the least
+    recently used sessions are deleted until the rest fit within max_size, sparing any used within
+    `SESSION_GRACE_SECONDS`. Anything else found in root, such as the output of older versions, is
+    treated as a session.
+
+    Parameters:
+    * `root`: directory containing sessions.
+    * `max_age`: time in seconds since a session was last used after which it is deleted.
+    * `max_size`: total size in bytes of all sessions to keep.
+    * `keep`: session that is never deleted, normally the current one.
+    """
+    now = time.time()
+    entries: List[Tuple[float, int, Path]] = []
+    total = 0
+    for entry in Path(root).iterdir():
+        if keep and entry.resolve() == keep.resolve():
+            continue
+        try:
+            modified = last_used(entry)
+            if now - modified > max_age:
+                _remove(entry)
+                continue
+            size = directory_size(entry)
+        except OSError:
+            continue
+        entries.append((modified, size, entry))
+        total += size
+    for modified, size, entry in sorted(entries):
+        if total <= max_size or now - modified < SESSION_GRACE_SECONDS:
+            return
+        try:
+            _remove(entry)
+        except OSError:
+            continue
+        total -= size
+
+
+def start_session_cleanup(config: ConfigParser, keep: Path, root: Union[Path, str] = SESSIONS_PATH):
+    """Clean up stale sessions in the background, according to the `sessionMaxAge` (hours) and
+    `sessionMaxSize` (megabytes) config options.
+
+    Parameters:
+    * `keep`: current session, which is never deleted.
+    """
+    max_age = config[CONFIG_KEY].getfloat('sessionMaxAge', fallback=24) * 60 * 60
+    max_size = config[CONFIG_KEY].getint('sessionMaxSize', fallback=1024) * 1024 * 1024
+    threading.Thread(
+        target=clean_sessions, args=(root, max_age, max_size, keep), daemon=True
+    ).start()
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink()
@@ -1,24 +1,137 @@
+import io
+import os
+import zlib
 import py7zr
 from pathlib import Path
-from typing import Union
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Union
+
+
+class SevenZipInfo(NamedTuple):
+    """Metadata of a single archive member, with the same attribute names as `zipfile.ZipInfo`."""
+
+    filename: str
+    file_size: int
+    compress_size: Optional[int]
+    CRC: Optional[int]
+
+    def is_dir(self) -> bool:
+        return self.filename.endswith('/')
 
 
 class SevenZipAdapter:
     """
     Minimal wrapper class over py7zr.SevenZipFile to support zipfile-like interface.
+
+    py7zr can only decompress the whole archive in one pass, so selective extraction works by
+    registering an output for the requested members only. The rest of the archive is still
+    decompressed, but discarded instead of being written out.
     """
 
     def __init__(self, file: Union[Path, str], mode: str = 'r'):
         self._file = py7zr.SevenZipFile(str(file), mode)
+        self._files: List[Any] = list(self._file.files)
+        self._members: Dict[str, Any] = {f.filename: f for f in self._files}
+        streams = self._file.header.main_streams
+        self._folders: List[Any] = streams.unpackinfo.folders if streams else []
 
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
         self._file.close()
 
     def namelist(self):
         return self._file.getnames()
 
-    def extractall(self, path=None, members=None):
-        self._file.extractall(path)
+    def infolist(self) -> List[SevenZipInfo]:
+        return [self.getinfo(name) for name in self._members]
+
+    def getinfo(self, name: str) -> SevenZipInfo:
+        """Get the metadata of an archive member.
+
+        Throws: `KeyError` if the member does not exist.
+        """
+        member = self._members[name]
+        if member.is_directory:
+            return SevenZipInfo(f'{name}/', 0, 0, None)
+        return SevenZipInfo(
+            name,
+            0 if member.emptystream else member.uncompressed_size,
+            member.compressed,
+            member._get_property('digest'),
+        )
+
+    def extractall(self, path=None, members: Optional[Iterable[str]] = None):
+        """Extract members of the archive to path, or the current directory. Extracts all members
+        if `members` is not given."""
+        self._reset()
+        targets = set(self._members if members is None else members)
+        outpath = Path(path if path is not None else os.getcwd()).resolve()
+        for member in self._files:
+            if member.filename not in targets:
+                continue
+            outfile = outpath / member.filename
+            if outpath not in outfile.resolve().parents:
+                raise py7zr.Bad7zFile(f'Member is outside of extraction path: {member.filename}')
+            if member.is_directory:
+                outfile.mkdir(parents=True, exist_ok=True)
+                continue
+            outfile.parent.mkdir(parents=True, exist_ok=True)
+            if member.emptystream:
+                outfile.touch()
+                continue
+            self._file.worker.register_filelike(member.id, str(outfile))
+        # Folders are extracted out of order in parallel, so the last of several members with the
+        # same name would not reliably win
+        unique_names = len(self._members) == len(self._files)
+        self._file.worker.extract(
+            self._file.fp, multithread=unique_names and self._is_multifolder()
+        )
+
+    def read(self, name: str) -> bytes:
+        """Read the contents of an archive member into memory.
+
+        Throws:
+        * `KeyError` if the member does not exist.
+        * `Bad7zFile` if the member does not match its CRC.
+        """
+        member = self._members[name]
+        if member.is_directory or member.emptystream:
+            return b''
+        self._reset()
+        buffer = io.BytesIO()
+        self._file.worker.register_filelike(member.id, buffer)
+        # Only decompress the folder containing the member, up to and including the member
+        folder = member.folder
+        position = self._file.header.main_streams.packinfo.packpositions[
+            self._folders.index(folder)
+        ]
+        files = [f for f in self._files if f.folder is folder and f.id <= member.id]
+        self._file.worker.extract_single(
+            self._file.fp, files, self._file.worker.src_start + position
+        )
+        data = buffer.getvalue()
+        crc = member._get_property('digest')
+        if crc is not None and zlib.crc32(data) != crc:
+            raise py7zr.Bad7zFile(f'Bad CRC for member: {name}')
+        return data
+
+    def _reset(self) -> None:
+        """Prepare for a new extraction. py7zr keeps the decompressor state of each folder, so it
+        can otherwise only extract once."""
+        self._file.reset()
+        for folder in self._folders:
+            folder.decompressor = None
+
+    def _is_multifolder(self) -> bool:
+        """Whether the archive consists of independently compressed folders that py7zr can
+        decompress in parallel."""
+        streams = self._file.header.main_streams
+        return (
+            streams is not None
+            and streams.unpackinfo.numfolders > 1
+            and streams.packinfo.numstreams == streams.unpackinfo.numfolders
+        )
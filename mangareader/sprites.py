@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from mangareader.thumbnails import THUMBNAIL_MAX_SIZE, thumbnail_size
+
+SHEET_MAX_WIDTH = 4096
+SHEET_MAX_ROWS = 8
+ROW_HEIGHT = THUMBNAIL_MAX_SIZE[1]
+
+
+class SpriteTile(NamedTuple):
+    """Location of a single thumbnail within a sprite sheet."""
+
+    sheet: int
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+def layout_sprites(
+    dimensions: Sequence[Optional[Tuple[int, int]]],
+) -> Tuple[List[Tuple[int, int]], List[Optional[SpriteTile]]]:
+    """Pack the thumbnails of images with the given dimensions into sprite sheets. Thumbnails are
+    placed left to right in rows of `ROW_HEIGHT`, and a new sheet is started once a sheet has
+    `SHEET_MAX_ROWS` rows.
+
+    Returns: tuple of the (width, height) of each sheet, and the tile of each image. Tiles are None
+    for images with unknown dimensions.
+    """
+    sheets: List[Tuple[int, int]] = []
+    tiles: List[Optional[SpriteTile]] = []
+    x, y, sheet_width = 0, 0, 0
+    for size in dimensions:
+        if not size or not size[0] or not size[1]:
+            tiles.append(None)
+            continue
+        width, height = thumbnail_size(*size)
+        if x + width > SHEET_MAX_WIDTH:
+            x, y = 0, y + ROW_HEIGHT
+        if y >= SHEET_MAX_ROWS * ROW_HEIGHT:
+            sheets.append((sheet_width, y))
+            x, y, sheet_width = 0, 0, 0
+        tiles.append(SpriteTile(len(sheets), x, y, width, height))
+        x += width
+        sheet_width = max(sheet_width, x)
+    if sheet_width:
+        sheets.append((sheet_width, y + ROW_HEIGHT))
+    return sheets, tiles
+
+
+class SpriteSheetWriter:
+    """Composes thumbnails into sprite sheets as they are rendered. Each sheet is written once all
+    of its thumbnails are available, in WebP format if supported by Pillow, otherwise JPEG.
+    """
+
+    outpath: Path
+    sheets: List[Tuple[int, int]]
+    tiles: List[Optional[SpriteTile]]
+    delete_thumbnails: bool
+    format: str
+    extension: str
+    _thumbnails: Dict[int, Path]
+    _remaining: List[int]
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        dimensions: Sequence[Optional[Tuple[int, int]]],
+        outpath: Path,
+        delete_thumbnails: bool = False,
+    ):
+        """
+        Parameters:
+        * `dimensions`: dimensions of each image, see `layout_sprites`.
+        * `outpath`: directory to write sprite sheets to.
+        * `delete_thumbnails`: delete each thumbnail file once it has been added to a sheet.
+        """
+        self.outpath = outpath
+        self.sheets, self.tiles = layout_sprites(dimensions)
+        self.delete_thumbnails = delete_thumbnails
+        # Pillow is only imported once sprites are used, as it takes a while to import
+        from PIL import features
+
+        self.format = 'WEBP' if features.check('webp') else 'JPEG'
+        self.extension = 'webp' if self.format == 'WEBP' else 'jpg'
+        self._thumbnails = {}
+        self._remaining = [0 for _ in self.sheets]
+        for tile in self.tiles:
+            if tile:
+                self._remaining[tile.sheet] += 1
+        self._lock = threading.Lock()
+
+    def sheet_path(self, sheet: int) -> Path:
+        return self.outpath / f'thumbnails-{sheet}.{self.extension}'
+
+    def add(self, index: int, thumbnail: Path) -> None:
+        """Notify that the thumbnail of the image at index has been rendered. May be called from any
+        thread."""
+        tile = self.tiles[index]
+        if not tile:
+            return
+        with self._lock:
+            self._thumbnails[index] = thumbnail
+            self._remaining[tile.sheet] -= 1
+            complete = self._remaining[tile.sheet] == 0
+        if complete:
+            threading.Thread(target=self._write_sheet, args=(tile.sheet,)).start()
+
+    def _write_sheet(self, sheet: int) -> None:
+        from PIL import Image
+
+        sheet_img = Image.new('RGB', self.sheets[sheet], (32, 32, 32))
+        for index, tile in enumerate(self.tiles):
+            if not tile or tile.sheet != sheet:
+                continue
+            thumbnail = self._thumbnails[index]
+            try:
+                with Image.open(thumbnail) as img:
+                    sheet_img.paste(img.convert('RGB').resize((tile.width, tile.height)), tile[1:3])
+                if self.delete_thumbnails:
+                    thumbnail.unlink()
+            except:
+                # Missing thumbnails are left blank
+                pass
+        # Write to a temporary file first, so the webapp never loads a partially written sheet
+        sheet_path = self.sheet_path(sheet)
+        temp_path = sheet_path.with_suffix('.tmp')
+        sheet_img.save(temp_path, format=self.format, quality=80)
+        os.replace(temp_path, sheet_path)
+
+    def to_json(self) -> str:
+        """Serialize the sprite sheet index to be embedded in the HTML document."""
+        return json.dumps(
+            {
+                'sheets': [
+                    {'uri': self.sheet_path(i).as_uri(), 'width': width, 'height': height}
+                    for i, (width, height) in enumerate(self.sheets)
+                ],
+                'tiles': [list(tile) if tile else None for tile in self.tiles],
+            },
+            separators=(',', ':'),
+        )
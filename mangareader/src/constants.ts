@@ -9,18 +9,52 @@ const versionCheckUrl = 'https://api.github.com/repos/luejerry/html-mangareader/
  */
 const storageKey = 'mangareader-config';
 /**
- * Max number of pages to load at once, if `dynamicImageLoading` is enabled in `config.ini`
+ * Max number of pages to load at once, if `dynamicImageLoading` is enabled in `config.ini`, unless
+ * the prefetch window is larger
  */
 const maxLoadedImages = 20;
+/**
+ * Number of pages ahead of the visible page in the reading direction to load and decode in the
+ * background, if `dynamicImageLoading` is enabled and `prefetchPages` is not set in `config.ini`.
+ * Half as many pages are loaded behind it.
+ */
+const defaultPrefetchPages = 4;
 /**
  * Max number of navbar previews to load at once, if `dynamicImageLoading` is enabled in
  * `config.ini`
  */
 const maxLoadedPreviews = 60;
+/**
+ * Interval in milliseconds at which pages near the viewport that are still displayed from the
+ * original image check whether their downscaled display variant has been rendered.
+ */
+const variantPollInterval = 1000;
+/**
+ * Interval in milliseconds at which loading a page batch file that has not been written yet is
+ * retried in progressive mode.
+ */
+const pageBatchRetryInterval = 500;
+/**
+ * Number of times loading a page batch file is retried before the remaining pages are given up
+ * on, about 5 minutes.
+ */
+const maxPageBatchRetries = 600;
+/**
+ * Interval in milliseconds at which the reading position is reported to the app while the
+ * document is open, so that the app keeps serving pages streamed from the archive.
+ */
+const heartbeatInterval = 5 * 60 * 1000;
 
 const loadingPlaceholder =
   'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8HwYAAloBV80ot9EAAAAASUVORK5CYII=';
 
+/**
+ * Fully transparent image, used as the source of navbar previews that display a sprite sheet as
+ * their background.
+ */
+const transparentPixel =
+  'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7';
+
 const smartFit: { [K in FitSizes]: FitDimensions } = {
   size0: {
     portrait: {
@@ -30,12 +30,22 @@
   const scrubberPreviewDiv = document.getElementById('scrubber-preview') as HTMLDivElement;
   const scrubberMarker = document.getElementById('scrubber-marker') as HTMLDivElement;
   const scrubberMarkerActive = document.getElementById('scrubber-marker-active') as HTMLDivElement;
+  const pagesContainerDiv = document.getElementById('pages-container-div') as HTMLDivElement;
+  const spritesScript = document.getElementById('thumbnail-sprites') as HTMLScriptElement;
   let scrubberImages: HTMLImageElement[]; // Array of images, set in `setupScrubber()`
 
   const animationDispatcher = createAnimationDispatcher();
+  const throttledReportFocus = throttle(reportFocus, 250);
 
   let intersectObserver: IntersectionObserver;
+  // Used to switch pages to their display variant once rendered
+  let variantObserver: IntersectionObserver | undefined;
+  const nearVariantImages = new Set<HTMLImageElement>();
+  const pollingVariantImages = new Set<HTMLImageElement>();
   let visiblePage: HTMLElement | null;
+  // Used by dynamic image loading to prefetch in the direction the user is reading
+  let lastVisiblePageIndex = 0;
+  let readingForward = true;
   let configIni: ConfigIni = {};
   // Used by scrubber
   const scrubberState: ScrubberState = {
@@ -60,11 +70,24 @@
     }
   }
 
+  /**
+   * Read the thumbnail sprite sheet index embedded in the `#thumbnail-sprites` element.
+   * @returns Parsed sprite index, or null if thumbnails are not rendered as sprites.
+   */
+  function loadSpriteIndex(): SpriteIndex | null {
+    try {
+      return JSON.parse(spritesScript?.textContent || 'null') as SpriteIndex | null;
+    } catch (e) {
+      console.error('Failed to parse thumbnail sprites', e);
+      return null;
+    }
+  }
+
   /**
    * Setup tasks to be run when the user scrolls to a new page.
    */
   function setupIntersectionObserver(threshold: number, rootMargin: string): IntersectionObserver {
-    const throttledUpdateLoadedImages = throttle(updateLoadedImages, 1000);
+    const throttledUpdatePrefetchWindow = throttle(updatePrefetchWindow, 200);
     const observer = onIntersectChange(
       (target: HTMLElement) => {
         visiblePage = target;
@@ -79,13 +102,9 @@
         // Update the scrubber marker as user scrolls.
         scrubberState.visiblePageIndex = parseInt(target.dataset.index, 10);
         setScrubberMarkerActive(scrubberState.visiblePageIndex);
+        throttledReportFocus(scrubberState.visiblePageIndex);
         if (configIni.dynamicImageLoading) {
-          throttledUpdateLoadedImages(
-            images,
-            scrubberState.visiblePageIndex,
-            maxLoadedImages,
-            'pageloader',
-          );
+          throttledUpdatePrefetchWindow(scrubberState.visiblePageIndex);
         }
       },
       { threshold, rootMargin },
@@ -96,6 +115,55 @@
     return observer;
   }
 
+  /**
+   * Report the reading position to the app, so that the thumbnails nearest to it are rendered
+   * first. The app only listens while thumbnails are being rendered, or while pages are streamed
+   * from the archive.
+   * @param page Index of the page being read.
+   * @param first Index of the first page with a preview visible in the navbar.
+   * @param last Index of the last page with a preview visible in the navbar.
+   */
+  function reportFocus(page: number, first = page, last = page): void {
+    const statusUrl = document.body.dataset.statusUrl;
+    if (!statusUrl) {
+      return;
+    }
+    const url = `${statusUrl}/focus?page=${page}&first=${first}&last=${last}`;
+    fetch(url, { mode: 'no-cors' }).catch(() => {
+      // App has stopped listening, stop reporting
+      delete document.body.dataset.statusUrl;
+    });
+  }
+
+  /**
+   * Report the reading position periodically while the document is open, since the app stops
+   * serving streamed pages once it has not received any requests for a while.
+   */
+  function setupHeartbeat(): void {
+    const timer = setInterval(() => {
+      if (!document.body.dataset.statusUrl) {
+        clearInterval(timer);
+        return;
+      }
+      reportFocus(scrubberState.visiblePageIndex);
+    }, heartbeatInterval);
+  }
+
+  /**
+   * In library mode, report the opened volume to the app, so that the volumes after it are
+   * rendered ahead of time.
+   */
+  function reportVolume(): void {
+    const libraryNav = document.getElementById('library-nav');
+    if (!libraryNav || !libraryNav.dataset.libraryUrl) {
+      return;
+    }
+    const url = `${libraryNav.dataset.libraryUrl}/volume?index=${libraryNav.dataset.volume}`;
+    fetch(url, { mode: 'no-cors' }).catch(() => {
+      // App has stopped listening
+    });
+  }
+
   /**
    * Load and unload images as the visible page changes with scrolling.
    * @param imgs Images to load/unload.
@@ -132,13 +200,63 @@
     });
   }
 
-  const imagesMeta = images.map((image): { image: HTMLImageElement; orientation: Orientation } => {
-    const ratio = image.height / image.width;
-    return {
-      image,
-      orientation: ratio > 2 ? 'portraitLong' : ratio > 1 ? 'portrait' : 'landscape',
-    };
-  });
+  /**
+   * Load and decode the pages around the visible page ahead of time, and unload pages far from it,
+   * as the visible page changes with scrolling. Used if `dynamicImageLoading` is enabled.
+   *
+   * `prefetchPages` pages ahead in the reading direction, and half as many behind, are loaded
+   * nearest first and decoded in the background with `img.decode()`, so that they can be displayed
+   * without a blank frame when scrolled to. The reading direction is the direction of the last page
+   * change, whether scrolling down or sideways in either horizontal mode. Pages further than
+   * `maxLoadedImages / 2` pages, or the prefetch window if larger, are unloaded to cap memory use.
+   * @param visiblePageIndex Index of currently visible page.
+   */
+  function updatePrefetchWindow(visiblePageIndex: number): void {
+    if (visiblePageIndex !== lastVisiblePageIndex) {
+      readingForward = visiblePageIndex > lastVisiblePageIndex;
+      lastVisiblePageIndex = visiblePageIndex;
+    }
+    const ahead = Math.max(configIni.prefetchPages ?? defaultPrefetchPages, 0);
+    const behind = Math.ceil(ahead / 2);
+    const step = readingForward ? 1 : -1;
+    const keepDistance = Math.max(maxLoadedImages / 2, ahead);
+    animationDispatcher.addTask('pageloader', () => {
+      // Nearest pages first, alternating ahead and behind until the shorter side is done
+      const order = [visiblePageIndex];
+      for (let distance = 1; distance <= ahead; distance++) {
+        order.push(visiblePageIndex + distance * step);
+        if (distance <= behind) {
+          order.push(visiblePageIndex - distance * step);
+        }
+      }
+      for (const i of order) {
+        const img = images[i];
+        if (!img || (img.src && img.src !== loadingPlaceholder) || !img.dataset.src) {
+          continue;
+        }
+        // Lazy loading would defer off-screen pages until they are scrolled into view
+        img.loading = 'eager';
+        img.src = img.dataset.src;
+        img.decode().catch(() => {
+          // Replaced or unloaded before decoding finished, or failed to load
+        });
+      }
+      for (const [i, img] of images.entries()) {
+        if (Math.abs(i - visiblePageIndex) > keepDistance && img.src !== loadingPlaceholder) {
+          img.src = loadingPlaceholder;
+        }
+      }
+    });
+  }
+
+  function getOrientation(image: HTMLImageElement): Orientation {
+    const ratio = getImageHeightAttribute(image) / getImageWidthAttribute(image);
+    return ratio > 2 ? 'portraitLong' : ratio > 1 ? 'portrait' : 'landscape';
+  }
+
+  const imageOrientations = new Map(
+    images.map((image): [HTMLImageElement, Orientation] => [image, getOrientation(image)]),
+  );
 
   /**
    * Read the configuration stored in browser LocalStorage. Unlike `config.ini` these settings can
@@ -361,8 +479,33 @@
     }
   }
 
-  function setImagesWidth(fitMode: ScreenClamp, width: number) {
-    for (const img of images) {
+  /**
+   * Apply an image scaling mode to a subset of images, such as pages that were just added to the
+   * document. Unlike the `handle*` functions, the viewport is not scrolled.
+   */
+  function scaleImages(scaling: Scaling, targets: HTMLImageElement[]): void {
+    switch (scaling) {
+      case 'none':
+        return setImagesWidth('none', getWidth(), targets);
+      case 'fit_width':
+        return setImagesWidth('fit', getWidth(), targets);
+      case 'fit_height':
+        return setImagesHeight('fit', getHeight(), targets);
+      case 'shrink':
+        return setImagesDimensions('shrink', getWidth(), getHeight(), targets);
+      case 'shrink_width':
+        return setImagesWidth('shrink', getWidth(), targets);
+      case 'shrink_height':
+        return setImagesHeight('shrink', getHeight(), targets);
+      case 'smart_size0':
+        return smartFitImages(smartFit.size0, targets);
+      case 'smart_size1':
+        return smartFitImages(smartFit.size1, targets);
+    }
+  }
+
+  function setImagesWidth(fitMode: ScreenClamp, width: number, targets = images) {
+    for (const img of targets) {
       switch (fitMode) {
         case 'fit':
           Object.assign(img.style, {
@@ -384,11 +527,13 @@
           });
       }
     }
-    visiblePage?.scrollIntoView();
+    if (targets === images) {
+      visiblePage?.scrollIntoView();
+    }
   }
 
-  function setImagesHeight(fitMode: ScreenClamp, height: number) {
-    for (const img of images) {
+  function setImagesHeight(fitMode: ScreenClamp, height: number, targets = images) {
+    for (const img of targets) {
       switch (fitMode) {
         case 'fit':
           Object.assign(img.style, {
@@ -410,11 +555,18 @@
           });
       }
     }
-    visiblePage?.scrollIntoView({ inline: 'center' });
+    if (targets === images) {
+      visiblePage?.scrollIntoView({ inline: 'center' });
+    }
   }
 
-  function setImagesDimensions(fitMode: ScreenClamp, width: number, height: number) {
-    for (const img of images) {
+  function setImagesDimensions(
+    fitMode: ScreenClamp,
+    width: number,
+    height: number,
+    targets = images,
+  ) {
+    for (const img of targets) {
       switch (fitMode) {
         case 'fit':
           // Not implemented
@@ -429,7 +581,9 @@
           });
       }
     }
-    visiblePage?.scrollIntoView();
+    if (targets === images) {
+      visiblePage?.scrollIntoView();
+    }
   }
 
   function clampImageSize(img: HTMLImageElement, height: number, width: number) {
@@ -453,11 +607,11 @@
     }
   }
 
-  function smartFitImages(fitMode: FitDimensions): void {
+  function smartFitImages(fitMode: FitDimensions, targets = images): void {
     const screenWidth = getWidth();
     const screenHeight = getHeight();
-    for (const { image: img, orientation: orient } of imagesMeta) {
-      switch (orient) {
+    for (const img of targets) {
+      switch (imageOrientations.get(img) ?? getOrientation(img)) {
         case 'portrait':
           const maxHeight = Math.min(getImageHeightAttribute(img), fitMode.portrait.height);
           Object.assign(img.style, {
@@ -476,7 +630,9 @@
           });
       }
     }
-    visiblePage?.scrollIntoView({ inline: 'center' });
+    if (targets === images) {
+      visiblePage?.scrollIntoView({ inline: 'center' });
+    }
   }
 
   function setDirection(direction: Direction): void {
@@ -566,6 +722,71 @@
     }
   }
 
+  /**
+   * Pages are displayed from the original image until their downscaled display variant, given by
+   * `data-variant`, has been rendered in the background. Pages near the viewport check for their
+   * variant every `variantPollInterval` ms by preloading it, and switch to it once it has loaded.
+   */
+  function setupDisplayVariants(imgs = images): void {
+    const pending = imgs.filter((img) => img.dataset.variant);
+    if (!pending.length) {
+      return;
+    }
+    if (!variantObserver) {
+      variantObserver = new IntersectionObserver(
+        (entries) => {
+          for (const entry of entries) {
+            const img = entry.target as HTMLImageElement;
+            if (entry.isIntersecting) {
+              nearVariantImages.add(img);
+              pollDisplayVariant(img);
+            } else {
+              nearVariantImages.delete(img);
+            }
+          }
+        },
+        { rootMargin: '100%' },
+      );
+    }
+    for (const img of pending) {
+      variantObserver.observe(img);
+    }
+  }
+
+  /**
+   * Switch an image to its display variant if the variant has been rendered, otherwise check again
+   * later while the image is still near the viewport.
+   */
+  function pollDisplayVariant(img: HTMLImageElement): void {
+    const variant = img.dataset.variant;
+    if (!variant || pollingVariantImages.has(img)) {
+      return;
+    }
+    pollingVariantImages.add(img);
+    const probe = new Image();
+    probe.addEventListener('load', () => {
+      pollingVariantImages.delete(img);
+      nearVariantImages.delete(img);
+      variantObserver?.unobserve(img);
+      delete img.dataset.variant;
+      if (img.dataset.src) {
+        img.dataset.src = variant;
+      }
+      // Unloaded images are loaded from the variant by dynamic image loading
+      if (img.src && img.src !== loadingPlaceholder) {
+        img.src = variant;
+      }
+    });
+    probe.addEventListener('error', async () => {
+      await asyncTimeout(variantPollInterval);
+      pollingVariantImages.delete(img);
+      if (nearVariantImages.has(img)) {
+        pollDisplayVariant(img);
+      }
+    });
+    probe.src = variant;
+  }
+
   function setupListeners(): void {
     originalWidthBtn.addEventListener('click', handleOriginalSize);
     shrinkSizeBtn.addEventListener('click', handleShrinkSize);
@@ -586,14 +807,20 @@
     seamlessCheckbox.addEventListener('change', handleSeamless);
 
     document.addEventListener('wheel', handleHorizontalScroll, { passive: false });
+    setupDisplayVariants();
   }
 
-  function setupScrubberPreview(): HTMLImageElement[] {
-    const previewImages = images.map((img, i) => {
+  /**
+   * Create navbar previews for images and add them to the navbar.
+   * @param imgs Images to create previews of.
+   * @param offset Page index of the first image in `imgs`.
+   */
+  function setupScrubberPreview(imgs = images, offset = 0): HTMLImageElement[] {
+    const previewImages = imgs.map((img, i) => {
       const previewImage = document.createElement('img');
       previewImage.loading = 'lazy';
       previewImage.classList.add('scrubber-preview-image');
-      previewImage.dataset.index = `${i}`;
+      previewImage.dataset.index = `${offset + i}`;
       if (configIni.dynamicImageLoading) {
         previewImage.src = loadingPlaceholder;
       } else {
@@ -608,10 +835,53 @@
       previewImage.style.width = `${heightToRatioWidth(img, 180)}px`;
       return previewImage;
     });
+    const sprites = loadSpriteIndex();
+    if (sprites) {
+      setupSpritePreviews(sprites, previewImages, offset);
+    }
     scrubberPreviewDiv.append(...previewImages);
     return previewImages;
   }
 
+  /**
+   * Display navbar previews as regions of thumbnail sprite sheets. Sheets are written while the
+   * reader is open, so loading each sheet is retried until it is available.
+   * @param offset Page index of the first image in `previewImages`.
+   */
+  function setupSpritePreviews(
+    sprites: SpriteIndex,
+    previewImages: HTMLImageElement[],
+    offset = 0,
+  ): void {
+    for (const previewImage of previewImages) {
+      previewImage.src = transparentPixel;
+      previewImage.dataset.src = transparentPixel;
+    }
+    for (const [sheetIndex, sheet] of sprites.sheets.entries()) {
+      const loader = new Image();
+      loader.addEventListener('load', () => {
+        for (const [i, previewImage] of previewImages.entries()) {
+          const tile = sprites.tiles[offset + i];
+          if (!tile || tile[0] !== sheetIndex) {
+            continue;
+          }
+          const [, x, y, , height] = tile;
+          const scale = 180 / height;
+          Object.assign(previewImage.style, {
+            backgroundImage: `url("${sheet.uri}")`,
+            backgroundPosition: `${-x * scale}px ${-y * scale}px`,
+            backgroundSize: `${sheet.width * scale}px ${sheet.height * scale}px`,
+          });
+        }
+      });
+      loader.addEventListener('error', async () => {
+        await asyncTimeout(2000);
+        loader.src = sheet.uri;
+      });
+      loader.src = sheet.uri;
+    }
+  }
+
   function computeMarkerY(cursorY: number): number {
     return Math.max(
       0,
@@ -683,6 +953,12 @@
       const cursorY = event.clientY;
       const cursorYRatio = cursorY / scrubberState.screenHeight;
       scrubberState.previewPageIndex = Math.floor(cursorYRatio * images.length);
+      const previewSpan = Math.ceil(scrubberState.screenHeight / 180);
+      throttledReportFocus(
+        scrubberState.visiblePageIndex,
+        scrubberState.previewPageIndex - previewSpan,
+        scrubberState.previewPageIndex + previewSpan,
+      );
       if (configIni.dynamicImageLoading) {
         debouncedUpdateLoadedImages(
           scrubberImages,
@@ -721,6 +997,150 @@
     });
   }
 
+  /**
+   * In progressive mode, the document initially contains only the pages around the opened page,
+   * preceded by placeholders for the pages before them. The remaining pages are written to
+   * `pages-{n}.js` batch files while the reader is open. As each batch becomes available, its pages
+   * are appended to the document, or replace their placeholders.
+   */
+  function setupProgressiveLoading(): void {
+    if (!document.body.dataset.progressive) {
+      return;
+    }
+    window.mangareaderAddPages = (batch: PageBatch) => {
+      if (batch.error) {
+        showError(batch.error);
+        return;
+      }
+      if (batch.offset < pages.length) {
+        replacePages(batch);
+      } else {
+        appendPages(batch);
+      }
+      if (!batch.last) {
+        loadPageBatch(batch.batch + 1);
+      }
+    };
+    loadPageBatch(1);
+  }
+
+  /**
+   * Load a page batch file. If the file has not been written yet, loading is retried until it
+   * succeeds, or until the app has taken too long to write it.
+   * @param retries Number of times loading the file has been retried so far.
+   */
+  function loadPageBatch(batch: number, retries = 0): void {
+    const script = document.createElement('script');
+    script.src = `pages-${batch}.js`;
+    script.addEventListener('load', () => script.remove());
+    script.addEventListener('error', async () => {
+      script.remove();
+      if (retries >= maxPageBatchRetries) {
+        showError('The remaining pages could not be loaded. Reopen the file to try again.');
+        return;
+      }
+      await asyncTimeout(pageBatchRetryInterval);
+      loadPageBatch(batch, retries + 1);
+    });
+    document.body.append(script);
+  }
+
+  /**
+   * Show an error message that stays on screen.
+   */
+  async function showError(message: string): Promise<void> {
+    const errorToast = document.getElementById('error-toast') as HTMLDivElement;
+    errorToast.innerText = message;
+    Object.assign(errorToast.style, { display: 'initial' });
+    await asyncTimeout(0);
+    errorToast.classList.add('show');
+  }
+
+  function appendPages(batch: PageBatch): void {
+    const template = document.createElement('template');
+    template.innerHTML = batch.pages;
+    const newPages = Array.from(template.content.querySelectorAll('.page'));
+    const newImages = Array.from(template.content.querySelectorAll('.image')) as HTMLImageElement[];
+    const offset = images.length;
+    pagesContainerDiv.append(template.content);
+    pages.push(...newPages);
+    images.push(...newImages);
+    for (const image of newImages) {
+      imageOrientations.set(image, getOrientation(image));
+    }
+    for (const page of newPages) {
+      intersectObserver?.observe(page);
+    }
+    scaleImages(readConfig().scaling || 'none', newImages);
+    setupDisplayVariants(newImages);
+    if (scrubberImages) {
+      scrubberImages.push(...setupScrubberPreview(newImages, offset));
+    }
+    addSprites(batch);
+  }
+
+  /**
+   * Replace placeholder pages with the pages of a batch, without moving the page being read.
+   */
+  function replacePages(batch: PageBatch): void {
+    const template = document.createElement('template');
+    template.innerHTML = batch.pages;
+    const newPages = Array.from(template.content.querySelectorAll('.page'));
+    const newImages = Array.from(template.content.querySelectorAll('.image')) as HTMLImageElement[];
+    const oldPages = pages.slice(batch.offset, batch.offset + newPages.length);
+    // Pages are replaced by pages of another size, which moves the pages after them
+    const anchor =
+      visiblePage && !oldPages.includes(visiblePage)
+        ? visiblePage
+        : pages[batch.offset + newPages.length];
+    const anchorRect = anchor?.getBoundingClientRect();
+    for (const [i, newPage] of newPages.entries()) {
+      const oldPage = oldPages[i];
+      const oldImage = images[batch.offset + i];
+      if (!oldPage || !oldImage) {
+        continue;
+      }
+      intersectObserver?.unobserve(oldPage);
+      imageOrientations.delete(oldImage);
+      oldPage.replaceWith(newPage);
+    }
+    pages.splice(batch.offset, newPages.length, ...newPages);
+    images.splice(batch.offset, newImages.length, ...newImages);
+    for (const image of newImages) {
+      imageOrientations.set(image, getOrientation(image));
+    }
+    for (const page of newPages) {
+      intersectObserver?.observe(page);
+    }
+    scaleImages(readConfig().scaling || 'none', newImages);
+    if (anchor && anchorRect) {
+      const rect = anchor.getBoundingClientRect();
+      window.scrollBy(rect.left - anchorRect.left, rect.top - anchorRect.top);
+    }
+    setupDisplayVariants(newImages);
+    if (scrubberImages) {
+      const newPreviews = setupScrubberPreview(newImages, batch.offset);
+      for (const [i, newPreview] of newPreviews.entries()) {
+        scrubberImages[batch.offset + i]?.replaceWith(newPreview);
+      }
+      scrubberImages.splice(batch.offset, newPreviews.length, ...newPreviews);
+    }
+    addSprites(batch);
+  }
+
+  /**
+   * Display the navbar previews from the thumbnail sprite sheets, which are sent with the last
+   * batch in progressive mode.
+   */
+  function addSprites(batch: PageBatch): void {
+    if (batch.sprites) {
+      spritesScript.textContent = JSON.stringify(batch.sprites);
+      if (scrubberImages) {
+        setupSpritePreviews(batch.sprites, scrubberImages);
+      }
+    }
+  }
+
   async function checkVersion(): Promise<void> {
     const response = await fetch(versionCheckUrl, { method: 'GET', mode: 'cors' }).then((r) =>
       r.json(),
@@ -746,6 +1166,9 @@
   async function main(): Promise<void> {
     setupListeners();
     loadSettings();
+    setupProgressiveLoading();
+    setupHeartbeat();
+    reportVolume();
     checkVersion();
   }
 
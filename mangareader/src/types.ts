@@ -1,6 +1,24 @@
 interface Window {
   zenscroll: any;
   pauseZenscroll: boolean;
+  mangareaderAddPages: (batch: PageBatch) => void;
+}
+
+/**
+ * Pages added to the document in progressive mode, loaded from a `pages-{n}.js` batch file.
+ */
+interface PageBatch {
+  batch: number;
+  /** Index of the first page in the batch */
+  offset: number;
+  /** Rendered HTML of the pages in the batch */
+  pages: string;
+  /** Whether this is the last batch */
+  last: boolean;
+  /** Thumbnail sprite sheet index, sent with the last batch in progressive mode */
+  sprites: SpriteIndex | null;
+  /** Error that stopped the remaining pages from being rendered, sent with an empty last batch */
+  error: string | null;
 }
 
 /**
@@ -10,6 +28,17 @@ interface ConfigIni {
   disableNavButtons?: boolean;
   disableNavBar?: boolean;
   dynamicImageLoading?: boolean;
+  prefetchPages?: number;
+}
+
+/**
+ * Index of navbar thumbnail sprite sheets, embedded in the document if `thumbnailSprites` is
+ * enabled in `config.ini`. Each tile is `[sheet, x, y, width, height]`, or null if the page has no
+ * thumbnail.
+ */
+interface SpriteIndex {
+  sheets: { uri: string; width: number; height: number }[];
+  tiles: ([number, number, number, number, number] | null)[];
 }
 
 type SemVer = `${number}.${number}.${number}`;
@@ -2,6 +2,7 @@ DEFAULT_IMAGETYPES = {'jpg', 'png', 'apng', 'bmp', 'jpeg', 'gif', 'svg', 'webp'}
 ZIP_TYPES = {'zip', 'cbz'}
 RAR_TYPES = {'rar', 'cbr'}
 _7Z_TYPES = {'7z', 'cb7'}
+STREAM_TYPES = ZIP_TYPES | RAR_TYPES
 ASSETS = {
     'build/styles.css',
     'build/scripts.js',
@@ -17,5 +18,9 @@ HTML_TEMPLATES = {
     'doc': 'static-assets/doc.template.html',
     'page': 'static-assets/img.template.html',
     'boot': 'static-assets/boot.template.html',
+    'library': 'static-assets/library.template.html',
+    'volume': 'static-assets/volume.template.html',
+    'status': 'static-assets/status.template.html',
+    'navigation': 'static-assets/navigation.template.html',
 }
 IMG_PLACEHOLDER = 'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8HwYAAloBV80ot9EAAAAASUVORK5CYII='
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import threading
+import time
+from configparser import ConfigParser
+from pathlib import Path
+from typing import Optional, Union
+
+import appdirs
+
+from mangareader.archivereader import ArchivePage, get_reader
+from mangareader.config import CONFIG_KEY
+
+# Bump when the thumbnail rendering changes, so that stale thumbnails are not reused.
+CACHE_VERSION = '2'
+# Eviction lists every entry of the cache, so it runs at most this often, across all sessions
+EVICT_INTERVAL = 10 * 60
+# Modified whenever eviction runs
+EVICT_STAMP = '.evicted'
+
+
+class ThumbnailCache:
+    """Persistent store of rendered thumbnails, shared between sessions.
+
+    Thumbnails are keyed by the identity of their source image: the path, size and modification
+    time of an image file, or the name, size and CRC of an archive member, so that thumbnails of
+    unchanged members are reused after pages are added to their archive. Cache entries are evicted
+    least recently used first once the total size of the cache exceeds `max_size`. Recency is
+    tracked by the modification time of each entry, which is updated on every cache hit.
+    """
+
+    path: Path
+    max_size: int
+    hits: int
+    misses: int
+    _lock: threading.Lock
+
+    def __init__(self, path: Union[Path, str], max_size: int):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def key_for(self, page: Union[Path, str, ArchivePage]) -> str:
+        """Compute the cache key for an image file or archive page. Archive pages are keyed by the
+        archive they are in only if the archive does not record their CRC."""
+        if isinstance(page, ArchivePage):
+            info = get_reader(page.archive).getinfo(page.name)
+            crc = getattr(info, 'CRC', None)
+            if crc is not None:
+                return member_thumbnail_key(page.name, info.file_size, crc)
+            stat = os.stat(page.archive)
+            source = f'{Path(page.archive).resolve()}|{page.name}'
+        else:
+            stat = os.stat(page)
+            source = str(Path(page).resolve())
+        return thumbnail_key(source, stat.st_size, stat.st_mtime_ns)
+
+    def path_for(self, key: str) -> Path:
+        """Get the location of the thumbnail with the given key. The file may not exist yet."""
+        return self.path / key[:2] / f'{key}.png'
+
+    def lookup(self, path: Path) -> bool:
+        """Check whether a cached thumbnail exists at path, counting the result as a hit or miss.
+        On a hit the entry is marked as recently used."""
+        try:
+            os.utime(path)
+            hit = True
+        except OSError:
+            hit = False
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit
+
+    def evict_in_background(self) -> None:
+        """Start evicting in a background thread, unless eviction has run within the last
+        `EVICT_INTERVAL` seconds, in this or another session. In between, the cache may exceed
+        `max_size` by the thumbnails rendered since."""
+        stamp = self.path / EVICT_STAMP
+        with self._lock:
+            try:
+                if time.time() - stamp.stat().st_mtime < EVICT_INTERVAL:
+                    return
+            except OSError:
+                pass
+            try:
+                stamp.touch()
+            except OSError:
+                return
+        threading.Thread(target=self.evict, daemon=True).start()
+
+    def evict(self) -> None:
+        """Delete least recently used thumbnails until the cache fits within `max_size`."""
+        entries = []
+        total = 0
+        for entry in self.path.glob('*/*.png'):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+        if total <= self.max_size:
+            return
+        for _, size, entry in sorted(entries):
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_size:
+                return
+
+
+def thumbnail_key(source: str, size: int, mtime_ns: int) -> str:
+    """Compute the cache key of an image from its identity, see `ThumbnailCache.key_for`.
+
+    Parameters:
+    * `source`: resolved path of the image file, or of the archive containing it followed by
+      `|` and the member name.
+    * `size`, `mtime_ns`: size and modification time of the image or archive file.
+    """
+    identity = f'{source}|{size}|{mtime_ns}'
+    return hashlib.sha1(f'{CACHE_VERSION}|{identity}'.encode('utf-8')).hexdigest()
+
+
+def member_thumbnail_key(name: str, file_size: int, crc: int) -> str:
+    """Compute the cache key of an archive member from its name, uncompressed size and CRC, see
+    `ThumbnailCache.key_for`."""
+    identity = f'{name}|{file_size}|{crc:08x}'
+    return hashlib.sha1(f'{CACHE_VERSION}|member|{identity}'.encode('utf-8')).hexdigest()
+
+
+def get_thumbnail_cache(config: ConfigParser) -> Optional[ThumbnailCache]:
+    r"""Get the thumbnail cache in the user's cache directory, sized according to the
+    `thumbnailCacheSize` config option in megabytes. Returns None if the cache is disabled.
+
+    Examples:
+        Windows 10: `C:\Users\username\AppData\Local\html-mangareader\Cache\thumbnails`
+        MacOS: `/Users/username/Library/Caches/html-mangareader/thumbnails`
+    """
+    max_size_mb = config[CONFIG_KEY].getint('thumbnailCacheSize', fallback=256)
+    if max_size_mb <= 0:
+        return None
+    cache_path = Path(appdirs.user_cache_dir('html-mangareader', appauthor=False)) / 'thumbnails'
+    return ThumbnailCache(cache_path, max_size_mb * 1024 * 1024)
@@ -0,0 +1,99 @@
+import os
+import shutil
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from configparser import ConfigParser
+from multiprocessing import cpu_count
+from pathlib import Path
+from typing import Tuple, Union
+
+from mangareader.archivereader import ArchivePage, open_page
+from mangareader.config import CONFIG_KEY
+
+THUMBNAIL_MAX_SIZE = (2000, 360)
+# Image formats that display variants are rendered for. Animated and vector formats are displayed
+# from the original instead.
+VARIANT_TYPES = {'jpg', 'jpeg', 'png', 'bmp', 'webp'}
+
+
+def thumbnail_size(width: int, height: int) -> Tuple[int, int]:
+    """Get the dimensions of the thumbnail of an image, which is shrunk to fit within
+    `THUMBNAIL_MAX_SIZE` preserving aspect ratio."""
+    max_width, max_height = THUMBNAIL_MAX_SIZE
+    if width <= max_width and height <= max_height:
+        return width, height
+    scale = min(max_width / width, max_height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def render_thumbnail(path: Union[Path, str, ArchivePage], outfile: Path) -> None:
+    """Render the thumbnail of an image and save it to outfile as PNG.
+
+    JPEG images are decoded directly at a reduced scale with `Image.draft()`. Other formats are
+    decoded in full and shrunk by an integer factor with `Image.reduce()` before the final resize.
+    The file is written under a temporary name and moved into place, so that a concurrent reader
+    never sees a partially written thumbnail.
+
+    This is a module level function so that it can be run in a process pool.
+    """
+    from PIL import Image
+
+    with open_page(path) as img_file, Image.open(img_file) as img:
+        size = thumbnail_size(*img.size)
+        thumbnail = img
+        if size != img.size:
+            # Must be called before the image data is loaded to have any effect
+            img.draft(None, size)
+            factor = min(img.width // size[0], img.height // size[1])
+            if factor > 1:
+                thumbnail = img.reduce(factor)
+            thumbnail = thumbnail.resize(size, Image.Resampling.NEAREST)
+        temp_file = _temp_path(outfile)
+        thumbnail.save(temp_file, format='PNG')
+        os.replace(temp_file, outfile)
+
+
+def render_display_variant(
+    path: Union[Path, str, ArchivePage], outfile: Path, max_width: int
+) -> None:
+    """Render a copy of an image downscaled to max_width for display, and save it to outfile as
+    JPEG, which is fast for the browser to decode. Images that are already narrow enough, and
+    animated images, are copied unchanged, so that the variant of every image can be displayed.
+
+    This is a module level function so that it can be run in a process pool.
+    """
+    from PIL import Image
+
+    with open_page(path) as img_file, Image.open(img_file) as img:
+        temp_file = _temp_path(outfile)
+        if img.width <= max_width or getattr(img, 'is_animated', False):
+            img_file.seek(0)
+            with open(temp_file, 'wb') as variant_file:
+                shutil.copyfileobj(img_file, variant_file)
+        else:
+            size = (max_width, max(1, round(img.height * max_width / img.width)))
+            img.draft('RGB', size)
+            variant = img if img.mode in ('RGB', 'L') else img.convert('RGB')
+            factor = variant.width // size[0]
+            if factor > 1:
+                variant = variant.reduce(factor)
+            variant = variant.resize(size, Image.Resampling.LANCZOS)
+            variant.save(temp_file, format='JPEG', quality=85)
+        os.replace(temp_file, outfile)
+
+
+def _temp_path(outfile: Path) -> Path:
+    """Get a unique temporary path to write outfile to before moving it into place, so that a
+    concurrent reader never sees a partially written file."""
+    outfile.parent.mkdir(parents=True, exist_ok=True)
+    return outfile.with_name(f'{outfile.stem}.{os.getpid()}.{threading.get_ident()}.tmp')
+
+
+def create_thumbnail_executor(config: ConfigParser) -> Executor:
+    """Create the worker pool for rendering thumbnails, according to the `thumbnailExecutor` config
+    option. A process pool avoids contention on the parts of Pillow that hold the GIL, at the cost
+    of a slower startup."""
+    max_workers = max(1, cpu_count() - 1)
+    if config[CONFIG_KEY].get('thumbnailExecutor', fallback='thread') == 'process':
+        return ProcessPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers)
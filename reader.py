@@ -1,17 +1,31 @@
+import json
+import multiprocessing
 import platform
 import sys
+import threading
+import time
 import traceback
 import webbrowser
 from argparse import ArgumentParser, Namespace
-from os import makedirs, path
-import tempfile
-from shutil import rmtree
-from tkinter import Tk, filedialog, messagebox
+from concurrent.futures import Executor
+from configparser import ConfigParser
+from functools import partial
+from os import path
+from pathlib import Path
+from queue import Queue
+from tkinter import Tk, Toplevel, filedialog, messagebox
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 
-from mangareader import templates
+from mangareader import daemon, templates
 from mangareader.config import CONFIG_KEY, get_or_create_config, is_background_tasks
+from mangareader.excepts import OperationCancelled
+from mangareader.library import is_library, render_library
 from mangareader.mangarender import extract_render
 from mangareader.progress import MRProgressBar
+from mangareader.reporter import CancellationToken, ProgressReporter, StageTimer
+from mangareader.sessions import create_session, start_session_cleanup
+from mangareader.thumbcache import ThumbnailCache, get_thumbnail_cache
+from mangareader.thumbnails import create_thumbnail_executor
 
 
 def parse_args() -> Namespace:
@@ -21,9 +35,44 @@ def parse_args() -> Namespace:
     parser = ArgumentParser(description='Mangareader')
     parser.add_argument('path', nargs='?', help='Path to image, folder, or comic book archive')
     parser.add_argument('--no-browser', action='store_true')
+    parser.add_argument(
+        '--library',
+        action='store_true',
+        help='Open a series folder of archives, or the folder containing an archive, as a library',
+    )
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const='-',
+        metavar='FILE',
+        help='Write a JSON report of the time spent opening the file to FILE, or to standard '
+        'output, once thumbnails are complete',
+    )
     return parser.parse_args()
 
 
+def write_profile(outfile: str, target_path: str, version: str, timer: StageTimer) -> None:
+    """Write the profiling report of opening a file, with details of the machine it ran on so that
+    reports can be compared across releases and machines.
+
+    Parameters:
+    * `outfile`: path to write the JSON report to, or `-` for standard output.
+    * `target_path`: opened file.
+    """
+    report = {
+        'input': target_path,
+        'version': version,
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpus': multiprocessing.cpu_count(),
+        **timer.to_dict(),
+    }
+    if outfile == '-':
+        print(json.dumps(report), flush=True)
+    else:
+        Path(outfile).write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+
 def get_platform_args() -> Namespace:
     """
     Get program arguments based on platform. On Windows, arguments are obtained directly via
@@ -49,14 +98,236 @@ def get_platform_args() -> Namespace:
     return cli_args
 
 
+def create_window(master: Optional[Tk] = None) -> Union[Tk, Toplevel]:
+    """Create the progress window, as the main window, or as a separate window of master."""
+    window = Toplevel(master) if master else Tk()
+    window.resizable(width=False, height=False)
+    window.title('[HTML] Mangareader')
+    window.geometry('400x100')
+    return window
+
+
+def get_render_args(
+    target_path: str,
+    config: ConfigParser,
+    version: str,
+    lib_dir: str,
+    progress_bar: Optional[ProgressReporter],
+    outpath: Path,
+    executor: Optional[Executor] = None,
+    thumbnail_cache: Optional[ThumbnailCache] = None,
+    timer: Optional[StageTimer] = None,
+    on_complete: Optional[Callable[[], None]] = None,
+    cancel: Optional[CancellationToken] = None,
+) -> Dict[str, Any]:
+    """Get the keyword arguments to open a file with, shared by `extract_render` and
+    `render_library`. See `extract_render` for the parameters."""
+    return dict(
+        path=target_path,
+        version=version,
+        doc_template_path=f'{lib_dir}/{templates.HTML_TEMPLATES["doc"]}',
+        page_template_path=f'{lib_dir}/{templates.HTML_TEMPLATES["page"]}',
+        boot_template_path=f'{lib_dir}/{templates.HTML_TEMPLATES["boot"]}',
+        asset_paths=(f'{lib_dir}/{asset}' for asset in templates.ASSETS),
+        img_types=templates.DEFAULT_IMAGETYPES,
+        config=config,
+        progress_bar=progress_bar,
+        outpath=outpath,
+        executor=executor,
+        thumbnail_cache=thumbnail_cache,
+        timer=timer,
+        on_complete=on_complete,
+        cancel=cancel,
+        # Every opened file is written to its own session, see `create_session`
+        session=outpath,
+    )
+
+
+def get_library_args(lib_dir: str) -> Dict[str, str]:
+    """Get the keyword arguments that `render_library` takes in addition to `get_render_args`."""
+    return dict(
+        library_template_path=f'{lib_dir}/{templates.HTML_TEMPLATES["library"]}',
+        volume_template_path=f'{lib_dir}/{templates.HTML_TEMPLATES["volume"]}',
+        status_template_path=f'{lib_dir}/{templates.HTML_TEMPLATES["status"]}',
+        navigation_template_path=f'{lib_dir}/{templates.HTML_TEMPLATES["navigation"]}',
+    )
+
+
+def open_file(
+    progress_bar: MRProgressBar,
+    target_path: str,
+    args: Namespace,
+    config: ConfigParser,
+    version: str,
+    lib_dir: str,
+    executor: Optional[Executor] = None,
+    thumbnail_cache: Optional[ThumbnailCache] = None,
+) -> None:
+    """Render an image, folder or archive and open it in the browser, showing the progress of
+    thumbnails in the window of progress_bar. Errors are shown in a message box. The window is
+    destroyed once done.
+
+    The file is rendered in a background thread, so that the window stays responsive. Closing the
+    window cancels opening the file, and the thumbnails still outstanding for it.
+
+    Parameters:
+    * `args`: command line arguments, for the `library`, `no_browser` and `profile` options.
+    * `executor`, `thumbnail_cache`: shared by all files opened in resident mode.
+    """
+    # Each opened file gets its own output directory, so other instances of the app are unaffected
+    session_path = create_session()
+    start_session_cleanup(config, keep=session_path)
+    cancel = progress_bar.cancel
+    timer = StageTimer()
+    render_args = get_render_args(
+        target_path,
+        config,
+        version,
+        lib_dir,
+        progress_bar,
+        session_path,
+        executor,
+        thumbnail_cache,
+        timer,
+        (
+            partial(write_profile, args.profile, target_path, version, timer)
+            if args.profile
+            else None
+        ),
+        cancel,
+    )
+    # Tuple of the path to the bootstrap document, or the name and traceback of the error
+    outcome: 'Queue[Tuple[Optional[Path], Optional[Tuple[str, str]]]]' = Queue()
+
+    def render() -> None:
+        try:
+            if args.library or (
+                config[CONFIG_KEY].getboolean('libraryFolders', fallback=False)
+                and is_library(target_path, templates.DEFAULT_IMAGETYPES)
+            ):
+                # Open a series of archives as one library of volumes
+                boot_path = render_library(**render_args, **get_library_args(lib_dir))
+            else:
+                boot_path = extract_render(**render_args)
+            outcome.put((boot_path, None))
+        except OperationCancelled:
+            outcome.put((None, None))
+        except Exception as e:
+            outcome.put((None, (type(e).__name__, traceback.format_exc())))
+
+    def finish() -> None:
+        # Polled from the main window, which outlives the progress window in resident mode
+        if outcome.empty():
+            root.after(50, finish)
+            return
+        boot_path, error = outcome.get()
+        if boot_path and not cancel.cancelled:
+            if args.no_browser:
+                print(boot_path)
+            else:
+                if config[CONFIG_KEY]['browser']:
+                    webbrowser.register(
+                        config[CONFIG_KEY]['browser'],
+                        None,
+                        instance=webbrowser.GenericBrowser(config[CONFIG_KEY]['browser']),
+                        preferred=True,
+                    )
+                webbrowser.get().open(boot_path.as_uri())
+        if error:
+            messagebox.showerror('Mangareader encountered an error: ' + error[0], error[1])
+        # Destroy the tk window now only if we don't spawn any background tasks (otherwise task
+        # completion will take care of destroying)
+        if error or cancel.cancelled or not is_background_tasks(config):
+            progress_bar.close()
+        else:
+            progress_bar.close_when_complete()
+
+    root = progress_bar.tk.nametowidget('.')
+    threading.Thread(target=render, name='mangareader-render', daemon=True).start()
+    root.after(50, finish)
+
+
+def forward_open(target_path: str, args: Namespace) -> bool:
+    """Forward a file to open to the resident app, if one is running.
+
+    Returns: whether the resident app accepted it.
+    """
+    request = {'path': path.abspath(target_path), 'library': args.library}
+    return daemon.send_open_request(request)
+
+
+def run_resident(
+    tk: Tk,
+    server: daemon.DaemonServer,
+    requests: 'Queue[daemon.Request]',
+    config: ConfigParser,
+    open_target: Callable[..., None],
+) -> None:
+    """Keep the app running in the background after opening the first file, and open the files
+    forwarded by later instances in new progress windows. Worker pools, caches and templates stay
+    warm in between. Exits once no file has been opened for `residentTimeout` minutes and all
+    windows are closed.
+
+    Parameters:
+    * `tk`: main window, which is hidden.
+    * `server`: started server that puts forwarded requests in `requests`.
+    * `open_target`: opens a file, see `open_file`. Called with the progress bar, path and arguments
+      of each file, and the shared executor and thumbnail cache.
+    """
+    tk.withdraw()
+    executor = create_thumbnail_executor(config)
+    thumbnail_cache = get_thumbnail_cache(config)
+    idle_timeout = config[CONFIG_KEY].getfloat('residentTimeout', fallback=30) * 60
+    last_open = time.monotonic()
+
+    def open_request(request: daemon.Request) -> None:
+        nonlocal last_open
+        last_open = time.monotonic()
+        args = Namespace(
+            path=request['path'],
+            library=bool(request.get('library')),
+            no_browser=False,
+            profile=None,
+        )
+        progress_bar = MRProgressBar(create_window(tk))
+        open_target(
+            progress_bar, args.path, args, executor=executor, thumbnail_cache=thumbnail_cache
+        )
+
+    def poll() -> None:
+        while not requests.empty():
+            open_request(requests.get())
+        idle = time.monotonic() - last_open > idle_timeout
+        if idle and not any(isinstance(w, Toplevel) for w in tk.winfo_children()):
+            server.stop()
+            tk.destroy()
+            return
+        tk.after(100, poll)
+
+    if platform.system() == 'Darwin':
+        # MacOS sends files opened while the app is running to it as Open Document events
+        tk.createcommand(
+            '::tk::mac::OpenDocument', lambda *paths: [requests.put({'path': p}) for p in paths]
+        )
+    tk.after(0, poll)
+    tk.mainloop()
+    executor.shutdown(wait=False)
+
+
 def main() -> None:
     config = get_or_create_config()
     args = get_platform_args()
+    # Files are handed over to the resident app, unless their output is needed in this process
+    resident = (
+        config[CONFIG_KEY].getboolean('residentMode', fallback=False)
+        and daemon.is_supported()
+        and not args.no_browser
+        and not args.profile
+    )
+    if resident and args.path and forward_open(args.path, args):
+        return
 
-    tk = Tk()
-    tk.resizable(width=False, height=False)
-    tk.title('[HTML] Mangareader')
-    tk.geometry('400x80')
+    tk = create_window()
     progress_bar = MRProgressBar(tk)
 
     if not args.path:
@@ -77,55 +348,29 @@ def main() -> None:
         )
         if not target_path:
             return
+        if resident and forward_open(target_path, args):
+            tk.destroy()
+            return
     else:
         target_path = args.path
     working_dir = getattr(sys, '_MEIPASS', path.abspath(path.dirname(__file__)))
     lib_dir = f'{working_dir}/mangareader'
     with open(f'{working_dir}/version', encoding='utf-8') as version_file:
         version = version_file.read().strip()
+    open_target = partial(open_file, config=config, version=version, lib_dir=lib_dir)
 
-    temp_dir = path.join(tempfile.gettempdir(), 'html-mangareader')
-    rmtree(temp_dir, ignore_errors=True)
-    makedirs(temp_dir, exist_ok=True)
+    requests: 'Queue[daemon.Request]' = Queue()
+    server = daemon.DaemonServer(requests.put) if resident else None
+    if server and server.start():
+        requests.put({'path': target_path, 'library': args.library})
+        run_resident(tk, server, requests, config, open_target)
+        return
 
-    def run():
-        try:
-            boot_path = extract_render(
-                path=target_path,
-                version=version,
-                doc_template_path=f'{lib_dir}/{templates.HTML_TEMPLATES["doc"]}',
-                page_template_path=f'{lib_dir}/{templates.HTML_TEMPLATES["page"]}',
-                boot_template_path=f'{lib_dir}/{templates.HTML_TEMPLATES["boot"]}',
-                asset_paths=(f'{lib_dir}/{asset}' for asset in templates.ASSETS),
-                img_types=templates.DEFAULT_IMAGETYPES,
-                config=config,
-                progress_bar=progress_bar,
-            )
-            if args.no_browser:
-                print(boot_path)
-            else:
-                if config[CONFIG_KEY]['browser']:
-                    webbrowser.register(
-                        config[CONFIG_KEY]['browser'],
-                        None,
-                        instance=webbrowser.GenericBrowser(config[CONFIG_KEY]['browser']),
-                        preferred=True,
-                    )
-                webbrowser.get().open(boot_path.as_uri())
-        except Exception as e:
-            messagebox.showerror(
-                'Mangareader encountered an error: ' + type(e).__name__,
-                ''.join(traceback.format_exc()),
-            )
-        finally:
-            # Destroy the tk window now only if we don't spawn any background tasks (otherwise task
-            # completion will take care of destroying)
-            if not is_background_tasks(config):
-                tk.destroy()
-
-    tk.after(0, run)
+    tk.after(0, open_target, progress_bar, target_path, args)
     tk.mainloop()
 
 
 if __name__ == '__main__':
+    # Required for the thumbnail process pool in frozen builds
+    multiprocessing.freeze_support()
     main()